@@ -15,11 +15,13 @@ import warnings
 import contextlib
 import os.path
 import pickle
-from weakref import WeakSet
+import threading
+from weakref import WeakSet, WeakKeyDictionary
 from inspect import isfunction
 from importlib import import_module
 
 from .facet import Facet, ManualFacet, MessageFacet, SCPI_Facet, FacetGroup
+from .util import optimize_scpi_messages
 from ..log import get_logger
 from .. import conf
 from ..util import cached_property
@@ -453,6 +455,29 @@ class Instrument(with_metaclass(InstrumentMeta, object)):
         facet_instance.observe(callback)
 
 
+class _TransactionStats(dict):
+    def __init__(self):
+        dict.__init__(self)
+        self.clear()
+
+    def clear(self):
+        self.update(dict.fromkeys(('flushes', 'commands', 'bytes', 'optimized_commands',
+                                   'optimized_messages', 'optimized_bytes'), 0))
+
+
+_resource_locks = WeakKeyDictionary()
+_resource_locks_lock = threading.Lock()
+
+
+def _resource_lock(rsrc):
+    """The reentrant lock shared by all users of VISA resource `rsrc`"""
+    with _resource_locks_lock:
+        lock = _resource_locks.get(rsrc)
+        if lock is None:
+            lock = _resource_locks[rsrc] = threading.RLock()
+    return lock
+
+
 class VisaMixin(Instrument):
     def write(self, message, *args, **kwds):
         """Write a string message to the instrument's VISA resource
@@ -463,24 +488,32 @@ class VisaMixin(Instrument):
         >>> inst.write('source{}:value {}', channel, value)
         """
         full_message = message.format(*args, **kwds)
-        if self._in_transaction:
-            if full_message[0] != ':':
-                full_message = ':' + full_message
-            self._message_queue.append(full_message)
-        else:
-            self._rsrc.write(full_message)
+        with self.lock:
+            if self._in_transaction:
+                if full_message[0] != ':':
+                    full_message = ':' + full_message
+                self._message_queue.append(full_message)
+            else:
+                self._rsrc.write(full_message)
 
     def query(self, message, *args, **kwds):
         """Query the instrument's VISA resource with `message`
 
         Flushes the message queue if called within a transaction.
         """
-        if self._in_transaction:
-            self._flush_message_queue()  # TODO: combine query with this message?
-        return self._rsrc.query(message.format(*args, **kwds))
+        with self.lock:
+            if self._in_transaction:
+                self._flush_message_queue()  # TODO: combine query with this message?
+            return self._rsrc.query(message.format(*args, **kwds))
+
+    #: Whether transactions optimize their queued messages by default. See `transaction()`.
+    optimize_transactions = False
+
+    #: Max length of a message the instrument can accept, used when optimizing transactions
+    _max_message_length = None
 
     @contextlib.contextmanager
-    def transaction(self):
+    def transaction(self, optimize=None, max_message_length=None):
         """Transaction context manager to auto-chain VISA messages
 
         Queues individual messages written with the `write()` method and sends them all at once,
@@ -503,25 +536,112 @@ class VisaMixin(Instrument):
             ...     myinst.query('C?')  # Query forces flush. Writes "A;B" and queries "C?"
             ...     myinst.write('D')
             ...     myinst.write('E')  # End of transaction block, writes "D;E"
+
+        A transaction started while another is in progress simply joins the outer one. The
+        instrument's `lock` is held for the duration of the transaction, so other threads wait for
+        it to end. If the block raises an exception, any messages not yet sent are discarded.
+
+        Parameters
+        ----------
+        optimize : bool, optional
+            Whether to optimize the queued SCPI messages before sending them, using
+            `~instrumental.drivers.util.optimize_scpi_messages()`. Settings that are overwritten
+            later in the same flush are dropped, and commands in the same subsystem are merged using
+            relative headers. This assumes that writing a setting has no side effects other than
+            changing that setting. Defaults to the instrument's `optimize_transactions` attribute.
+        max_message_length : int, optional
+            When optimizing, split the queued commands into messages no longer than this, e.g. to
+            respect the size of the instrument's input buffer. Defaults to the class's
+            ``_max_message_length``, if any.
+
+        The number of commands, messages, and bytes sent with and without optimization are
+        accumulated in `transaction_stats`.
         """
-        self._start_transaction()
-        yield
-        self._end_transaction()
+        if optimize is None:
+            optimize = self.optimize_transactions
+        if max_message_length is None:
+            max_message_length = self._max_message_length
+
+        # Holding the lock means any transaction in progress belongs to this thread
+        with self.lock:
+            if self._in_transaction:
+                yield
+                return
+
+            self._start_transaction(optimize, max_message_length)
+            try:
+                yield
+                self._flush_message_queue()
+            finally:
+                self._end_transaction()
 
-    def _start_transaction(self):
+    def _start_transaction(self, optimize=False, max_message_length=None):
         self._message_queue = []
+        self._optimize_queue = optimize
+        self._queue_max_length = max_message_length
 
     def _end_transaction(self):
-        self._flush_message_queue()
-        self._message_queue = None  # signals end of transaction
+        self._message_queue = None  # signals end of transaction, discarding any unsent messages
 
     def _flush_message_queue(self):
         """Write all queued messages at once"""
-        if not self._in_transaction:
+        if not self._in_transaction or not self._message_queue:
             return
-        message = ';'.join(self._message_queue)
-        self._rsrc.write(message)
+        queue = self._message_queue
         self._message_queue = []
+        message = ';'.join(queue)
+
+        if self._optimize_queue:
+            messages, n_commands = optimize_scpi_messages(queue, self._queue_max_length)
+        else:
+            messages, n_commands = [message], len(queue)
+
+        for optimized in messages:
+            self._rsrc.write(optimized)
+
+        stats = self.transaction_stats
+        stats['flushes'] += 1
+        stats['commands'] += len(queue)
+        stats['bytes'] += len(message)
+        stats['optimized_commands'] += n_commands
+        stats['optimized_messages'] += len(messages)
+        stats['optimized_bytes'] += sum(len(m) for m in messages)
+        log.debug("Flushed %d queued commands as %d messages (%d commands, %d -> %d bytes)",
+                  len(queue), len(messages), n_commands, len(message),
+                  sum(len(m) for m in messages))
+
+    @cached_property
+    def transaction_stats(self):
+        """Counts of what transactions have queued and sent, before and after optimization
+
+        A dict with the number of ``'flushes'`` of the queue, plus the number of ``'commands'`` and
+        ``'bytes'`` queued and the number of ``'optimized_commands'``, ``'optimized_messages'``, and
+        ``'optimized_bytes'`` actually sent. Without optimization, each flush sends one message.
+        Clear it to reset the counts.
+        """
+        return _TransactionStats()
+
+    @property
+    def lock(self):
+        """Reentrant lock shared by all instruments using the same VISA resource
+
+        Held during each `write()`, `query()`, and `transaction()`. Hold it yourself to make a
+        sequence of operations atomic with respect to other threads, e.g. those used by `gather()`.
+        """
+        rsrc = self._rsrc
+        if self._lock_rsrc is not rsrc:
+            self._lock = _resource_lock(rsrc)
+            self._lock_rsrc = rsrc
+        return self._lock
+
+    _lock = _lock_rsrc = None
+
+    def _after_init(self):
+        super(VisaMixin, self)._after_init()
+        # Look up the shared lock once, rather than on every write
+        self._lock_rsrc = getattr(self, '_rsrc', None)
+        if self._lock_rsrc is not None:
+            self._lock = _resource_lock(self._lock_rsrc)
 
     @property
     def _in_transaction(self):
@@ -1149,6 +1269,94 @@ def instrument(inst=None, **kwargs):
         return inst
 
 
+def gather(insts, func, *args, **kwds):
+    """Call a function on several instruments concurrently, returning the results in order
+
+    Each call runs on a shared pool of worker threads, so the wall time of reading the same quantity
+    from many independent instruments is roughly the longest latency instead of the sum of all of
+    them. Calls on instruments that share a VISA resource are run one after another, while holding
+    the resource's `VisaMixin.lock`.
+
+    Parameters
+    ----------
+    insts : sequence of Instrument
+        The instruments to operate on
+    func : callable or str
+        Called as ``func(inst, *args, **kwds)`` for each instrument. If a string, names an attribute
+        of each instrument (e.g. ``'power'`` or ``'query'``); the attribute is called with
+        ``*args`` and ``**kwds`` if it is callable, otherwise its value is returned.
+
+    Returns
+    -------
+    results : list
+        The result for each instrument, in the same order as `insts`. If any call raised an
+        exception, the first such exception is re-raised once all calls have finished.
+
+    Examples
+    --------
+        >>> powers = gather([pm1, pm2, pm3], 'power')
+        >>> x, y = gather([lockin1, lockin2], 'query', 'OUTP?1')
+    """
+    insts = list(insts)
+    if isinstance(func, basestring):
+        attr_name = func
+
+        def func(inst, *args, **kwds):
+            attr = getattr(inst, attr_name)
+            return attr(*args, **kwds) if callable(attr) else attr
+
+    # Group instruments by resource, so calls on a shared resource never run concurrently
+    groups = {}
+    for i, inst in enumerate(insts):
+        key = getattr(inst, '_rsrc', inst) if isinstance(inst, VisaMixin) else inst
+        groups.setdefault(id(key), []).append(i)
+
+    def run_group(indices):
+        results = []
+        for i in indices:
+            inst = insts[i]
+            lock = inst.lock if isinstance(inst, VisaMixin) else _null_lock()
+            with lock:
+                results.append(func(inst, *args, **kwds))
+        return results
+
+    pool = _get_gather_pool()
+    futures = [(indices, pool.submit(run_group, indices)) for indices in groups.values()]
+    results = [None] * len(insts)
+    error = None
+    for indices, future in futures:
+        try:
+            results_for_group = future.result()
+        except Exception as e:
+            error = error or e
+            continue
+        for i, result in zip(indices, results_for_group):
+            results[i] = result
+
+    if error is not None:
+        raise error
+    return results
+
+
+_gather_pool = None
+_gather_pool_lock = threading.Lock()
+
+
+def _get_gather_pool():
+    global _gather_pool
+    with _gather_pool_lock:
+        if _gather_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _gather_pool = ThreadPoolExecutor(max_workers=32,
+                                              thread_name_prefix='instrumental-gather')
+    return _gather_pool
+
+
+@contextlib.contextmanager
+def _null_lock():
+    yield
+
+
 def register_cleanup(func):
     """Register a cleanup function to be called after Instrument cleanup.
 
@@ -4,12 +4,24 @@
 Package containing a driver module/class for each supported camera type.
 """
 import abc
-import json
 import os.path
 import numpy as np
 from .. import Instrument
+from ..util import unit_mag
 from ... import Q_, conf
 from ...errors import Error
+from .streaming import STREAM_POLICIES, Frame, FrameQueue, FrameStream, LiveVideoQueue
+from .acquisition import AcquisitionEngine, AcquisitionStats
+from .recording import FrameRecorder, RecorderStats, load_recording
+from .hotpixels import HotPixelPlan, RunningMedian, load_hot_pixels, save_hot_pixels
+from .reductions import (Reduction, RunningStats, ROIIntegrator, SoftwareBinning, MaxHold,
+                         MinHold, reduce_frames)
+
+__all__ = ['Camera', 'STREAM_POLICIES', 'Frame', 'FrameQueue', 'FrameStream', 'LiveVideoQueue',
+           'AcquisitionEngine', 'AcquisitionStats', 'FrameRecorder', 'RecorderStats',
+           'load_recording', 'HotPixelPlan', 'RunningMedian', 'load_hot_pixels', 'save_hot_pixels',
+           'Reduction', 'RunningStats', 'ROIIntegrator', 'SoftwareBinning', 'MaxHold', 'MinHold',
+           'reduce_frames']
 
 
 
@@ -35,11 +47,19 @@ class Camera(Instrument):
         >>>         arr = cam.latest_frame()
         >>>         do_stuff_with(arr)
         >>> cam.stop_live_video()
+
+    If frames must not be missed, or the consumer needs to hold on to frames without copying
+    them, use `stream()` instead, which leases frames out of a pool of buffers::
+
+        >>> with cam.stream(n_buffers=8) as frames:
+        >>>     for frame in frames:
+        >>>         do_stuff_with(frame.array)
+        >>>         frame.release()
     """
 
     DEFAULT_KWDS = dict(n_frames=1, vbin=1, hbin=1, exposure_time=Q_('10ms'), gain=0, width=None,
                         height=None, cx=None, cy=None, left=None, right=None, top=None, bot=None,
-                        fix_hotpixels=False)
+                        fix_hotpixels=False, force=False)
 
     @abc.abstractproperty
     def width(self):
@@ -62,8 +82,17 @@ class Camera(Instrument):
         pass
 
     _hot_pixels = None
+    _hot_pixel_shape = None
+    _hot_pixel_plan = None
     _defaults = None
 
+    #: Names of the settings applied with `_apply_setting()` that change `max_width` and
+    #: `max_height`. Drivers that set this get the max size cached until one of them changes,
+    #: rather than queried on every capture.
+    _SIZE_SETTINGS = None
+    _applied_config = None
+    _max_size_cache = None
+
     @abc.abstractmethod
     def start_capture(self, **kwds):
         """Start a capture sequence and return immediately.
@@ -84,7 +113,7 @@ class Camera(Instrument):
         """
 
     @abc.abstractmethod
-    def get_captured_image(self, timeout='1s', copy=True):
+    def get_captured_image(self, timeout='1s', copy=True, out=None):
         """Get the image array(s) from the last capture sequence.
 
         Returns an image numpy array (or tuple of arrays for a multi-exposure sequence). The array
@@ -100,10 +129,16 @@ class Camera(Instrument):
         copy : bool, optional
             Whether to copy the image memory or directly reference the underlying buffer. It is
             recommended to use *True* (the default) unless you know what you're doing.
+        out : numpy.ndarray, optional
+            Preallocated array to write the image data into, which is then returned instead of a
+            newly allocated array. For a multi-exposure sequence, `out` is a stack of images with
+            shape *(n_frames, height, width)* (or *(n_frames, height, width, 3)* for RGB), and the
+            images are written along its first axis. Reusing the same `out` avoids allocating a
+            new array for every capture.
         """
 
     @abc.abstractmethod
-    def grab_image(self, timeouts='1s', copy=True, **kwds):
+    def grab_image(self, timeouts='1s', copy=True, out=None, **kwds):
         """Perform a capture and return the resulting image array(s).
 
         This is essentially a convenience function that calls `start_capture()` then
@@ -118,6 +153,9 @@ class Camera(Instrument):
         copy : bool, optional
             Whether to copy the image memory or directly reference the underlying buffer. It is
             recommended to use *True* (the default) unless you know what you're doing.
+        out : numpy.ndarray, optional
+            Preallocated array (or stack of arrays) to write the image data into. See
+            `get_captured_image()`.
 
         You can specify other parameters of the capture as keyword arguments. These include:
 
@@ -147,6 +185,10 @@ class Camera(Instrument):
             Top edge of the ROI
         bot : int
             Bottom edge of the ROI
+        force : bool
+            Whether to push every setting to the camera, even those unchanged since the last
+            capture. Drivers normally skip reapplying unchanged settings, which may leave them
+            stale if the camera was reconfigured by other means.
         """
 
     @abc.abstractmethod
@@ -184,7 +226,7 @@ class Camera(Instrument):
         """
 
     @abc.abstractmethod
-    def latest_frame(self, copy=True):
+    def latest_frame(self, copy=True, out=None):
         """Get the latest image frame in live mode.
 
         Returns the image array received on the most recent successful call to `wait_for_frame()`.
@@ -194,7 +236,88 @@ class Camera(Instrument):
         copy : bool, optional
             Whether to copy the image memory or directly reference the underlying buffer. It is
             recommended to use *True* (the default) unless you know what you're doing.
+        out : numpy.ndarray, optional
+            Preallocated array to write the image data into, which is then returned.
+        """
+
+    @unit_mag(timeout='?s')
+    def stream(self, n_buffers=4, policy='drop_oldest', timeout='1s', **kwds):
+        """Start live video and return a `FrameStream` iterating over the acquired frames.
+
+        Each frame is yielded as a `Frame` whose data is leased from a pool of `n_buffers` image
+        buffers. A leased buffer is never overwritten, so ``frame.array`` can be used without
+        copying until ``frame.release()`` is called. Drivers with a native buffer queue lease the
+        SDK's own buffers; others copy each frame from `latest_frame()` into the pool.
+
+        Parameters
+        ----------
+        n_buffers : int, optional
+            Max number of frames that may be leased at once
+        policy : {'drop_oldest', 'block'}, optional
+            What to do when every buffer is leased. 'drop_oldest' discards the oldest frame that
+            has not been handed out yet, so the stream keeps up with the camera; the stream's
+            `n_dropped` counts these. 'block' stops taking frames from the camera until a frame is
+            released.
+        timeout : Quantity([time]) or None, optional
+            Max time to wait for each frame. If exceeded, iteration raises a TimeoutError. If
+            *None*, will block forever.
+
+        See `grab_image()` for the set of other available kwds.
         """
+        if policy not in STREAM_POLICIES:
+            raise ValueError("policy must be one of {}".format(STREAM_POLICIES))
+        defaults = self.DEFAULT_KWDS if self._defaults is None else self._defaults
+        exposure_time = kwds.get('exposure_time', defaults.get('exposure_time'))
+        exposure_time = None if exposure_time is None else Q_(exposure_time)
+        queue = self._open_frame_queue(n_buffers, policy, **kwds)
+        return FrameStream(queue, timeout, exposure_time)
+
+    def _open_frame_queue(self, n_buffers, policy, **kwds):
+        """Start acquisition and return the `FrameQueue` feeding `stream()`
+
+        Drivers whose SDK queues image buffers natively should override this to lease those
+        buffers directly instead of copying out of the live video buffer.
+        """
+        return LiveVideoQueue(self, n_buffers, policy, **kwds)
+
+    def _out_slot(self, out, index, ndim=2):
+        """The part of `out` that receives image number `index` of a capture sequence
+
+        `out` is either a single image with `ndim` dimensions or a stack of such images.
+        """
+        if out.ndim == ndim:
+            if index > 0:
+                raise ValueError("out holds a single image, but the capture has several. Pass a "
+                                 "stack with shape (n_frames,) + image shape instead")
+            return out
+        return out[index]
+
+    def _copy_to_out(self, out, image, index=0):
+        """Copy `image` into `out`, or into ``out[index]`` if `out` is a stack of images
+
+        Returns the part of `out` that was written to.
+        """
+        target = self._out_slot(out, index, image.ndim)
+        if target.shape != image.shape:
+            raise ValueError("out has shape {}, but the image has shape {}".format(out.shape,
+                                                                                image.shape))
+        np.copyto(target, image)
+        return target
+
+    def _images_result(self, images, out=None):
+        """Return a capture's images the way `get_captured_image()` does
+
+        Without `out`, returns the lone image or a tuple of images. Otherwise, copies any images
+        that aren't already in `out` into it, and returns `out`, trimmed to the number of images
+        if it is a stack.
+        """
+        if out is None:
+            return images[0] if len(images) == 1 else tuple(images)
+
+        for i, image in enumerate(images):
+            if not np.may_share_memory(image, out):
+                self._copy_to_out(out, image, i)
+        return out if out.ndim == images[0].ndim else out[:len(images)]
 
     def set_defaults(self, **kwds):
         if self._defaults is None:
@@ -224,10 +347,11 @@ class Camera(Instrument):
     def fill_all_coords(self, kwds, names):
         n_args = sum(kwds[n] is not None for n in names)
         if n_args == 0:
-            kwds[names[0]] = getattr(self, 'max_' + names[0])  # max_width or max_height
+            # max_width or max_height
+            kwds[names[0]] = self._max_size('max_' + names[0], kwds.get('force'))
             kwds[names[2]] = 0  # left or top = 0
         elif n_args == 1:
-            max_width = getattr(self, 'max_' + names[0])
+            max_width = self._max_size('max_' + names[0], kwds.get('force'))
             if kwds[names[2]] is not None:  # Left given
                 kwds[names[3]] = max_width
             elif kwds[names[3]] is not None:  # Right given
@@ -275,61 +399,150 @@ class Camera(Instrument):
 
         kwds.update(zip(names, (width, cx, left, right)))
 
-    def find_hot_pixels(self, stddevs=10, **kwds):
-        """Generate the list of hot pixels on the camera sensor."""
-        img = self.grab_image(**kwds)
-        avg = np.mean(img)
-        stddev = np.sqrt(np.var(img))
-
-        threshold = avg + stddevs*stddev
-        pixels = np.argwhere(img > threshold)
-
-        # Cast to avoid the indices being longs in Py2
-        self._hot_pixels = pixels.astype('int32', copy=False).tolist()
+    def _max_size(self, name, force=False):
+        """`max_width` or `max_height`, cached if the driver declares its `_SIZE_SETTINGS`"""
+        if self._SIZE_SETTINGS is None:
+            return getattr(self, name)
+        if self._max_size_cache is None:
+            self._max_size_cache = {}
+        if force or name not in self._max_size_cache:
+            self._max_size_cache[name] = getattr(self, name)
+        return self._max_size_cache[name]
+
+    def _apply_setting(self, kwds, name, setter, *args):
+        """Call ``setter(*args)``, unless setting `name` was last applied with equal args
+
+        This lets drivers skip pushing an unchanged ROI, binning, exposure, etc. to the camera on
+        every capture. Every setting is applied if `kwds` has ``force=True``. Returns whether the
+        setting was applied.
+        """
+        if self._applied_config is None:
+            self._applied_config = {}
+        applied = self._applied_config
+        if not kwds.get('force') and name in applied and _same_args(applied[name], args):
+            return False
+
+        applied.pop(name, None)  # The setting's state is unknown if the setter fails
+        if self._SIZE_SETTINGS and name in self._SIZE_SETTINGS:
+            self._max_size_cache = None
+        setter(*args)
+        applied[name] = args
+        return True
+
+    def _forget_config(self, *names):
+        """Forget the applied values of settings `names` (or of every setting)
+
+        Drivers call this when a setting is changed outside of `_apply_setting()`, so that it is
+        reapplied on the next capture.
+        """
+        if not names:
+            self._applied_config = None
+            self._max_size_cache = None
+        elif self._applied_config is not None:
+            for name in names:
+                self._applied_config.pop(name, None)
+                if self._SIZE_SETTINGS and name in self._SIZE_SETTINGS:
+                    self._max_size_cache = None
+
+    def _image_geometry(self, kwds):
+        """The (top, left, vbin, hbin) of images captured with `kwds`, in binned pixels"""
+        kwds = dict(kwds)
+        self._handle_kwds(kwds)
+        return kwds['top'], kwds['left'], kwds['vbin'], kwds['hbin']
+
+    def find_hot_pixels(self, stddevs=10, stack_size=1, **kwds):
+        """Generate the list of hot pixels on the camera sensor.
+
+        Captures `stack_size` images and flags the pixels of their per-pixel median that lie more
+        than `stddevs` standard deviations above its mean. Using a median of several images keeps
+        transient events like cosmic rays from being mistaken for hot pixels. The hot pixels are
+        recorded in unbinned sensor coordinates, so they can be used with any ROI or binning.
+
+        Other kwds are passed to `grab_image()`.
+        """
+        top, left, vbin, hbin = self._image_geometry(kwds)
+        median = RunningMedian()
+        img = None
+        for _ in range(stack_size):
+            img = self.grab_image(out=img, **kwds)
+            median.add(img)
+        img = median.result()
+
+        threshold = img.mean() + stddevs*img.std()
+        ys, xs = np.nonzero(img > threshold)
+        self._set_hot_pixels(np.column_stack(((ys + top) * vbin, (xs + left) * hbin)),
+                             ((top + img.shape[0]) * vbin, (left + img.shape[1]) * hbin))
+
+    def _set_hot_pixels(self, pixels, shape=None):
+        pixels = np.asarray(pixels, dtype='int32').reshape(-1, 2)
+        extent = tuple(pixels.max(axis=0) + 1) if len(pixels) else (0, 0)
+        self._hot_pixels = pixels
+        self._hot_pixel_shape = tuple(np.maximum(extent, shape or extent))
+        self._hot_pixel_plan = None
 
     def save_hot_pixels(self, path=None):
-        """Save a file listing the hot pixels."""
+        """Save a file listing the hot pixels.
+
+        The pixels are saved as a compressed, bit-packed sensor mask in an ``.npz`` file, unless
+        `path` ends in ``.json``, in which case they are saved as a list of coordinates.
+        """
         if self._hot_pixels is None:
             raise Error("No existing list of hot pixels to save. Generate one first by using "
                         "`find_hot_pixels()`")
 
         if not path:
             if self._alias:
-                path = os.path.join(conf.user_conf_dir, 'hotpixel_{}.json'.format(self._alias))
+                path = os.path.join(conf.user_conf_dir, 'hotpixel_{}.npz'.format(self._alias))
             else:
-                path = 'hotpixel.json'
+                path = 'hotpixel.npz'
 
-        with open(path, 'w') as f:
-            json.dump({'hot_pixels': self._hot_pixels}, f)
+        save_hot_pixels(path, self._hot_pixels, self._hot_pixel_shape)
 
         new_path = os.path.abspath(path)
         if self._alias and self._param_dict.get('hotpixel_file', None) != new_path:
             self._param_dict['hotpixel_file'] = new_path
             self.save_instrument(self._alias, force=True)
 
-    def _correct_hot_pixels(self, img):
-        """Correct hot pixels by averaging their neighbors."""
+    def load_hot_pixels(self, path):
+        """Load hot pixels from a file written by `save_hot_pixels()`"""
+        self._set_hot_pixels(*load_hot_pixels(path))
+
+    def _correct_hot_pixels(self, img, kwds=None, in_place=False):
+        """Correct hot pixels by averaging their neighbors, returning the corrected image.
+
+        `kwds` are the capture kwds that determine the image's ROI and binning. The correction plan
+        for that geometry is cached, and only rebuilt when the geometry changes. The image is copied
+        first unless `in_place` is true, which callers should only pass for images they own, never
+        for views of driver buffers. Read-only images are always copied.
+        """
         if self._hot_pixels is None:
             raise Error("Could not correct hot pixels because we have no existing list of hot "
                         "pixels. Generate one first by using `find_hot_pixels()`")
 
-        if len(img.shape) != 2:
-            raise NotImplementedError("Hot pixel correction currently implemented only for "
-                                      "monochrome sensors")
+        if kwds is None:
+            geometry = (0, 0, 1, 1)
+        else:
+            geometry = (kwds['top'], kwds['left'], kwds['vbin'], kwds['hbin'])
+        key = (img.shape,) + geometry
+
+        if self._hot_pixel_plan is None or self._hot_pixel_plan[0] != key:
+            self._hot_pixel_plan = (key, HotPixelPlan(self._hot_pixels, img.shape, *geometry))
+
+        if not (in_place and img.flags.writeable):
+            img = img.copy()
+        return self._hot_pixel_plan[1].apply(img)
+
 
-        # TODO: Probably shouldn't include adjacent hot pixels
-        img = img.copy()
-        for y, x in self._hot_pixels:
-            left = max(0, x-1)
-            right = min(img.shape[1], x+2)
-            top = max(0, y-1)
-            bot = min(img.shape[0], y+2)
-            img[y, x] = (img[top:bot, left:right].sum() - img[y, x])/((bot-top)*(right-left)-1)
-        return img
+def _same_args(args, other):
+    """Whether two tuples of setting args are equal, treating incomparable values as unequal"""
+    if len(args) != len(other):
+        return False
+    try:
+        return all(bool(a == b) for a, b in zip(args, other))
+    except Exception:
+        return False
 
 
 def _init_instrument(cam, params):
     if 'hotpixel_file' in params:
-        with open(params['hotpixel_file']) as f:
-            hotpixel_data = json.load(f)
-            cam._hot_pixels = hotpixel_data['hot_pixels']
+        cam.load_hot_pixels(params['hotpixel_file'])
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Background frame acquisition for any `Camera`.
+
+An `AcquisitionEngine` pulls frames from `Camera.stream()` on a dedicated thread and holds them in
+a bounded queue. They are then either handed to registered ``on_frame`` callbacks, which run on a
+separate dispatch thread, or pulled by a consumer with `AcquisitionEngine.get()`.
+"""
+import time
+import threading
+from collections import deque
+
+from ...errors import Error, TimeoutError
+from ...log import get_logger
+
+log = get_logger(__name__)
+
+#: Valid values for the `backpressure` argument of `AcquisitionEngine`
+BACKPRESSURE_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+#: Seconds the worker threads wait before rechecking whether the engine is stopping
+POLL_INTERVAL = 0.1
+
+
+class AcquisitionStats(object):
+    """Counts and timings of the frames an `AcquisitionEngine` has handled. Times are in seconds."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        #: Frames received from the camera, and frames delivered to callbacks or `get()`
+        self.received = self.delivered = 0
+        #: Frames discarded because the queue was full
+        self.dropped = 0
+        #: Frames the camera acquired but the stream never received, as far as the driver can tell
+        self.camera_dropped = 0
+        #: Max number of frames waiting in the queue at once
+        self.max_queued = 0
+        #: Total and max time from receiving a frame to delivering it
+        self.latency = self.max_latency = 0.
+        #: Total time spent in callbacks, and the number of exceptions they raised
+        self.callback_time = 0.
+        self.callback_errors = 0
+        self.start_time = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        """Time since the stats were last cleared"""
+        return time.perf_counter() - self.start_time
+
+    @property
+    def throughput(self):
+        """Frames delivered per second"""
+        elapsed = self.elapsed
+        return self.delivered / elapsed if elapsed else 0.
+
+    @property
+    def mean_latency(self):
+        """Mean time from receiving a frame to delivering it"""
+        return self.latency / self.delivered if self.delivered else 0.
+
+    def __repr__(self):
+        return ('<AcquisitionStats: received {}, delivered {} ({:.1f}/s), dropped {} + {} by '
+                'camera, latency {:.2f}ms mean, {:.2f}ms max>'.format(
+                    self.received, self.delivered, self.throughput, self.dropped,
+                    self.camera_dropped, self.mean_latency*1e3, self.max_latency*1e3))
+
+
+class AcquisitionEngine(object):
+    """Acquires frames from a camera on a background thread
+
+    Frames are received from `Camera.stream()` and held in a queue of at most `maxsize` frames.
+    If callbacks have been registered with `on_frame()` when the engine starts, a dispatch thread
+    passes each frame to them in turn and releases it once they all return. Otherwise consumers
+    pull frames with `get()` or by iterating over the engine, and must release each one.
+
+    Parameters
+    ----------
+    camera : Camera
+        Camera to acquire from
+    maxsize : int, optional
+        Max number of frames held in the queue
+    backpressure : {'drop_oldest', 'drop_newest', 'block'}, optional
+        What to do with a new frame when the queue is full. 'drop_oldest' discards the oldest
+        queued frame to make room, and 'drop_newest' discards the new frame. 'block' stops
+        receiving frames until there is room, leaving it up to the camera's stream to drop frames.
+    n_buffers : int, optional
+        Number of frame buffers in the camera stream. Defaults to `maxsize` + 2, which leaves room
+        for a frame being received and one being processed.
+
+    Any other keyword arguments are passed to `Camera.stream()`.
+    """
+    def __init__(self, camera, maxsize=8, backpressure='drop_oldest', n_buffers=None, **kwds):
+        if backpressure not in BACKPRESSURE_POLICIES:
+            raise ValueError("backpressure must be one of {}".format(BACKPRESSURE_POLICIES))
+        self.camera = camera
+        self.maxsize = maxsize
+        self.backpressure = backpressure
+        self.n_buffers = maxsize + 2 if n_buffers is None else n_buffers
+        self.stream_kwds = kwds
+        self.stats = AcquisitionStats()
+        #: Exception that stopped the acquisition thread, if any
+        self.error = None
+
+        self.callbacks = []
+        self.stream = None
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._threads = []
+
+    def __repr__(self):
+        state = 'running' if self.running else 'stopped'
+        return '<AcquisitionEngine for {!r} ({}, {} queued)>'.format(self.camera, state,
+                                                                     len(self._queue))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __iter__(self):
+        while True:
+            frame = self._get(None)
+            if frame is None:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield frame
+
+    @property
+    def running(self):
+        """Whether the acquisition thread is running"""
+        return any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def dispatching(self):
+        """Whether frames are being delivered to callbacks rather than to `get()`"""
+        return len(self._threads) > 1
+
+    @property
+    def n_queued(self):
+        """Number of frames waiting in the queue"""
+        return len(self._queue)
+
+    def on_frame(self, callback):
+        """Register `callback` to be called with each `Frame`
+
+        Callbacks run on the engine's dispatch thread, in the order they were registered. The
+        frame is released once every callback has returned, so copy any data you need to keep.
+        Returns `callback`, so this can be used as a decorator.
+        """
+        if self._threads and not self.dispatching:
+            raise Error("Callbacks must be registered before starting an engine that has none")
+        with self._cond:
+            self.callbacks = self.callbacks + [callback]
+        return callback
+
+    def remove_callback(self, callback):
+        """Stop calling `callback` for new frames"""
+        with self._cond:
+            self.callbacks = [cb for cb in self.callbacks if cb is not callback]
+
+    def start(self):
+        """Start the camera stream and the acquisition (and dispatch) threads"""
+        if self._threads:
+            raise Error("Engine has already been started")
+
+        policy = 'block' if self.backpressure == 'block' else 'drop_oldest'
+        self.stream = self.camera.stream(self.n_buffers, policy, **self.stream_kwds)
+        self.stats.clear()
+
+        self._threads.append(threading.Thread(target=self._acquire,
+                                              name='instrumental-acquisition'))
+        if self.callbacks:
+            self._threads.append(threading.Thread(target=self._dispatch,
+                                                  name='instrumental-dispatch'))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        """Stop acquiring, wait for the threads to finish, and release any queued frames
+
+        Raises the exception that stopped the acquisition thread, if there was one.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._stopping = False
+
+        while self._queue:
+            self._queue.popleft().release()
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def get(self, timeout=None):
+        """Wait for and return the next queued `Frame`, which the caller must release
+
+        Parameters
+        ----------
+        timeout : float or None, optional
+            Max time to wait in seconds. If exceeded, a TimeoutError is raised. If *None*, will
+            block until a frame arrives or the engine stops.
+        """
+        if self.dispatching:
+            raise Error("Frames are being delivered to callbacks")
+        frame = self._get(timeout)
+        if frame is None:
+            if self.error is not None:
+                raise self.error
+            raise Error("Engine is not running")
+        return frame
+
+    def _get(self, timeout):
+        """Pop the next frame, returning None if the engine is stopping or not running"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            while True:
+                if self._stopping or not self._threads:
+                    return None
+                if self._queue:
+                    break
+                wait = POLL_INTERVAL
+                if deadline is not None:
+                    wait = min(wait, deadline - time.perf_counter())
+                    if wait <= 0:
+                        raise TimeoutError("Timed out waiting for a frame")
+                self._cond.wait(wait)
+            frame = self._queue.popleft()
+            self._cond.notify_all()
+
+        latency = time.perf_counter() - frame.timestamp
+        stats = self.stats
+        with stats.lock:
+            stats.delivered += 1
+            stats.latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+        return frame
+
+    def _acquire(self):
+        stream = self.stream
+        try:
+            while not self._stopping:
+                try:
+                    frame = stream.next_frame(POLL_INTERVAL)
+                except TimeoutError:
+                    continue
+                with self.stats.lock:
+                    self.stats.received += 1
+                    self.stats.camera_dropped = stream.n_dropped
+                self._put(frame)
+        except Exception as e:
+            log.exception('Acquisition from %r failed', self.camera)
+            self.error = e
+        finally:
+            with self._cond:
+                self._stopping = True
+                self._cond.notify_all()
+
+    def _put(self, frame):
+        dropped = None
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                if self.backpressure == 'block':
+                    while len(self._queue) >= self.maxsize and not self._stopping:
+                        self._cond.wait(POLL_INTERVAL)
+                    if self._stopping:
+                        dropped = frame
+                elif self.backpressure == 'drop_newest':
+                    dropped = frame
+                else:
+                    dropped = self._queue.popleft()
+
+            if dropped is not frame:
+                self._queue.append(frame)
+                self._cond.notify_all()
+            n_queued = len(self._queue)
+
+        with self.stats.lock:
+            self.stats.max_queued = max(self.stats.max_queued, n_queued)
+            if dropped is not None:
+                self.stats.dropped += 1
+        if dropped is not None:
+            dropped.release()
+
+    def _dispatch(self):
+        while True:
+            frame = self._get(None)
+            if frame is None:
+                return
+
+            start = time.perf_counter()
+            with frame:
+                for callback in self.callbacks:
+                    try:
+                        callback(frame)
+                    except Exception:
+                        log.exception('Frame callback %r failed', callback)
+                        with self.stats.lock:
+                            self.stats.callback_errors += 1
+            with self.stats.lock:
+                self.stats.callback_time += time.perf_counter() - start
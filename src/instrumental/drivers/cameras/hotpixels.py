@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Hot pixel detection and correction.
+
+Hot pixels are kept as an (N, 2) array of *(row, column)* coordinates on the unbinned sensor. To
+correct images with a given ROI and binning, those coordinates are turned into a `HotPixelPlan`
+once, which then corrects each image in place with a few vectorized NumPy operations.
+"""
+import json
+import os.path
+
+import numpy as np
+
+# Offsets of the 8 neighbors of a pixel
+_NEIGHBOR_DY, _NEIGHBOR_DX = [np.array(a) for a in zip(*[(dy, dx) for dy in (-1, 0, 1)
+                                                         for dx in (-1, 0, 1) if dy or dx])]
+
+
+class HotPixelPlan(object):
+    """Precomputed replacement of the hot pixels in images of one shape and geometry
+
+    Each hot pixel is replaced by the mean of its neighbors, leaving out any neighbors that are
+    themselves hot. Hot pixels whose neighbors are all hot are left alone.
+
+    Parameters
+    ----------
+    pixels : array of int, shape (N, 2)
+        Sensor coordinates *(row, column)* of the hot pixels
+    shape : tuple
+        Shape of the images to correct
+    top, left : int, optional
+        Position of the image's top-left pixel, in binned pixels
+    vbin, hbin : int, optional
+        Vertical and horizontal binning of the image
+    """
+    def __init__(self, pixels, shape, top=0, left=0, vbin=1, hbin=1):
+        height, width = shape[:2]
+        pixels = np.asarray(pixels, dtype=np.intp).reshape(-1, 2)
+        ys = pixels[:, 0] // vbin - top
+        xs = pixels[:, 1] // hbin - left
+        inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+
+        hot = np.zeros((height, width), dtype=bool)
+        hot[ys[inside], xs[inside]] = True
+        ys, xs = np.nonzero(hot)  # Binning may have merged several hot pixels into one
+
+        ny = ys[:, None] + _NEIGHBOR_DY
+        nx = xs[:, None] + _NEIGHBOR_DX
+        valid = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)
+        np.clip(ny, 0, height - 1, out=ny)
+        np.clip(nx, 0, width - 1, out=nx)
+        valid &= ~hot[ny, nx]
+
+        counts = valid.sum(axis=1)
+        fixable = counts > 0
+        self.shape = tuple(shape)
+        self.ys, self.xs = ys[fixable], xs[fixable]
+        self.neighbor_ys, self.neighbor_xs = ny[fixable], nx[fixable]
+        self.weights = valid[fixable] / counts[fixable, None]
+
+    def __len__(self):
+        return len(self.ys)
+
+    def apply(self, img):
+        """Correct the hot pixels of `img` in place, returning `img`"""
+        if img.shape != self.shape:
+            raise ValueError("Plan is for images of shape {}, not {}".format(self.shape,
+                                                                            img.shape))
+        weights = self.weights.reshape(self.weights.shape + (1,)*(img.ndim - 2))
+        values = (img[self.neighbor_ys, self.neighbor_xs] * weights).sum(axis=1)
+        if img.dtype.kind in 'iu':
+            values = np.rint(values)
+        img[self.ys, self.xs] = values
+        return img
+
+
+class RunningMedian(object):
+    """Per-pixel median of a stack of images, accumulated one image at a time
+
+    Images are collected into a buffer of `base` images. Whenever the buffer fills up, it is
+    reduced to its median, which is passed up to a buffer at the next level, so memory use grows
+    only logarithmically with the number of images (the "remedian"). The result is exact for up
+    to `base` images and a close approximation beyond that.
+    """
+    def __init__(self, base=9):
+        self.base = base
+        self.levels = []  # [buffer, n_filled] for each level
+        self.count = 0
+
+    def add(self, image):
+        """Add an image to the stack"""
+        self._add(0, image)
+        self.count += 1
+
+    def _add(self, level, image):
+        if level == len(self.levels):
+            self.levels.append([np.empty((self.base,) + image.shape, image.dtype), 0])
+        entry = self.levels[level]
+        buf, n = entry
+        buf[n] = image
+        entry[1] = n = n + 1
+        if n == self.base:
+            entry[1] = 0
+            self._add(level + 1, np.median(buf, axis=0).astype(buf.dtype, copy=False))
+
+    def result(self):
+        """Median of the images added so far"""
+        if not self.count:
+            raise ValueError("No images have been added")
+        parts = [buf[:n] for buf, n in self.levels if n]
+        return np.median(np.concatenate(parts), axis=0)
+
+
+def save_hot_pixels(path, pixels, shape):
+    """Save hot pixels to `path` as a bit-packed sensor mask in an ``.npz`` file
+
+    A path ending in ``.json`` saves the legacy list of coordinates instead.
+    """
+    pixels = np.asarray(pixels, dtype='int32').reshape(-1, 2)
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump({'hot_pixels': pixels.tolist()}, f)
+        return
+
+    mask = np.zeros(shape, dtype=bool)
+    mask[pixels[:, 0], pixels[:, 1]] = True
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, shape=np.array(shape), mask=np.packbits(mask, axis=None))
+
+
+def load_hot_pixels(path):
+    """Load hot pixels saved by `save_hot_pixels()`, returning ``(pixels, shape)``
+
+    `shape` is None for legacy JSON files, which don't record it.
+    """
+    if os.path.splitext(path)[1] == '.json':
+        with open(path) as f:
+            pixels = json.load(f)['hot_pixels']
+        return np.array(pixels, dtype='int32').reshape(-1, 2), None
+
+    with np.load(path) as data:
+        shape = tuple(int(n) for n in data['shape'])
+        mask = np.unpackbits(data['mask'], count=int(np.prod(shape))).reshape(shape)
+    return np.argwhere(mask).astype('int32'), shape
@@ -7,7 +7,9 @@ from future.utils import PY2
 
 import os
 import os.path
+import time
 import tempfile
+import threading
 import warnings
 from enum import Enum
 
@@ -17,6 +19,7 @@ from pycparser import CParser
 from nicelib import NiceLib, Sig, NiceObject, RetHandler
 
 from . import Camera
+from .streaming import FrameQueue, _remaining
 from ..util import as_enum, unit_mag, check_units
 from .. import ParamSet
 from ...errors import Error, TimeoutError, PCOError
@@ -254,16 +257,55 @@ class BufferInfo(object):
         self.event = event
 
 
+class PCOFrameQueue(FrameQueue):
+    """Leases the driver's image buffers directly, re-queuing each one as soon as it is released
+
+    Acquisition runs with `n_buffers` driver buffers, and waiting for a frame blocks on the
+    driver's event for the oldest queued buffer. While every buffer is leased, none are queued, so
+    the camera drops frames until one is released, under either policy.
+    """
+    def __init__(self, cam, n_buffers, policy, **kwds):
+        super(PCOFrameQueue, self).__init__(n_buffers, policy)
+        self._cam = cam
+        cam.start_live_video(n_buffers=n_buffers, **kwds)
+        cam.shutter = 'leased'  # Keep wait_for_frame() from re-queuing buffers behind our back
+
+    def get(self, timeout):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        cam = self._cam
+        with self._cond:
+            while not cam.queue:
+                if not self._cond.wait(_remaining(deadline)):
+                    raise TimeoutError("Timed out waiting for a leased frame to be released")
+
+        remaining = _remaining(deadline)
+        buf = cam._wait_for_buffer(None if remaining is None else remaining * 1e3)
+        if buf is None:
+            raise TimeoutError("Timed out waiting for a frame")
+        with self._cond:
+            self.n_leased += 1
+        return buf, cam._buffer_array(buf), None
+
+    def release(self, buf):
+        self._cam._push_on_queue(buf)
+        self._return_lease()
+
+    def close(self):
+        self._cam.stop_live_video()
+
+
 class PCO_Camera(Camera):
     _INST_PARAMS_ = ['number', 'interface']
     _INST_PRIORITY_ = 9  # This driver is very slow
 
     DEFAULT_KWDS = Camera.DEFAULT_KWDS.copy()
     DEFAULT_KWDS.update(trig='software', rising=True)
+    _SIZE_SETTINGS = ('binning',)
 
     def _initialize(self):
         self.buffers = []
         self.queue = []
+        self._queue_lock = threading.Lock()  # Buffers may be re-queued from a consumer thread
         self._partial_sequence = []
         self._buf_size = 0
         self.shutter = None
@@ -312,6 +354,7 @@ class PCO_Camera(Camera):
             extern_pulse - Hardware trigger; delay and exposure are determined by the pulse length
         """
         self._trig_mode = as_enum(self.TriggerMode, mode)
+        self._forget_config('trig')
         self._cam.SetTriggerMode(self._trig_mode.value)
 
         HW_IO_SIGNAL_DESCRIPTOR = 0x40000000
@@ -508,6 +551,11 @@ class PCO_Camera(Camera):
         return format
 
     def _allocate_buffers(self, nbufs=None):
+        """Make sure at least `nbufs` buffers of the current frame size are allocated
+
+        Existing buffers are kept if they are the right size, so switching between captures and
+        live video doesn't reallocate them.
+        """
         if nbufs is None:
             if len(self.buffers) > 1:
                 nbufs = len(self.buffers)
@@ -516,14 +564,18 @@ class PCO_Camera(Camera):
             else:
                 nbufs = 1
 
-        # Clean up existing buffers
         # If currently recording, stop recording.
         if self._cam.GetRecordingState():
             self._cam.SetRecordingState(0)
         self._clear_queue()
-        self._free_buffers()
 
-        self._buf_size = self._frame_size()
+        frame_size = self._frame_size()
+        if frame_size == self._buf_size and len(self.buffers) >= nbufs:
+            return
+
+        # Clean up existing buffers
+        self._free_buffers()
+        self._buf_size = frame_size
 
         # Allocate new buffers
         for i in range(nbufs):
@@ -536,14 +588,29 @@ class PCO_Camera(Camera):
         self.buffers = []
 
     def _clear_queue(self):
-        self.queue = []
-        self._cam.CancelImages()
+        with self._queue_lock:
+            self.queue = []
+            self._cam.CancelImages()
 
     def _push_on_queue(self, buf):
         width, height, _, _ = self._get_sizes()
         depth = self._data_depth()
-        self._cam.AddBufferEx(0, 0, buf.num, width, height, depth)
-        self.queue.append(buf)
+        with self._queue_lock:
+            self._cam.AddBufferEx(0, 0, buf.num, width, height, depth)
+            self.queue.append(buf)
+
+    def _buffer_array(self, buf, copy=False):
+        """View (or copy) the image in `buf` as an array, trimmed to the soft ROI"""
+        image_buf = ffi.buffer(buf.address, self._buf_size)
+        image_buf = memoryview(image_buf[:] if copy else image_buf)
+
+        # Convert to array (currently assumes mono16)
+        width, height, _, _ = self._get_sizes()
+        array = np.frombuffer(image_buf, np.uint16, width * height).reshape((height, width))
+
+        # Handle soft ROI
+        left, top = self._roi_trim_left, self._roi_trim_top
+        return array[top:top + self._soft_height, left:left + self._soft_width]
 
     def _frame_size(self):
         """Calculate the size (in bytes) a buffer needs to hold an image with the current
@@ -557,6 +624,16 @@ class PCO_Camera(Camera):
     def _set_binning(self, hbin, vbin):
         self._cam.SetBinning(hbin, vbin)
 
+    def _apply_geometry(self, kwds):
+        """Apply the binning and ROI of `kwds`, if changed, returning whether either was"""
+        changed = self._apply_setting(kwds, 'binning', self._set_binning, kwds['vbin'],
+                                      kwds['hbin'])
+        if changed:
+            self._forget_config('roi')  # The ROI is in binned pixels
+        changed |= self._apply_setting(kwds, 'roi', self._set_ROI, kwds['left'], kwds['top'],
+                                       kwds['right'], kwds['bot'])
+        return changed
+
     def start_capture(self, **kwds):
         self._handle_kwds(kwds)
         
@@ -564,15 +641,19 @@ class PCO_Camera(Camera):
         if self._cam.GetRecordingState():
             self._cam.SetRecordingState(0)
 
-        self._set_binning(kwds['vbin'], kwds['hbin'])
-        self._set_ROI(kwds['left'], kwds['top'], kwds['right'], kwds['bot'])
-        self._set_delay_exposure_time(delay='0s', exposure=kwds['exposure_time'])
-        self._cam.ArmCamera()
+        # Only push the settings that changed since the last capture
+        changed = self._apply_geometry(kwds)
+        changed |= self._apply_setting(kwds, 'exposure_time', self._set_delay_exposure_time,
+                                       '0s', kwds['exposure_time'])
+        if changed:
+            self._cam.ArmCamera()
         self._allocate_buffers(kwds['n_frames'])
-        self._cam.ArmCamera()
+        if changed:
+            self._cam.ArmCamera()
 
         if 'trig' in kwds:
-            self.set_trigger_mode(kwds['trig'], kwds.get('rising', True))
+            self._apply_setting(kwds, 'trig', self.set_trigger_mode, kwds['trig'],
+                                kwds.get('rising', True))
 
         # Prepare CameraLink interface if using one.
         if self._is_using_camera_link():
@@ -589,7 +670,7 @@ class PCO_Camera(Camera):
             self._cam.SetRecordingState(1)
 
         # Add buffers to the queue
-        for buf in self.buffers:
+        for buf in self.buffers[:kwds['n_frames']]:
             self._push_on_queue(buf)
 
         # If using a Camera Link interface, start recording now that the buffers
@@ -606,10 +687,8 @@ class PCO_Camera(Camera):
         self._clear_queue()
 
     @check_units(timeout='?ms')
-    def get_captured_image(self, timeout='1s', copy=True, wait_for_all=True, **kwds):
+    def get_captured_image(self, timeout='1s', copy=True, wait_for_all=True, out=None, **kwds):
         self._handle_kwds(kwds)
-        width, height, _, _ = self._get_sizes()
-        frame_size = self._frame_size()
         image_arrs = []
 
         if not self.queue:
@@ -632,21 +711,10 @@ class PCO_Camera(Camera):
                 else:
                     break
 
-            if copy:
-                image_buf = memoryview(ffi.buffer(buf.address, frame_size)[:])
-            else:
-                image_buf = memoryview(ffi.buffer(buf.address, frame_size))
-
-            # Convert to array (currently assumes mono16)
-            array = np.frombuffer(image_buf, np.uint16)
-            array = array.reshape((height, width))
-
+            private = copy and out is None
+            array = self._buffer_array(buf, private)
             if kwds['fix_hotpixels']:
-                array = self._correct_hot_pixels(array)
-
-            # Handle soft ROI
-            left, top = self._roi_trim_left, self._roi_trim_top
-            array = array[top:top + self._soft_height, left:left + self._soft_width]
+                array = self._correct_hot_pixels(array, kwds, in_place=private)
 
             image_arrs.append(array)
         image_arrs = self._partial_sequence + image_arrs
@@ -657,17 +725,24 @@ class PCO_Camera(Camera):
             self._clear_queue()
             self._partial_sequence = []
 
-        if len(image_arrs) == 1:
-            return image_arrs[0]
-        else:
-            return tuple(image_arrs)
+        return self._images_result(image_arrs, out)
 
-    def grab_image(self, timeout='1s', copy=True, **kwds):
+    def grab_image(self, timeout='1s', copy=True, out=None, **kwds):
         self.start_capture(**kwds)
-        return self.get_captured_image(timeout=timeout, copy=copy, **kwds)
+        return self.get_captured_image(timeout=timeout, copy=copy, out=out, **kwds)
 
     @check_units(framerate='?Hz')
-    def start_live_video(self, framerate=None, **kwds):
+    def start_live_video(self, framerate=None, n_buffers=2, **kwds):
+        """Start live video mode
+
+        Parameters
+        ----------
+        framerate : Quantity([time]^-1), optional
+            Framerate to run at, if the camera supports setting one
+        n_buffers : int, optional
+            Number of driver buffers to cycle through. More buffers let the camera keep running at
+            full rate through longer delays in handling frames.
+        """
         self._handle_kwds(kwds)
 
         # Set framerate to default value if it is None.
@@ -676,9 +751,8 @@ class PCO_Camera(Camera):
             framerate = '10Hz'
             explicit_framerate = False
 
-        self.set_trigger_mode(self.TriggerMode.auto)
-        self._set_binning(kwds['vbin'], kwds['hbin'])
-        self._set_ROI(kwds['left'], kwds['top'], kwds['right'], kwds['bot'])
+        self._apply_setting(kwds, 'trig', self.set_trigger_mode, self.TriggerMode.auto, True)
+        self._apply_geometry(kwds)
         self._cam.ArmCamera()
 
         # Prepare CameraLink interface if using one.
@@ -686,6 +760,7 @@ class PCO_Camera(Camera):
             width, height, _, _ = self._get_sizes()
             self._cam.SetTransferParametersAuto()
         # Call SetFrameRate() for cameras that support it.
+        self._forget_config('exposure_time')  # Set along with the framerate
         try:
             self._set_framerate(framerate, kwds['exposure_time'])
         except PCOError as e:
@@ -704,8 +779,8 @@ class PCO_Camera(Camera):
             self._cam.CamLinkSetImageParameters(width, height)
 
         self.shutter = 'continuous'
-        if self._frame_size() != self._buf_size or len(self.buffers) < 2:
-            self._allocate_buffers(nbufs=2)
+        n_buffers = max(n_buffers, 2)
+        self._allocate_buffers(nbufs=n_buffers)
         self._cam.ArmCamera()
 
         # Counterintuitively we have to start recording before adding the image
@@ -714,8 +789,8 @@ class PCO_Camera(Camera):
         if not self._is_using_camera_link():
             self._cam.SetRecordingState(1)
 
-        # Add all the buffers to the queue
-        for buf in self.buffers:
+        # Add the buffers to the queue
+        for buf in self.buffers[:n_buffers]:
             self._push_on_queue(buf)
 
         # If using a Camera Link interface, start recording now that the buffers
@@ -726,13 +801,17 @@ class PCO_Camera(Camera):
         self._cam.ForceTrigger()
 
     def stop_live_video(self):
+        # Buffers stay allocated so the next acquisition can reuse them
         self._cam.SetRecordingState(0)
         self._clear_queue()
-        self._free_buffers()
         self.shutter = None
 
-    @unit_mag(timeout='?ms')
-    def wait_for_frame(self, timeout=None):
+    def _wait_for_buffer(self, timeout):
+        """Wait for the oldest queued buffer to be filled, then pop and return it
+
+        Blocks on the buffer's event for up to `timeout` ms (or forever if None), returning None
+        if it times out.
+        """
         if not self.queue:
             raise Exception("No queued buffers!")
 
@@ -741,37 +820,38 @@ class PCO_Camera(Camera):
         # Wait for the next buffer event to fire
         buf = self.queue[0]
         ret = winlib.WaitForSingleObject(buf.event, int(timeout))
-        if ret == winlib.WAIT_OBJECT_0:
+        if ret == winlib.WAIT_TIMEOUT:
+            return None
+        elif ret != winlib.WAIT_OBJECT_0:
+            raise Error("Failed to grab image")
+
+        with self._queue_lock:
             dll_status, drv_status = self._cam.GetBufferStatus(buf.num)
             if drv_status != 0:
                 raise Exception(get_error_text(drv_status))
             winlib.ResetEvent(buf.event)
-        elif ret == winlib.WAIT_TIMEOUT:
-            return False
-        else:
-            raise Error("Failed to grab image")
+            return self.queue.pop(0)  # Pop only on success
 
-        self.last_buffer = self.queue.pop(0)  # Pop and save only on success
+    @unit_mag(timeout='?ms')
+    def wait_for_frame(self, timeout=None):
+        buf = self._wait_for_buffer(timeout)
+        if buf is None:
+            return False
+        self.last_buffer = buf
 
         if self.shutter == 'continuous':
             self._push_on_queue(buf)  # Add buf back to the end of the queue
 
         return True
 
-    def latest_frame(self, copy=True):
-        buf_info = self.last_buffer
-        if copy:
-            buf = memoryview(ffi.buffer(buf_info.address, self._frame_size())[:])
-        else:
-            buf = memoryview(ffi.buffer(buf_info.address, self._frame_size()))
-
-        width, height, _, _ = self._get_sizes()
-        array = np.frombuffer(buf, np.uint16)
-        array = array.reshape((height, width))
+    def latest_frame(self, copy=True, out=None):
+        array = self._buffer_array(self.last_buffer, copy and out is None)
+        if out is not None:
+            return self._copy_to_out(out, array)
+        return array
 
-        # Handle soft ROI
-        left, top = self._roi_trim_left, self._roi_trim_top
-        return array[top:top + self._soft_height, left:left + self._soft_width]
+    def _open_frame_queue(self, n_buffers, policy, **kwds):
+        return PCOFrameQueue(self, n_buffers, policy, **kwds)
 
     def _color_mode(self):
         desc = self._get_camera_description()
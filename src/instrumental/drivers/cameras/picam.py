@@ -3,6 +3,7 @@
 from future.utils import PY2
 
 import time
+from collections import deque
 from warnings import warn
 
 import numpy as np
@@ -10,6 +11,7 @@ from enum import IntEnum
 from nicelib import NiceLib, load_lib, RetHandler, ret_ignore, Sig, NiceObject
 
 from . import Camera
+from .streaming import FrameQueue, _remaining
 from .. import ParamSet, register_cleanup
 from ..util import check_units, check_enums
 from ...errors import Error, InstrumentNotFoundError, TimeoutError
@@ -634,6 +636,125 @@ class Timer(object):
         return max(0, time_left)
 
 
+class ReadoutLayout(object):
+    """Committed geometry of Picam readouts, for viewing raw readout data as arrays
+
+    A readout holds `frames_per_readout` frames, each of which holds the data of every ROI back to
+    back. Strides and offsets are in bytes, as Picam reports them.
+    """
+    def __init__(self, readout_stride, frame_stride, frames_per_readout, roi_shapes,
+                 dtype=np.uint16):
+        self.readout_stride = readout_stride
+        self.frame_stride = frame_stride
+        self.frames_per_readout = frames_per_readout
+        self.roi_shapes = [tuple(shape) for shape in roi_shapes]
+        self.dtype = np.dtype(dtype)
+
+        roi_sizes = [h * w * self.dtype.itemsize for h, w in self.roi_shapes]
+        self.roi_offsets = [sum(roi_sizes[:i]) for i in range(len(roi_sizes))]
+        #: Whether all ROIs share a shape, so a whole readout can be viewed as one array
+        self.uniform = len(set(self.roi_shapes)) == 1
+
+    @classmethod
+    def from_params(cls, params):
+        """Read the layout from the camera's (committed) parameters"""
+        rois = params.Rois.get_value()
+        roi_shapes = [(roi.height // roi.y_binning, roi.width // roi.x_binning) for roi in rois]
+        return cls(params.ReadoutStride.get_value(), params.FrameStride.get_value(),
+                   params.FramesPerReadout.get_value(), roi_shapes)
+
+    def roi_views(self, buf, n_readouts):
+        """Views of each ROI's data in `buf`, holding `n_readouts` consecutive readouts
+
+        Returns a list with an array of shape *(n_readouts, frames_per_readout, height, width)*
+        for each ROI.
+        """
+        itemsize = self.dtype.itemsize
+        return [np.ndarray((n_readouts, self.frames_per_readout, h, w), self.dtype, buf, offset,
+                           (self.readout_stride, self.frame_stride, w * itemsize, itemsize))
+                for (h, w), offset in zip(self.roi_shapes, self.roi_offsets)]
+
+    def view(self, buf, n_readouts):
+        """View of the data in `buf` indexed by (readout, frame, roi, row, column)
+
+        Only possible when all ROIs share a shape.
+        """
+        if not self.uniform:
+            raise ValueError("ROIs have different shapes")
+        (h, w), itemsize = self.roi_shapes[0], self.dtype.itemsize
+        shape = (n_readouts, self.frames_per_readout, len(self.roi_shapes), h, w)
+        strides = (self.readout_stride, self.frame_stride, h * w * itemsize, w * itemsize,
+                   itemsize)
+        return np.ndarray(shape, self.dtype, buf, 0, strides)
+
+
+class PicamFrameQueue(FrameQueue):
+    """Streams readouts from Picam's continuous acquisition
+
+    The SDK fills its own circular buffer, and each acquisition update may report several new
+    readouts in it. Since the SDK overwrites them once it wraps around, the first frame of the
+    first ROI of each readout is copied into one of `n_buffers` preallocated arrays as soon as it
+    is reported. If no array is free, the oldest one not yet handed out is reused under the
+    'drop_oldest' policy, and otherwise the new readout is dropped.
+    """
+    def __init__(self, cam, n_buffers, policy, **kwds):
+        super(PicamFrameQueue, self).__init__(n_buffers, policy)
+        self._cam = cam
+        self._buffers = None
+        self._free = deque(range(n_buffers))
+        self._pending = deque()  # (index, seq) of filled buffers not yet handed out
+        self._seq = 0
+        cam.start_live_video(**kwds)
+
+    def get(self, timeout):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            self._wait_for_lease(deadline)
+            with self._cond:
+                if self._pending:
+                    self.n_leased += 1
+                    index, seq = self._pending.popleft()
+                    return index, self._buffers[index], seq
+            remaining = _remaining(deadline)
+            self._receive(-1 if remaining is None else int(remaining * 1000))
+
+    def _receive(self, timeout_ms):
+        try:
+            available_data, _ = self._cam._dev.WaitForAcquisitionUpdate(timeout_ms)
+        except PicamError as e:
+            if e.code == PicamEnums.Error.TimeOutOccurred:
+                raise TimeoutError("Timed out waiting for a frame")
+            raise
+
+        n_readouts = available_data.readout_count
+        if n_readouts == 0:
+            return
+        frames = self._cam._roi_views(available_data)[0][:, 0]
+        if self._buffers is None:
+            self._buffers = np.empty((self.n_buffers,) + frames.shape[1:], frames.dtype)
+
+        with self._cond:
+            for frame in frames:
+                if self._free:
+                    index = self._free.popleft()
+                elif self.policy == 'drop_oldest' and self._pending:
+                    index, _ = self._pending.popleft()
+                else:
+                    self._seq += 1  # Every buffer is leased, so drop this readout
+                    continue
+                np.copyto(self._buffers[index], frame)
+                self._pending.append((index, self._seq))
+                self._seq += 1
+
+    def release(self, index):
+        with self._cond:
+            self._free.append(index)
+        self._return_lease()
+
+    def close(self):
+        self._cam.stop_live_video()
+
+
 class PicamCamera(Camera):
     """ A Picam Camera """
     _INST_PARAMS_ = ['serial', 'model']
@@ -648,6 +769,7 @@ class PicamCamera(Camera):
         self._dev = NicePicamLib.Camera(cam_id._struct_ptr)
         self._create_params()
         self._latest_available_data = None
+        self._layout = None
 
     def _create_params(self):
         _params = {}
@@ -695,11 +817,11 @@ class PicamCamera(Camera):
         self._dev.StartAcquisition()
 
     @check_units(timeout='?ms')
-    def get_captured_image(self, timeout='1s', copy=True):
+    def get_captured_image(self, timeout='1s', copy=True, out=None):
         timer = Timer(Q_(timeout).m_as('s'))
 
         error = None
-        readouts = []
+        images = []
         running = True
 
         # Per the Picam API docs, we must call WaitForAcquisitionUpdate until status.running is
@@ -715,7 +837,14 @@ class PicamCamera(Camera):
             else:
                 running = status.running
                 if available_data.readout_count > 0:
-                    readouts.extend(self._extract_available_data(available_data, copy))
+                    # For our standard API, only return the first frame and ROI of each readout
+                    for image in self._roi_views(available_data)[0][:, 0]:
+                        if out is not None:
+                            # Copy now, before the next update can overwrite the readout
+                            image = self._copy_to_out(out, image, len(images))
+                        elif copy:
+                            image = image.copy()
+                        images.append(image)
 
         if error:
             if error.code == PicamEnums.Error.TimeOutOccurred:
@@ -723,15 +852,11 @@ class PicamCamera(Camera):
             else:
                 raise error
 
-        # For our standard API, only return first frame and ROI
-        if len(readouts) == 1:
-            return readouts[0][0][0]
-        else:
-            return tuple(ro[0][0] for ro in readouts)
+        return self._images_result(images, out)
 
-    def grab_image(self, timeout='1s', copy=True, **kwds):
+    def grab_image(self, timeout='1s', copy=True, out=None, **kwds):
         self.start_capture(**kwds)
-        return self.get_captured_image(timeout=timeout, copy=copy)
+        return self.get_captured_image(timeout=timeout, copy=copy, out=out)
 
     def start_live_video(self, **kwds):
         kwds['n_frames'] = 0
@@ -755,9 +880,14 @@ class PicamCamera(Camera):
                 return False
             raise
 
-    def latest_frame(self, copy=True):
-        readouts = self._extract_available_data(self._latest_available_data, copy)
-        return readouts[0][0][0]
+    def latest_frame(self, copy=True, out=None):
+        image = self._roi_views(self._latest_available_data)[0][0, 0]
+        if out is not None:
+            return self._copy_to_out(out, image)
+        return image.copy() if copy else image
+
+    def _open_frame_queue(self, n_buffers, policy, **kwds):
+        return PicamFrameQueue(self, n_buffers, policy, **kwds)
 
     # /Generic Camera interface
     #
@@ -777,37 +907,44 @@ class PicamCamera(Camera):
         Returns
         -------
         A 3-D nested list of numpy arrays, indexed in order of (readout, frame, roi). Note that
-        this is not 'rectangular' as the ROIs can have different sizes.
+        this is not 'rectangular' as the ROIs can have different sizes. If all ROIs share a shape,
+        the arrays are views of a single array holding every readout.
         """
+        layout = self._get_layout()
         n_readouts = available_data.readout_count
         if n_readouts == 0:
             raise PicamError('There are no readouts in available_data')
 
-        readout_stride = self.params.ReadoutStride.get_value()
-        size = readout_stride * n_readouts
+        buf = self._readout_buffer(available_data, layout)
+        if layout.uniform:
+            data = layout.view(buf, n_readouts)
+            if copy:
+                data = data.copy()
+            return [[list(frame) for frame in readout] for readout in data]
+
+        views = layout.roi_views(buf, n_readouts)
+        if copy:
+            views = [view.copy() for view in views]
+        return [[[view[i, j] for view in views] for j in range(layout.frames_per_readout)]
+                for i in range(n_readouts)]
+
+    def _roi_views(self, available_data):
+        """Per-ROI views of the readouts in `available_data`, indexed by (readout, frame)"""
+        layout = self._get_layout()
+        if available_data.readout_count == 0:
+            raise PicamError('There are no readouts in available_data')
+        buf = self._readout_buffer(available_data, layout)
+        return layout.roi_views(buf, available_data.readout_count)
 
-        all_data = _c_data_to_numpy(available_data.initial_readout, size, dtype=np.uint16)
+    def _readout_buffer(self, available_data, layout):
+        size = layout.readout_stride * available_data.readout_count
+        return memoryview(ffi.buffer(available_data.initial_readout, size))
 
-        rois = self.params.Rois.get_value()
-        roi_shapes = [(roi.width // roi.x_binning, roi.height // roi.y_binning) for roi in rois]
-
-        def extract_roi_data(arr, frame_offset):
-            roi_start = frame_offset
-            for w,h in roi_shapes:
-                roi_end = roi_start + w*h
-                roi_data = np.reshape(arr[roi_start:roi_end], (h,w))
-                yield roi_data.copy() if copy else roi_data
-                roi_start = roi_end
-
-        n_frames = self.params.FramesPerReadout.get_value()
-        frame_stride = self.params.FrameStride.get_value()
-
-        data = [
-            [list(extract_roi_data(all_data, i*readout_stride + j*frame_stride))
-             for j in range(n_frames)]
-            for i in range(n_readouts)
-        ]
-        return data
+    def _get_layout(self):
+        """Readout layout as of the last commit, read from the camera if not cached yet"""
+        if self._layout is None:
+            self._layout = ReadoutLayout.from_params(self.params)
+        return self._layout
 
     def set_roi(self, x=None, y=None, width=None, height=None, x_binning=None, y_binning=None):
         """Set one or more fields of the ROI
@@ -912,12 +1049,14 @@ class PicamCamera(Camera):
     #    return bool(self._dev.AreParametersCommitted())
 
     def commit_parameters(self):
-        """Commits camera parameters"""
+        """Commits camera parameters, and caches the resulting readout layout"""
+        self._layout = None
         bad_params, n = self._dev.CommitParameters()
 
         if n > 0:
             bad_str = ','.join(PicamEnums.Parameter(bad_params[i]).name for i in range(n))
             raise PicamError("{} parameters were unsuccessfully committed: [{}]".format(n, bad_str))
+        self._layout = ReadoutLayout.from_params(self.params)
 
     #def start_acquisition(self):
     #    """Begins an acquisition and returns immediately.
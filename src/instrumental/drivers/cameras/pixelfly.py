@@ -6,6 +6,10 @@ Driver for PCO Pixelfly cameras.
 from future.utils import PY2
 
 import os.path
+import time
+import threading
+from collections import deque
+
 import numpy as np
 from scipy.interpolate import interp1d
 import win32event
@@ -13,6 +17,7 @@ import win32event
 from nicelib import NiceLib, Sig, NiceObject, load_lib, RetHandler
 
 from . import Camera
+from .streaming import FrameQueue, _remaining
 from .. import ParamSet
 from ..util import check_units
 from ...errors import Error, TimeoutError, LibError
@@ -111,6 +116,46 @@ def unitful_boardval(pcc_val, units):
     return property(lambda self: Q_(self._dev.GETBOARDVAL(pcc_val), units))
 
 
+class PixelflyFrameQueue(FrameQueue):
+    """Leases the driver's image buffers directly, re-queuing each one as soon as it is released
+
+    Video mode runs with `n_buffers` driver buffers, which the camera fills in the order they were
+    queued. Waiting for a frame blocks on the buffer's event. While every buffer is leased, none
+    are queued, so the camera drops frames until one is released, under either policy.
+    """
+    def __init__(self, cam, n_buffers, policy, **kwds):
+        super(PixelflyFrameQueue, self).__init__(n_buffers, policy)
+        self._cam = cam
+        self._queued = deque(range(n_buffers))
+        cam.start_live_video(n_buffers=n_buffers, **kwds)
+
+    def get(self, timeout):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            while not self._queued:
+                if not self._cond.wait(_remaining(deadline)):
+                    raise TimeoutError("Timed out waiting for a leased frame to be released")
+            buf_i = self._queued[0]
+
+        remaining = _remaining(deadline)
+        if not self._cam._wait_for_buffer(buf_i, None if remaining is None else remaining * 1e3):
+            raise TimeoutError("Timed out waiting for a frame")
+        with self._cond:
+            self._queued.popleft()
+            self.n_leased += 1
+        array, = self._cam._buffer_arrays(buf_i)
+        return buf_i, self._cam._crop_roi(array), None
+
+    def release(self, buf_i):
+        with self._cond:
+            self._cam._queue_buffer(buf_i)
+            self._queued.append(buf_i)
+        self._return_lease()
+
+    def close(self):
+        self._cam.stop_live_video()
+
+
 class Pixelfly(Camera):
     _INST_PARAMS_ = ['number']
 
@@ -136,6 +181,7 @@ class Pixelfly(Camera):
         self._buf_events = []
         self._nbufs = 0
         self._buf_i = 0
+        self._queue_lock = threading.Lock()  # Buffers may be re-queued from a consumer thread
 
         self._double_img = None  # Used for latest_frame
 
@@ -239,9 +285,18 @@ class Pixelfly(Camera):
         self._allocate_buffers()
         self.color_mode = 'mono16'
 
-    def start_live_video(self, **kwds):
+    def start_live_video(self, n_buffers=2, **kwds):
+        """Start live video mode
+
+        Parameters
+        ----------
+        n_buffers : int, optional
+            Number of driver buffers to cycle through. More buffers let the camera keep running at
+            full rate through longer delays in handling frames.
+        """
         self._handle_kwds(kwds)
         self._last_kwds = kwds
+        self._nbufs = max(n_buffers, 2)
 
         #self.set_mode('video')
         self.set_mode(exposure=kwds['exposure_time'], hbin=kwds['hbin'], vbin=kwds['vbin'],
@@ -262,30 +317,46 @@ class Pixelfly(Camera):
         if self._double_img is not None:
             return True
 
-        timeout = win32event.INFINITE if timeout is None else max(0, timeout.m_as('ms'))
+        timeout = None if timeout is None else timeout.m_as('ms')
 
         buf_i = (self._buf_i) % self._nbufs  # Most recently triggered buffer
+        if not self._wait_for_buffer(buf_i, timeout):
+            return False
+
+        if self._shutter == 'video':
+            self._queue_buffer(self._buf_i)
+        self._buf_i = (self._buf_i + 1) % self._nbufs
+
+        return True
+
+    def _wait_for_buffer(self, buf_i, timeout):
+        """Block on the event of buffer `buf_i` for up to `timeout` ms (or forever if None)
+
+        Returns whether the buffer was filled.
+        """
+        timeout = win32event.INFINITE if timeout is None else max(0, timeout)
         ret = win32event.WaitForSingleObject(int(self._buf_events[buf_i]), int(timeout))
 
         if ret != win32event.WAIT_OBJECT_0:
             return False  # Object is not signaled
 
-        win32event.ResetEvent(int(self._buf_events[buf_i]))
-        self._dev.PCC_RESETEVENT(buf_i)
-        status = self._dev.GETBUFFER_STATUS(self._bufnums[buf_i], 0)
+        with self._queue_lock:
+            win32event.ResetEvent(int(self._buf_events[buf_i]))
+            self._dev.PCC_RESETEVENT(buf_i)
+            status = self._dev.GETBUFFER_STATUS(self._bufnums[buf_i], 0)
 
         #if px.PCC_BUF_STAT_ERROR(ptr):
         if status[0] & 0xF000:
             uptr = ffi.cast('DWORD *', status)
             raise Exception("Buffer error 0x{:08X} 0x{:08X} 0x{:08X} 0x{:08X}".format(
                             uptr[0], uptr[1], uptr[2], uptr[3]))
-
-        if self._shutter == 'video':
-            self._dev.ADD_BUFFER_TO_LIST(self._bufnums[self._buf_i], self._frame_size(), 0, 0)
-        self._buf_i = (self._buf_i + 1) % self._nbufs
-
         return True
 
+    def _queue_buffer(self, buf_i):
+        """Add buffer `buf_i` to the end of the driver's buffer list"""
+        with self._queue_lock:
+            self._dev.ADD_BUFFER_TO_LIST(self._bufnums[buf_i], self._frame_size(), 0, 0)
+
     def _frame_size(self):
         nimgs = 2 if self._shutter == 'double' else 1
         nbytes = ((self.bit_depth+7)//8)
@@ -303,8 +374,18 @@ class Pixelfly(Camera):
         frame_size = self._frame_size()
         bufnr_p = ffi.new('int *')
 
-        # Remove and free all existing buffers
         self._dev.REMOVE_ALL_BUFFERS_FROM_LIST()
+        if len(self._bufnums) >= nbufs and all(size == frame_size for size in self._bufsizes):
+            # Reuse the existing buffers, clearing any events left over from the last acquisition
+            for i, event in enumerate(self._buf_events):
+                win32event.ResetEvent(int(event))
+                self._dev.PCC_RESETEVENT(i)
+            self._nbufs = nbufs
+            self._dev.START_CAMERA()
+            self._cam_started = True
+            return
+
+        # Free all existing buffers
         for bufnum in self._bufnums:
             self._dev.FREE_BUFFER(bufnum)
         self._bufnums = []
@@ -331,33 +412,32 @@ class Pixelfly(Camera):
         self._mem_set_up = True
 
     def _trigger(self):
-        frame_size = self._frame_size()
-
         for i in range(self._nbufs):
-            self._dev.ADD_BUFFER_TO_LIST(self._bufnums[i], frame_size, 0, 0)
+            self._queue_buffer(i)
         self._buf_i = 0
         self._capture_started = True
 
         self._dev.TRIGGER_CAMERA()
 
-    def latest_frame(self, copy=True):
+    def latest_frame(self, copy=True, out=None):
         if self._double_img is not None:
             img = self._double_img
             self._double_img = None
-            return self._crop_roi(img)
+            return self._frame_result(self._crop_roi(img), out)
 
         buf_i = (self._buf_i - 1) % self._nbufs
-        if copy:
-            buf = memoryview(ffi.buffer(self._bufptrs[buf_i], self._frame_size())[:])
-        else:
-            buf = memoryview(ffi.buffer(self._bufptrs[buf_i], self._frame_size()))
-
         if self._shutter == 'double':
-            arr, self._double_img = self._arrays_from_buffer(buf)
+            arr, self._double_img = self._buffer_arrays(buf_i, copy and out is None)
         else:
-            arr, = self._arrays_from_buffer(buf)
+            arr, = self._buffer_arrays(buf_i, copy and out is None)
 
-        return self._crop_roi(arr)
+        return self._frame_result(self._crop_roi(arr), out)
+
+    def _open_frame_queue(self, n_buffers, policy, **kwds):
+        return PixelflyFrameQueue(self, n_buffers, policy, **kwds)
+
+    def _frame_result(self, arr, out):
+        return arr if out is None else self._copy_to_out(out, arr)
 
     def _crop_roi(self, arr, kwds=None):
         kwds = self._last_kwds if kwds is None else kwds
@@ -389,7 +469,7 @@ class Pixelfly(Camera):
         pass
 
     @check_units(timeout='?ms')
-    def get_captured_image(self, timeout='1s', copy=True, **kwds):
+    def get_captured_image(self, timeout='1s', copy=True, out=None, **kwds):
         self._handle_kwds(kwds)  # Should get rid of this duplication somehow...
         image_arrs = []
 
@@ -408,20 +488,17 @@ class Pixelfly(Camera):
                 self._partial_sequence.extend(image_arrs)  # Save for later
                 raise TimeoutError
 
-            if copy:
-                buf = memoryview(ffi.buffer(self._bufptrs[self._buf_i], self._frame_size())[:])
-            else:
-                buf = memoryview(ffi.buffer(self._bufptrs[self._buf_i], self._frame_size()))
-
-            arrays = self._arrays_from_buffer(buf)
-
-            if kwds['fix_hotpixels']:
-                arrays = [self._correct_hot_pixels(a) for a in arrays]
+            private = copy and out is None
+            arrays = self._buffer_arrays(self._buf_i, private)
 
             # Software ROI
+            fix_hotpixels = kwds['fix_hotpixels']
             kwds = self._last_kwds
             arrays = [a[kwds['top']:kwds['bot'], kwds['left']:kwds['right']] for a in arrays]
 
+            if fix_hotpixels:
+                arrays = [self._correct_hot_pixels(a, kwds, in_place=private) for a in arrays]
+
             image_arrs.extend(arrays)
             self._buf_i += 1
 
@@ -432,10 +509,12 @@ class Pixelfly(Camera):
         image_arrs = self._partial_sequence + image_arrs
         self._partial_sequence = []
 
-        if len(image_arrs) == 1:
-            return image_arrs[0]
-        else:
-            return tuple(image_arrs)
+        return self._images_result(image_arrs, out)
+
+    def _buffer_arrays(self, buf_i, copy=False):
+        """View (or copy) the image(s) in buffer `buf_i` as arrays"""
+        buf = ffi.buffer(self._bufptrs[buf_i], self._frame_size())
+        return self._arrays_from_buffer(memoryview(buf[:] if copy else buf))
 
     def _arrays_from_buffer(self, buf):
         dtype = np.uint8 if self.bit_depth <= 8 else np.uint16
@@ -450,9 +529,9 @@ class Pixelfly(Camera):
             return (arr1.reshape((self._binned_height, self._binned_width)),
                     arr2.reshape((self._binned_height, self._binned_width)))
 
-    def grab_image(self, timeout='1s', copy=True, **kwds):
+    def grab_image(self, timeout='1s', copy=True, out=None, **kwds):
         self.start_capture(**kwds)
-        return self.get_captured_image(timeout=timeout, copy=copy, **kwds)
+        return self.get_captured_image(timeout=timeout, copy=copy, out=out, **kwds)
 
     def _load_sizes(self):
         ccdx, ccdy, actualx, actualy, bit_pix = self._dev.GETSIZES()
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Recording camera frames to disk at full rate.
+
+A `FrameRecorder` takes frames from a `FrameStream`, an `AcquisitionEngine`, or plain arrays, and
+writes them on a pool of writer threads, so the thread that acquires frames never waits on the
+disk. Leased frames are held until they've been written and are then released, so they are never
+copied in memory first.
+"""
+import os
+import os.path
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .streaming import Frame
+from ...errors import Error
+
+#: Valid values for the `format` argument of `FrameRecorder`
+RECORDING_FORMATS = ('npy', 'chunked')
+
+#: Structured dtype of the per-frame metadata. `exposure` is in seconds, and NaN if unknown.
+METADATA_DTYPE = np.dtype([('seq', 'i8'), ('timestamp', 'f8'), ('exposure', 'f8')])
+
+
+def metadata_path(path):
+    """Path of the metadata file that accompanies a recording at `path`"""
+    if os.path.isdir(path):
+        return os.path.join(path, 'metadata.npy')
+    root, _ = os.path.splitext(path)
+    return root + '.meta.npy'
+
+
+def load_recording(path, mmap_mode='r'):
+    """Load a recording made by `FrameRecorder`, returning ``(frames, metadata)``
+
+    `frames` is a stack of all recorded frames, memory-mapped unless the recording is chunked.
+    `metadata` is a structured array with a ``'seq'``, ``'timestamp'``, and ``'exposure'`` field
+    for each frame.
+    """
+    metadata = np.load(metadata_path(path))
+    if os.path.isdir(path):
+        chunks = sorted(name for name in os.listdir(path) if name.startswith('chunk_'))
+        frames = np.concatenate([np.load(os.path.join(path, name)) for name in chunks])
+    else:
+        frames = np.load(path, mmap_mode=mmap_mode)
+    return frames, metadata
+
+
+class RecorderStats(object):
+    """Counts and timings of the frames a `FrameRecorder` has written. Times are in seconds."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        #: Frames submitted for writing, and frames written
+        self.submitted = self.written = 0
+        #: Bytes of image data written
+        self.bytes = 0
+        #: Total time writer threads spent writing
+        self.write_time = 0.
+        #: Max number of frames waiting to be written at once
+        self.max_backlog = 0
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def backlog(self):
+        """Number of frames submitted but not yet written"""
+        return self.submitted - self.written
+
+    @property
+    def elapsed(self):
+        """Time from the first submitted frame to the most recently written one"""
+        if self.start_time is None or self.end_time is None:
+            return 0.
+        return self.end_time - self.start_time
+
+    @property
+    def throughput(self):
+        """Sustained write rate in MB/s"""
+        elapsed = self.elapsed
+        return self.bytes / elapsed / 1e6 if elapsed else 0.
+
+    def __repr__(self):
+        return ('<RecorderStats: wrote {} frames ({:.1f} MB) at {:.1f} MB/s, backlog {} '
+                '(max {})>'.format(self.written, self.bytes / 1e6, self.throughput, self.backlog,
+                                   self.max_backlog))
+
+
+class FrameRecorder(object):
+    """Writes camera frames and their metadata to disk on a pool of writer threads
+
+    The frame shape and dtype are taken from the first frame written. Frames are stored in one of
+    two formats:
+
+    'npy'
+        A single preallocated ``.npy`` stack with room for `n_frames` frames, which writer threads
+        fill through a memory map. Any frames that are never written stay zeroed. The file can be
+        opened with ``np.load(path, mmap_mode='r')``.
+    'chunked'
+        A directory of ``chunk_NNNNNN.npy`` files of `chunk_size` frames each, so the number of
+        frames need not be known in advance. Each chunk is assembled in memory and saved once it
+        is full.
+
+    Per-frame metadata is stored alongside, in a structured array with `METADATA_DTYPE` (see
+    `metadata_path()`). Use `load_recording()` to read a recording back.
+
+    Parameters
+    ----------
+    path : str
+        Path of the ``.npy`` file or chunk directory to create
+    n_frames : int, optional
+        Number of frames to record. Required for the 'npy' format, and otherwise the max number
+        of frames to accept.
+    format : {'npy', 'chunked'}, optional
+        Storage format
+    chunk_size : int, optional
+        Frames per chunk, for the 'chunked' format
+    n_writers : int, optional
+        Number of writer threads
+    max_backlog : int, optional
+        Max number of frames waiting to be written. Once it is reached, `write()` blocks until a
+        writer catches up. If None, the backlog is bounded only by the frames available to lease.
+    """
+    def __init__(self, path, n_frames=None, format='npy', chunk_size=64, n_writers=2,
+                 max_backlog=None):
+        if format not in RECORDING_FORMATS:
+            raise ValueError("format must be one of {}".format(RECORDING_FORMATS))
+        if format == 'npy' and n_frames is None:
+            raise ValueError("n_frames is required for the 'npy' format")
+
+        self.path = path
+        self.n_frames = n_frames
+        self.format = format
+        self.chunk_size = chunk_size
+        self.max_backlog = max_backlog
+        self.stats = RecorderStats()
+        self.closed = False
+
+        self._executor = ThreadPoolExecutor(n_writers, thread_name_prefix='instrumental-recorder')
+        self._cond = threading.Condition()
+        self._error = None
+        self._next_index = 0
+        self._frames = None  # Memory-mapped stack for 'npy'
+        self._metadata = None
+        self._chunks = {}  # For 'chunked', maps chunk index -> [array, n_frames_filled]
+        self.shape = self.dtype = None
+
+        if format == 'chunked':
+            os.makedirs(path)
+            self._metadata = []
+
+    def __repr__(self):
+        return '<FrameRecorder {!r} ({}, {} frames)>'.format(self.path, self.format,
+                                                             self._next_index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def full(self):
+        """Whether `n_frames` frames have been submitted"""
+        return self.n_frames is not None and self._next_index >= self.n_frames
+
+    def write(self, frame):
+        """Submit a frame for writing, returning its index in the recording
+
+        `frame` may be a leased `Frame`, which is released once written, or an array, which is
+        copied first. Raises any error a writer thread has hit.
+        """
+        self._check_error()
+        if self.closed:
+            raise Error("Recorder is closed")
+        if self.full:
+            raise Error("Recorder already holds {} frames".format(self.n_frames))
+
+        if isinstance(frame, Frame):
+            image = frame.array
+            exposure = frame.exposure_time
+            meta = (frame.seq, frame.timestamp,
+                    np.nan if exposure is None else exposure.m_as('s'))
+        else:
+            image = np.array(frame)
+            frame = None
+            meta = (self._next_index, time.perf_counter(), np.nan)
+
+        if self._next_index == 0:
+            self._prepare(image)
+
+        stats = self.stats
+        with self._cond:
+            while self.max_backlog is not None and stats.backlog >= self.max_backlog:
+                self._cond.wait()
+            index = self._next_index
+            self._next_index += 1
+            with stats.lock:
+                stats.submitted += 1
+                stats.max_backlog = max(stats.max_backlog, stats.backlog)
+                if stats.start_time is None:
+                    stats.start_time = time.perf_counter()
+
+        self._executor.submit(self._write, index, image, meta, frame)
+        return index
+
+    def record(self, source, n_frames=None):
+        """Write frames from `source` until it ends or `n_frames` (or the recorder) is full
+
+        `source` is an iterable of `Frame` objects, such as a `FrameStream` or an
+        `AcquisitionEngine` without callbacks. Returns the number of frames submitted.
+        """
+        count = 0
+        for frame in source:
+            self.write(frame)
+            count += 1
+            if count == n_frames or self.full:
+                break
+        return count
+
+    def close(self):
+        """Wait for all frames to be written, then save and close the files"""
+        if self.closed:
+            return
+        self.closed = True
+        self._executor.shutdown(wait=True)
+
+        if self.format == 'npy':
+            if self._frames is not None:
+                self._frames.flush()
+                self._metadata.flush()
+                self._frames = self._metadata = None
+        else:
+            for chunk_index in sorted(self._chunks):
+                chunk, n_filled = self._chunks.pop(chunk_index)
+                self._save_chunk(chunk_index, chunk[:n_filled])
+            metadata = np.empty(len(self._metadata), METADATA_DTYPE)
+            for index, meta in self._metadata:
+                metadata[index] = meta
+            np.save(metadata_path(self.path), metadata)
+        self._check_error()
+
+    def _check_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _prepare(self, image):
+        """Allocate the output for frames shaped like `image`"""
+        self.shape = image.shape
+        self.dtype = image.dtype
+        if self.format == 'npy':
+            shape = (self.n_frames,) + image.shape
+            self._frames = np.lib.format.open_memmap(self.path, 'w+', image.dtype, shape)
+            self._metadata = np.lib.format.open_memmap(metadata_path(self.path), 'w+',
+                                                       METADATA_DTYPE, (self.n_frames,))
+            self._metadata['seq'] = -1
+
+    def _write(self, index, image, meta, frame):
+        start = time.perf_counter()
+        try:
+            if self.format == 'npy':
+                self._frames[index] = image
+                self._metadata[index] = meta
+            else:
+                self._write_to_chunk(index, image, meta)
+        except Exception as e:
+            self._error = e
+        finally:
+            if frame is not None:
+                frame.release()
+
+        end = time.perf_counter()
+        stats = self.stats
+        with stats.lock:
+            stats.written += 1
+            stats.bytes += image.nbytes
+            stats.write_time += end - start
+            stats.end_time = end
+        with self._cond:
+            self._cond.notify_all()
+
+    def _write_to_chunk(self, index, image, meta):
+        chunk_index, slot = divmod(index, self.chunk_size)
+        with self._cond:
+            if chunk_index not in self._chunks:
+                chunk = np.empty((self.chunk_size,) + self.shape, self.dtype)
+                self._chunks[chunk_index] = [chunk, 0]
+            entry = self._chunks[chunk_index]
+
+        entry[0][slot] = image
+
+        with self._cond:
+            self._metadata.append((index, meta))
+            entry[1] += 1
+            done = (entry[1] == self.chunk_size)
+            if done:
+                del self._chunks[chunk_index]
+        if done:
+            self._save_chunk(chunk_index, entry[0])
+
+    def _save_chunk(self, chunk_index, frames):
+        np.save(os.path.join(self.path, 'chunk_{:06d}.npy'.format(chunk_index)), frames)
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental reductions of camera frames.
+
+A reduction consumes frames one at a time and keeps only a fixed-size summary, such as a running
+mean and variance, ROI sums, or a max-hold image, so its memory use doesn't depend on the number
+of frames. Each frame is read directly from the buffer it was acquired into, and all intermediate
+results go into arrays allocated when the first frame arrives.
+
+Reductions are callable with a `Frame` (or an array), so they can be registered as callbacks with
+`AcquisitionEngine.on_frame()`, or fed from a stream with `reduce_frames()`.
+"""
+import threading
+
+import numpy as np
+
+from .streaming import Frame
+
+#: Number of ROIs above which `ROIIntegrator` sums through an integral image
+INTEGRAL_IMAGE_THRESHOLD = 8
+
+
+def reduce_frames(source, reductions, n_frames=None):
+    """Feed frames from `source` to each of `reductions`, releasing each frame afterwards
+
+    Parameters
+    ----------
+    source : iterable
+        Iterable of `Frame` objects or arrays, such as a `FrameStream` or an `AcquisitionEngine`
+        without callbacks
+    reductions : Reduction or list of Reduction
+        Reductions to update with each frame
+    n_frames : int, optional
+        Number of frames to reduce. If None, continues until `source` is exhausted.
+
+    Returns
+    -------
+    count : int
+        Number of frames reduced
+    """
+    if isinstance(reductions, Reduction):
+        reductions = [reductions]
+    count = 0
+    if n_frames == 0:
+        return count
+    for frame in source:
+        try:
+            for reduction in reductions:
+                reduction(frame)
+        finally:
+            if isinstance(frame, Frame):
+                frame.release()
+        count += 1
+        if count == n_frames:
+            break
+    return count
+
+
+class Reduction(object):
+    """Base class of incremental frame reductions
+
+    Subclasses implement `_start()`, which allocates state for images shaped like the first one,
+    and `_add()`, which folds in an image. Both are called with the reduction's lock held, so a
+    reduction can be updated on an acquisition thread while its results are read from another.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        #: Number of frames added since the last `reset()`
+        self.count = 0
+        self.shape = None
+
+    def __repr__(self):
+        return '<{} of {} frames>'.format(type(self).__name__, self.count)
+
+    def __call__(self, frame):
+        self.add(frame)
+
+    def add(self, frame):
+        """Fold a `Frame` or array into the reduction"""
+        image = frame.array if isinstance(frame, Frame) else np.asarray(frame)
+        with self.lock:
+            if self.count == 0:
+                self.shape = image.shape
+                self._start(image)
+            elif image.shape != self.shape:
+                raise ValueError("Expected an image of shape {}, got {}".format(self.shape,
+                                                                                 image.shape))
+            self._add(image)
+            self.count += 1
+
+    def reset(self):
+        """Discard everything added so far"""
+        with self.lock:
+            self.count = 0
+            self.shape = None
+
+    def _check_count(self, minimum=1):
+        if self.count < minimum:
+            raise ValueError("Need at least {} frame(s), have {}".format(minimum, self.count))
+
+    def _start(self, image):
+        raise NotImplementedError
+
+    def _add(self, image):
+        raise NotImplementedError
+
+
+class RunningStats(Reduction):
+    """Per-pixel running mean and variance, updated with Welford's algorithm
+
+    Welford's update is numerically stable even when the mean is large compared to the spread,
+    unlike accumulating sums of values and their squares.
+    """
+    def _start(self, image):
+        self._mean = np.zeros(image.shape, dtype=float)
+        self._m2 = np.zeros(image.shape, dtype=float)
+        self._delta = np.empty(image.shape, dtype=float)
+        self._scratch = np.empty(image.shape, dtype=float)
+
+    def _add(self, image):
+        delta, scratch = self._delta, self._scratch
+        np.subtract(image, self._mean, out=delta)
+        np.divide(delta, self.count + 1, out=scratch)
+        self._mean += scratch
+        np.subtract(image, self._mean, out=scratch)
+        scratch *= delta
+        self._m2 += scratch
+
+    @property
+    def mean(self):
+        """Copy of the per-pixel mean"""
+        with self.lock:
+            self._check_count()
+            return self._mean.copy()
+
+    def variance(self, ddof=0):
+        """Copy of the per-pixel variance, with `ddof` delta degrees of freedom"""
+        with self.lock:
+            self._check_count(ddof + 1)
+            return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=0):
+        """Per-pixel standard deviation, with `ddof` delta degrees of freedom"""
+        return np.sqrt(self.variance(ddof))
+
+
+class ROIIntegrator(Reduction):
+    """Sums of the pixels in a set of rectangular ROIs
+
+    Parameters
+    ----------
+    rois : sequence of (top, left, bot, right)
+        Rectangles to integrate, in image pixels. `bot` and `right` are exclusive.
+    keep_history : bool, optional
+        Whether to record the sums of every frame in `history`. This is the one thing whose memory
+        grows with the number of frames, at a single float per ROI per frame.
+
+    Attributes
+    ----------
+    last : numpy.ndarray
+        Sum of each ROI in the most recent frame
+    totals : numpy.ndarray
+        Sum of each ROI over all frames
+    history : list of numpy.ndarray
+        Sums of each ROI in each frame, if `keep_history` is True
+    """
+    def __init__(self, rois, keep_history=False):
+        super(ROIIntegrator, self).__init__()
+        rois = np.asarray(rois, dtype=np.intp).reshape(-1, 4)
+        if np.any(rois[:, 2] <= rois[:, 0]) or np.any(rois[:, 3] <= rois[:, 1]):
+            raise ValueError("Each ROI must have bot > top and right > left")
+        self.rois = rois
+        self.keep_history = keep_history
+        self.history = []
+        self.last = self.totals = None
+
+    def _start(self, image):
+        height, width = image.shape[:2]
+        rois = self.rois
+        if (rois[:, :2].min() < 0 or rois[:, 2].max() > height or rois[:, 3].max() > width):
+            raise ValueError("ROIs extend past the {}x{} image".format(width, height))
+        self.last = np.zeros(len(rois))
+        self.totals = np.zeros(len(rois))
+        self.history = []
+        self._slices = [(slice(t, b), slice(l, r)) for t, l, b, r in rois]
+
+        if len(rois) > INTEGRAL_IMAGE_THRESHOLD:
+            # Integral image with a leading row and column of zeros, so that the sum over
+            # [t:b, l:r] is I[b, r] - I[t, r] - I[b, l] + I[t, l]
+            self._integral = np.zeros((height + 1, width + 1) + image.shape[2:], dtype=float)
+            t, l, b, r = rois.T
+            self._corner_ys = np.stack([b, t, b, t], axis=1)
+            self._corner_xs = np.stack([r, r, l, l], axis=1)
+            self._corner_signs = np.array([1., -1., -1., 1.])
+        else:
+            self._integral = None
+
+    def _add(self, image):
+        integral = self._integral
+        if integral is None:
+            for i, s in enumerate(self._slices):
+                self.last[i] = image[s].sum(dtype=float)
+        else:
+            inner = integral[1:, 1:]
+            np.cumsum(image, axis=0, dtype=float, out=inner)
+            np.cumsum(inner, axis=1, out=inner)
+            corners = integral[self._corner_ys, self._corner_xs]
+            corners = corners.reshape(corners.shape[:2] + (-1,)).sum(axis=2)
+            np.dot(corners, self._corner_signs, out=self.last)
+        self.totals += self.last
+        if self.keep_history:
+            self.history.append(self.last.copy())
+
+    @property
+    def means(self):
+        """Mean sum of each ROI per frame"""
+        with self.lock:
+            self._check_count()
+            return self.totals / self.count
+
+
+class SoftwareBinning(Reduction):
+    """Bins each frame in software and passes the binned image on to further reductions
+
+    Rows and columns that don't fill a whole bin are discarded. The binned image is built in a
+    preallocated buffer, which `stages` must not hold onto.
+
+    Parameters
+    ----------
+    vbin, hbin : int
+        Vertical and horizontal bin size
+    stages : list of Reduction, optional
+        Reductions to update with each binned image
+    average : bool, optional
+        Whether to average the pixels in each bin rather than sum them
+
+    Attributes
+    ----------
+    latest : numpy.ndarray
+        Binned image of the most recent frame
+    """
+    def __init__(self, vbin, hbin, stages=(), average=False):
+        super(SoftwareBinning, self).__init__()
+        if vbin < 1 or hbin < 1:
+            raise ValueError("Bin sizes must be at least 1")
+        self.vbin = vbin
+        self.hbin = hbin
+        self.stages = list(stages)
+        self.average = average
+        self.latest = None
+
+    def _start(self, image):
+        height, width = image.shape[:2]
+        self._binned_shape = (height // self.vbin, width // self.hbin)
+        if not all(self._binned_shape):
+            raise ValueError("A {}x{} image is smaller than one bin".format(width, height))
+        dtype = float if (self.average or image.dtype.kind == 'f') else np.int64
+        self.latest = np.empty(self._binned_shape + image.shape[2:], dtype=dtype)
+
+    def _add(self, image):
+        (n_rows, n_cols), vbin, hbin = self._binned_shape, self.vbin, self.hbin
+        view = image[:n_rows * vbin, :n_cols * hbin]
+        view = view.reshape((n_rows, vbin, n_cols, hbin) + image.shape[2:])
+        np.sum(view, axis=(1, 3), out=self.latest)
+        if self.average:
+            self.latest /= vbin * hbin
+        for stage in self.stages:
+            stage.add(self.latest)
+
+    def reset(self):
+        super(SoftwareBinning, self).reset()
+        for stage in self.stages:
+            stage.reset()
+
+
+class _Hold(Reduction):
+    _ufunc = None
+
+    def _start(self, image):
+        self._hold = np.array(image)
+
+    def _add(self, image):
+        if self.count:
+            self._ufunc(self._hold, image, out=self._hold)
+
+    @property
+    def image(self):
+        """Copy of the held image"""
+        with self.lock:
+            self._check_count()
+            return self._hold.copy()
+
+
+class MaxHold(_Hold):
+    """Per-pixel maximum over all frames"""
+    _ufunc = np.maximum
+
+
+class MinHold(_Hold):
+    """Per-pixel minimum over all frames"""
+    _ufunc = np.minimum
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Frame streaming with explicit buffer leasing, shared by all camera drivers.
+
+`Camera.stream()` returns a `FrameStream`, which yields `Frame` objects whose pixel data lives in
+a pool of image buffers. A buffer is *leased* to the consumer until the frame is released, so the
+camera never overwrites data that is still in use. The pool itself is managed by a `FrameQueue`;
+drivers whose SDK keeps its own queue of image buffers provide a subclass that leases those buffers
+directly, while other drivers fall back to `LiveVideoQueue`, which copies each frame out of the
+driver's live video buffer.
+"""
+import time
+import threading
+from collections import deque
+from functools import partial
+
+import numpy as np
+
+from ... import Q_
+from ...errors import TimeoutError
+
+#: Valid values for the `policy` argument of `Camera.stream()`
+STREAM_POLICIES = ('drop_oldest', 'block')
+
+
+def _remaining(deadline):
+    """Seconds left until `deadline`, or None if there is no deadline"""
+    if deadline is None:
+        return None
+    return max(0., deadline - time.perf_counter())
+
+
+class Frame(object):
+    """An image leased from a `FrameStream`
+
+    The pixel data in `array` belongs to the stream's buffer pool and is guaranteed not to change
+    until the frame is released, after which the buffer may be refilled with a new image. Call
+    `release()` (or use the frame as a context manager) as soon as you are done with the data, and
+    copy anything you need to keep beyond that point.
+
+    Attributes
+    ----------
+    array : numpy.ndarray
+        View of the image data
+    seq : int
+        Sequence number of the frame. It counts every frame acquired since the stream started,
+        including dropped ones, so gaps between consecutive frames indicate drops.
+    timestamp : float
+        Value of `time.perf_counter()` when the frame was received
+    exposure_time : Quantity([time]) or None
+        Exposure time the stream was started with, if known
+    """
+    def __init__(self, array, seq, timestamp, release, exposure_time=None):
+        self.array = array
+        self.seq = seq
+        self.timestamp = timestamp
+        self.exposure_time = exposure_time
+        self._release = release
+
+    def __repr__(self):
+        state = 'released' if self.released else 'leased'
+        return '<Frame seq={} shape={} {}>'.format(self.seq, self.array.shape, state)
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self.array, dtype=dtype)
+        return np.asarray(self.array, dtype=dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    @property
+    def released(self):
+        """Whether the frame's buffer has been handed back to the stream"""
+        return self._release is None
+
+    def release(self):
+        """Hand the frame's buffer back to the stream so it can be refilled
+
+        The frame's `array` must not be used after this. Releasing a frame more than once has no
+        effect.
+        """
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+class FrameQueue(object):
+    """Pool of image buffers that feeds a `FrameStream`
+
+    `get()` hands out a filled buffer, which is leased to the consumer and not refilled until it is
+    passed back to `release()`. At most `n_buffers` buffers may be leased at once; when they all
+    are, the `policy` decides what happens to new frames. With 'drop_oldest', the oldest frame that
+    has not been handed out yet is discarded to make room. With 'block', acquisition waits until a
+    frame is released.
+
+    Drivers whose SDK manages its own buffer queue subclass this and return an instance from
+    `Camera._open_frame_queue()`, so that frames can be handed out without copying.
+    """
+    def __init__(self, n_buffers, policy):
+        if policy not in STREAM_POLICIES:
+            raise ValueError("policy must be one of {}".format(STREAM_POLICIES))
+        if n_buffers < 1:
+            raise ValueError("n_buffers must be at least 1")
+        self.n_buffers = n_buffers
+        self.policy = policy
+        self.n_leased = 0
+        self._cond = threading.Condition()
+
+    def get(self, timeout):
+        """Wait for the next frame and lease its buffer
+
+        Parameters
+        ----------
+        timeout : float or None
+            Max time to wait in seconds, or None to wait forever
+
+        Returns
+        -------
+        token
+            Opaque object identifying the buffer, to be passed to `release()`
+        array : numpy.ndarray
+            View of the buffer's image data
+        seq : int or None
+            Camera sequence number of the frame, counting dropped frames too. None if the driver
+            does not provide one, in which case frames are numbered consecutively.
+        """
+        raise NotImplementedError
+
+    def release(self, token):
+        """Return a leased buffer so it can be refilled"""
+        self._return_lease()
+
+    def close(self):
+        """Stop acquisition and free any resources"""
+
+    def _wait_for_lease(self, deadline):
+        """Under the 'block' policy, wait until fewer than `n_buffers` buffers are leased"""
+        if self.policy != 'block':
+            return
+        with self._cond:
+            while self.n_leased >= self.n_buffers:
+                if not self._cond.wait(_remaining(deadline)):
+                    raise TimeoutError("Timed out waiting for a leased frame to be released")
+
+    def _take_lease(self):
+        """Lease a buffer for a newly acquired frame, returning False if it must be dropped"""
+        with self._cond:
+            if self.n_leased >= self.n_buffers:
+                return False
+            self.n_leased += 1
+            return True
+
+    def _return_lease(self):
+        with self._cond:
+            self.n_leased -= 1
+            self._cond.notify()
+
+
+class LiveVideoQueue(FrameQueue):
+    """Generic `FrameQueue` built on a camera's live video methods
+
+    A background thread waits for each frame with `wait_for_frame()` and copies it out of the
+    driver's buffer into one of `n_buffers` arrays with ``latest_frame(out=...)``, where it stays
+    queued until `get()` hands it out. If no array is free, the oldest queued frame is evicted
+    under the 'drop_oldest' policy, and the new frame is dropped only if every array is leased.
+    Under the 'block' policy, the thread stops waiting for frames until an array is free. This
+    costs one copy per frame, and frames that the camera overwrites before `wait_for_frame()`
+    returns are not seen at all. The camera should not be used otherwise while the queue is open.
+    """
+    #: Max time in seconds that the acquisition thread waits for a frame before checking whether
+    #: the queue was closed
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, camera, n_buffers, policy, **kwds):
+        super(LiveVideoQueue, self).__init__(n_buffers, policy)
+        self.camera = camera
+        self.buffers = [None] * n_buffers
+        self._free = deque(range(n_buffers))
+        self._pending = deque()  # (index, seq) of filled buffers not yet handed out
+        self._seq = 0
+        self._error = None
+        self._closed = False
+        camera.start_live_video(**kwds)
+        self._thread = threading.Thread(target=self._acquire, name='instrumental-live-video')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get(self, timeout):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            while not self._pending:
+                if self._error is not None:
+                    raise self._error
+                if not self._cond.wait(_remaining(deadline)):
+                    raise TimeoutError("Timed out waiting for a frame")
+            index, seq = self._pending.popleft()
+            self.n_leased += 1
+        return index, self.buffers[index], seq
+
+    def release(self, index):
+        with self._cond:
+            self._free.append(index)
+            self.n_leased -= 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.camera.stop_live_video()
+
+    def _acquire(self):
+        try:
+            while self._receive():
+                pass
+        except Exception as e:
+            with self._cond:
+                self._error = e
+                self._cond.notify_all()
+
+    def _receive(self):
+        """Wait for one frame and queue it, returning False once the queue is closed"""
+        with self._cond:
+            while self.policy == 'block' and not self._free and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return False
+        if not self.camera.wait_for_frame(Q_(self.POLL_INTERVAL, 's')):
+            return True
+
+        seq, self._seq = self._seq, self._seq + 1
+        with self._cond:
+            if self._free:
+                index = self._free.popleft()
+            elif self._pending:
+                index, _ = self._pending.popleft()  # Evict the oldest queued frame
+            else:
+                return True  # Every buffer is leased, so drop this frame
+
+        buf = self.buffers[index]
+        if buf is None:
+            buf = self.buffers[index] = self.camera.latest_frame()
+        else:
+            self.camera.latest_frame(out=buf)
+
+        with self._cond:
+            self._pending.append((index, seq))
+            self._cond.notify_all()
+        return True
+
+
+class FrameStream(object):
+    """Iterator over leased frames, created by `Camera.stream()`
+
+    Iterating yields `Frame` objects, raising a TimeoutError if no frame arrives within `timeout`.
+    Closing the stream (or leaving its ``with`` block) stops acquisition.
+
+    Attributes
+    ----------
+    n_frames : int
+        Number of frames yielded so far
+    n_dropped : int
+        Number of frames acquired by the camera but never yielded, as far as the driver can tell
+    last_seq : int or None
+        Sequence number of the most recently yielded frame
+    exposure_time : Quantity([time]) or None
+        Exposure time the stream was started with, if known
+    """
+    def __init__(self, queue, timeout=None, exposure_time=None):
+        self.queue = queue
+        self.timeout = timeout
+        self.exposure_time = exposure_time
+        self.n_frames = 0
+        self.n_dropped = 0
+        self.last_seq = None
+        self.closed = False
+
+    def __repr__(self):
+        return '<FrameStream frames={} dropped={} leased={}{}>'.format(
+            self.n_frames, self.n_dropped, self.queue.n_leased, ' closed' if self.closed else '')
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        return self.next_frame()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def n_leased(self):
+        """Number of yielded frames that have not been released yet"""
+        return self.queue.n_leased
+
+    def next_frame(self, timeout=None):
+        """Wait for and return the next `Frame`
+
+        Parameters
+        ----------
+        timeout : float or None, optional
+            Max time to wait in seconds. Defaults to the stream's `timeout`.
+        """
+        if self.closed:
+            raise ValueError("Stream is closed")
+        token, array, seq = self.queue.get(self.timeout if timeout is None else timeout)
+        timestamp = time.perf_counter()
+
+        if seq is None:
+            seq = 0 if self.last_seq is None else self.last_seq + 1
+        elif self.last_seq is not None:
+            self.n_dropped += max(0, seq - self.last_seq - 1)
+        self.last_seq = seq
+        self.n_frames += 1
+        return Frame(array, seq, timestamp, partial(self._release, token), self.exposure_time)
+
+    def _release(self, token):
+        if not self.closed:
+            self.queue.release(token)
+
+    def close(self):
+        """Stop acquisition. Frames still leased must not be used afterwards."""
+        if not self.closed:
+            self.closed = True
+            self.queue.close()
@@ -3,6 +3,7 @@
 from future.utils import PY2
 
 import sys
+import time
 import os.path
 
 import numpy as np
@@ -10,6 +11,7 @@ from cffi import FFI
 from enum import Enum
 
 from . import Camera
+from .streaming import FrameQueue, _remaining
 from ..util import as_enum, unit_mag, check_units
 from .. import ParamSet, register_cleanup
 from ...errors import Error, TimeoutError
@@ -346,6 +348,11 @@ class TSI_DLL_Camera(object):
     def GetPendingImage(self):
         return self._ll.vptr.GetPendingImage(self._ll)
 
+    def FreeAllPendingImages(self):
+        ok = self._ll.vptr.FreeAllPendingImages(self._ll)
+        if not ok:
+            raise Exception("Failed to free pending images")
+
 
 def _rw_property(param):
     def fget(self):
@@ -353,6 +360,7 @@ def _rw_property(param):
 
     def fset(self, value):
         self._set_parameter(param, value)
+        self._forget_config()
 
     return property(fget, fset)
 
@@ -363,9 +371,46 @@ def _ro_property(param):
     return property(fget)
 
 
+class TSIFrameQueue(FrameQueue):
+    """Leases images straight from the SDK's queue of pending images, without copying
+
+    A leased image is only handed back to the SDK with `FreeImage()` once it is released. While no
+    image is pending, `get()` blocks in the SDK's `WaitForImage()` instead of polling.
+    """
+    def __init__(self, cam, n_buffers, policy, **kwds):
+        super(TSIFrameQueue, self).__init__(n_buffers, policy)
+        self._cam = cam
+        cam.start_live_video(**kwds)
+
+    def get(self, timeout):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        dev = self._cam._dev
+        while True:
+            self._wait_for_lease(deadline)
+            img = dev.GetPendingImage()
+            if img == ffi.NULL:
+                if not self._cam._wait_for_pending(deadline):
+                    raise TimeoutError("Timed out waiting for a frame")
+                continue
+
+            if self._take_lease():
+                array = self._cam._arr_from_img_struct(img, copy=False)
+                return img, array, img.m_FrameNumber
+            dev.FreeImage(img)  # Every image is leased, so drop this one
+
+    def release(self, img):
+        self._cam._dev.FreeImage(img)
+        self._return_lease()
+
+    def close(self):
+        self._cam.stop_live_video()
+
+
 class TSI_Camera(Camera):
     DEFAULT_KWDS = Camera.DEFAULT_KWDS.copy()
     DEFAULT_KWDS.update(trig='auto', rising=True)
+    _REMOTE_CACHED_ATTRS_ = ['model', 'serial']
+    _SIZE_SETTINGS = ('roi',)
 
     class TriggerMode(Enum):
         auto = OpMode.NORMAL
@@ -381,9 +426,11 @@ class TSI_Camera(Camera):
 
     def _initialize(self):
         sdk.GetNumberOfCameras()
-        self._partial_sequence = []
+        self._capture_stack = None
+        self._returned_idx = 0
         self._next_frame_idx = 0
         self._tot_frames = None  # Zero means 'infinite' capture
+        self._reset_frame_counter()
         self._trig_mode = None
         self._dev = sdk.GetCamera(self._paramset.get('number', 0))
 
@@ -412,17 +459,21 @@ class TSI_Camera(Camera):
     def _get_exposure_time(self):
         return self._get_parameter(Param.EXPOSURE_TIME) * u.ms
 
-    def _set_ROI(self, params):
+    def _set_ROI(self, left, top, right, bot, hbin, vbin):
         roi_data = {
-            'XOrigin': int(params['left']),
-            'YOrigin': int(params['top']),
-            'XPixels': int(params['right'] - params['left']),
-            'YPixels': int(params['bot'] - params['top']),
-            'XBin': int(params['hbin']),
-            'YBin': int(params['vbin']),
+            'XOrigin': int(left),
+            'YOrigin': int(top),
+            'XPixels': int(right - left),
+            'YPixels': int(bot - top),
+            'XBin': int(hbin),
+            'YBin': int(vbin),
         }
         self._set_parameter(Param.ROI_BIN, roi_data)
 
+    def _apply_ROI(self, kwds):
+        self._apply_setting(kwds, 'roi', self._set_ROI, kwds['left'], kwds['top'], kwds['right'],
+                            kwds['bot'], kwds['hbin'], kwds['vbin'])
+
     def _get_ROI(self):
         return self._get_parameter(Param.ROI_BIN)
 
@@ -432,10 +483,10 @@ class TSI_Camera(Camera):
             n_frames = 1
         self._set_parameter(Param.FRAME_COUNT, n_frames)
 
-    def grab_image(self, timeout='1s', copy=True, **kwds):
+    def grab_image(self, timeout='1s', copy=True, out=None, **kwds):
         self.start_capture(**kwds)
         try:
-            images = self.get_captured_image(timeout=timeout, copy=copy, **kwds)
+            images = self.get_captured_image(timeout=timeout, copy=copy, out=out, **kwds)
         finally:
             self._dev.Stop()
         return images
@@ -445,50 +496,174 @@ class TSI_Camera(Camera):
         self._dev.Stop()
 
     @check_units(timeout='?ms')
-    def get_captured_image(self, timeout='1s', copy=True, wait_for_all=True, **kwds):
-        image_arrs = []
+    def get_captured_image(self, timeout='1s', copy=True, wait_for_all=True, out=None, **kwds):
+        """Get the images of the current capture sequence
 
-        if self._tot_frames and self._next_frame_idx >= self._tot_frames:
+        Pending images are drained from the SDK in batches, straight into one stack allocated for
+        the whole sequence (or into `out`), so the SDK's image buffers are returned as quickly as
+        the camera fills them. With ``copy=False``, the returned images are views of that stack,
+        avoiding a second copy; with ``copy=True``, they are copied out of it.
+        """
+        if not self._tot_frames or self._returned_idx >= self._tot_frames:
             raise Error("No capture initiated. You must first call start_capture()")
 
-        start_time = clock() * u.s
+        deadline = None if timeout is None else time.perf_counter() + timeout.m_as('s')
+        start = self._returned_idx
+        n_at_call = self._next_frame_idx
         while self._next_frame_idx < self._tot_frames:
-            if timeout is None:
-                frame_ready = self.wait_for_frame(timeout=None)
-            else:
-                elapsed_time = clock() * u.s - start_time
-                frame_ready = self.wait_for_frame(timeout - elapsed_time)
-
-            if not frame_ready:
-                if wait_for_all or not image_arrs:
-                    self._partial_sequence.extend(image_arrs)  # Save for later
+            if self._capture_stack is None:
+                img = self._dev.GetPendingImage()
+                if img != ffi.NULL:
+                    self._capture_stack = self._make_capture_stack(img, out)
+                    self._drain_pending(self._capture_stack, 0, first=img)
+                    continue
+            elif len(self._drain_pending(self._capture_stack, self._next_frame_idx)):
+                continue
+
+            if not self._wait_for_pending(deadline):
+                if wait_for_all or self._next_frame_idx == n_at_call:
                     raise TimeoutError("Timed out while waiting for image readout")
-                else:
+                break
+
+        stack, end = self._capture_stack, self._next_frame_idx
+        self._returned_idx = end
+        if end >= self._tot_frames:
+            self._dev.Stop()
+            self._capture_stack = None
+
+        images = stack[start:end]
+        if out is None and copy:
+            images = images.copy()
+        elif out is not None and start > 0 and np.may_share_memory(stack, out):
+            images = images.copy()  # Shift them to the start of out
+        return self._images_result(list(images), out)
+
+    def _make_capture_stack(self, img, out):
+        """Stack for every image of the capture, using `out` directly if it fits"""
+        shape = (self._tot_frames, img.m_Height, img.m_Width)
+        if out is not None:
+            stack = out if out.ndim == 3 else out[np.newaxis]
+            if stack.shape[1:] == shape[1:] and len(stack) >= shape[0]:
+                return stack
+        return np.empty(shape, np.uint16)
+
+    def _wait_for_pending(self, deadline):
+        """Block in the SDK until an image is pending, returning False if `deadline` has passed"""
+        remaining = _remaining(deadline)
+        if remaining == 0:
+            return False
+        self._dev.WaitForImage(-1 if remaining is None else max(1, int(remaining * 1000)))
+        return True
+
+    def _reset_frame_counter(self):
+        #: Number of images received from the camera in the current acquisition
+        self.frame_count = 0
+        #: Number of images the camera acquired but never delivered, going by frame numbers
+        self.n_dropped = 0
+        #: Camera frame number of the most recently received image
+        self.last_frame_number = None
+
+    def _count_frames(self, frame_numbers):
+        """Update the frame counter with the frame numbers of newly received images"""
+        if not len(frame_numbers):
+            return
+        numbers = np.asarray(frame_numbers, np.int64)
+        if self.last_frame_number is not None:
+            gaps = np.diff(numbers, prepend=self.last_frame_number) - 1
+        else:
+            gaps = np.diff(numbers) - 1
+        self.n_dropped += int(gaps[gaps > 0].sum())
+        self.frame_count += len(numbers)
+        self.last_frame_number = int(numbers[-1])
+
+    def _drain_pending(self, stack, start, first=None):
+        """Copy every pending image into ``stack[start:]``, returning their frame numbers
+
+        All images of a batch are freed together once they have been copied. `first` is an image
+        that has already been taken from the queue.
+        """
+        dev = self._dev
+        imgs = [] if first is None else [first]
+        n_free = len(stack) - start
+        try:
+            while len(imgs) < n_free:
+                img = dev.GetPendingImage()
+                if img == ffi.NULL:
                     break
+                imgs.append(img)
 
-            array = self.latest_frame(copy)
-            image_arrs.append(array)
-        image_arrs = self._partial_sequence + image_arrs
+            frame_numbers = np.empty(len(imgs), np.uint32)
+            for i, img in enumerate(imgs):
+                np.copyto(stack[start + i], self._arr_from_img_struct(img, copy=False))
+                frame_numbers[i] = img.m_FrameNumber
+        finally:
+            for img in imgs:
+                dev.FreeImage(img)
 
-        if self._tot_frames and self._next_frame_idx >= self._tot_frames:
-            self._dev.Stop()
-            self._partial_sequence = []
+        self._count_frames(frame_numbers)
+        self._next_frame_idx += len(imgs)
+        return frame_numbers
 
-        if len(image_arrs) == 1:
-            return image_arrs[0]
-        else:
-            return tuple(image_arrs)
+    @check_units(timeout='?ms')
+    def drain_images(self, out=None, max_frames=64, timeout='0ms'):
+        """Copy all pending images into a stack in one call, freeing their SDK buffers
+
+        Useful for keeping up with the camera in burst or live mode, since the images are pulled
+        from the SDK without waiting on each one. Any images beyond what fits in the stack are
+        discarded and counted as dropped.
+
+        Parameters
+        ----------
+        out : numpy.ndarray, optional
+            Stack of shape *(n, height, width)* to copy the images into. If not given, a stack of
+            `max_frames` images is allocated when the first image arrives.
+        max_frames : int, optional
+            Max number of images to drain if `out` is not given
+        timeout : Quantity([time]) or None, optional
+            Max time to wait for the first image. If no image arrives in time, an empty stack is
+            returned. If *None*, waits indefinitely.
+
+        Returns
+        -------
+        images : numpy.ndarray
+            Stack of the drained images (a view of `out`, if given)
+        frame_numbers : numpy.ndarray
+            Camera frame number of each image. Gaps indicate dropped frames, which are also
+            tallied in `n_dropped`.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout.m_as('s')
+        img = self._dev.GetPendingImage()
+        while img == ffi.NULL:
+            if not self._wait_for_pending(deadline):
+                stack = out if out is not None else np.empty((0, 0, 0), np.uint16)
+                return stack[:0], np.empty(0, np.uint32)
+            img = self._dev.GetPendingImage()
+
+        if out is None:
+            out = np.empty((max_frames, img.m_Height, img.m_Width), np.uint16)
+        frame_numbers = self._drain_pending(out, 0, first=img)
+
+        if len(frame_numbers) == len(out):
+            # Throw away whatever didn't fit all at once. The gap in frame numbers shows up as
+            # dropped frames when the next image arrives.
+            self._dev.FreeAllPendingImages()
+
+        return out[:len(frame_numbers)], frame_numbers
 
     def start_capture(self, **kwds):
         self._handle_kwds(kwds)
 
-        self._set_ROI(kwds)
-        self._set_exposure_time(kwds['exposure_time'])
-        self._set_trig_mode(kwds['trig'], kwds['rising'])
-        self._set_n_frames(kwds['n_frames'])
+        # Only push the settings that changed since the last capture
+        self._apply_ROI(kwds)
+        self._apply_setting(kwds, 'exposure_time', self._set_exposure_time, kwds['exposure_time'])
+        if self._apply_setting(kwds, 'trig', self._set_trig_mode, kwds['trig'], kwds['rising']):
+            self._forget_config('n_frames')  # The frame count depends on the trigger mode
+        self._apply_setting(kwds, 'n_frames', self._set_n_frames, kwds['n_frames'])
         self._tot_frames = kwds['n_frames']
-        self._partial_sequence = []
+        self._capture_stack = None
+        self._returned_idx = 0
         self._next_frame_idx = 0
+        self._reset_frame_counter()
 
         self._dev.Stop()  # Ensure old captures are finished
         self._dev.Start()
@@ -503,17 +678,20 @@ class TSI_Camera(Camera):
             if img != ffi.NULL:
                 self._latest_tsi_img = img
                 self._next_frame_idx += 1
+                self._count_frames((img.m_FrameNumber,))
                 return True
 
             elapsed_time = clock() - start_time
             if timeout_s is not None and elapsed_time > timeout_s:
                 return False
 
-    def latest_frame(self, copy=True):
+    def latest_frame(self, copy=True, out=None):
         # Frees the TSI image buffer if `copy` is true. Otherwise, it's the user's responsibility
         # If no buffers are available for use, the frame count will never increment, and
         # wait_for_frame will block (until its timeout is reached)
-        img = self._arr_from_img_struct(self._latest_tsi_img, copy)
+        img = self._arr_from_img_struct(self._latest_tsi_img, copy and out is None)
+        if out is not None:
+            img = self._copy_to_out(out, img)
         self._dev.FreeImage(self._latest_tsi_img)
         return img
 
@@ -537,12 +715,14 @@ class TSI_Camera(Camera):
     def start_live_video(self, **kwds):
         self._handle_kwds(kwds)
 
-        self._set_ROI(kwds)
-        self._set_trig_mode(self.TriggerMode.auto)
-        self._set_exposure_time(kwds['exposure_time'])
-        self._set_n_frames(0)
+        self._apply_ROI(kwds)
+        if self._apply_setting(kwds, 'trig', self._set_trig_mode, self.TriggerMode.auto, True):
+            self._forget_config('n_frames')
+        self._apply_setting(kwds, 'exposure_time', self._set_exposure_time, kwds['exposure_time'])
+        self._apply_setting(kwds, 'n_frames', self._set_n_frames, 0)
         self._tot_frames = 0
         self._next_frame_idx = 0
+        self._reset_frame_counter()
 
         self._dev.Stop()  # Ensure old captures are finished
         self._dev.Start()
@@ -550,6 +730,9 @@ class TSI_Camera(Camera):
     def stop_live_video(self):
         self._dev.Stop()
 
+    def _open_frame_queue(self, n_buffers, policy, **kwds):
+        return TSIFrameQueue(self, n_buffers, policy, **kwds)
+
     def _set_trig_mode(self, mode, rising=True):
         self._trig_mode = mode = as_enum(self.TriggerMode, mode)
         use_hw_trigger = (mode != self.TriggerMode.auto)
@@ -7,9 +7,11 @@ possible to implement if desired.
 """
 from past.builtins import basestring, unicode
 
+import time
 import struct
 import weakref
 import fnmatch
+from collections import OrderedDict
 import numpy as np
 import win32event  # req: pywin32
 
@@ -17,6 +19,7 @@ from nicelib import (NiceLib, NiceObject, load_lib,
                      RetHandler, Sig, ret_return)  # req: nicelib >= 0.5
 
 from . import Camera
+from .streaming import FrameQueue, _remaining
 from ..util import check_units
 from .. import ParamSet, Facet
 from ...errors import (InstrumentNotFoundError, Error, TimeoutError, LibError,
@@ -158,11 +161,13 @@ class NiceUC480(NiceLib):
         FreeImageMem = Sig('in', 'in', 'in')
         GetActSeqBuf = Sig('in', 'out', 'out', 'out')
         GetError = Sig('in', 'out', 'bufout', ret=ret_geterror)
+        GetImageInfo = Sig('in', 'in', 'out', 'in')
         GetImageMemPitch = Sig('in', 'out')
         GetSensorInfo = Sig('in', 'out')
         HasVideoStarted = Sig('in', 'out')
         InitEvent = Sig('in', 'in', 'in')
         InitImageQueue = Sig('in', 'in')
+        LockSeqBuf = Sig('in', 'in', 'in')
         ParameterSet = Sig('in', 'in', 'inout', 'in')
         ResetToDefault = Sig('in')
         SetAutoParameter = Sig('in', 'in', 'inout', 'inout')
@@ -178,6 +183,7 @@ class NiceUC480(NiceLib):
         SetSubSampling = Sig('in', 'in', ret=cmd_ret_handler('IS_GET_*SUBSAMPLING*'))
         SetTriggerDelay = Sig('in', 'in', ret=cmd_ret_handler('IS_GET_*TRIGGER*'))
         StopLiveVideo = Sig('in', 'in')
+        UnlockSeqBuf = Sig('in', 'in', 'in')
         SetHardwareGain = Sig('in', 'in', 'in', 'in', 'in',
                               ret=cmd_ret_handler(
                                   ('IS_GET_MASTER_GAIN', 'IS_GET_RED_GAIN', 'IS_GET_GREEN_GAIN',
@@ -551,7 +557,8 @@ def _get_legit_params(params):
     raise InstrumentNotFoundError("No camera found matching the given parameters")
 
 
-def AutoParamEnableFacet(name, doc=None):
+def AutoParamEnableFacet(name, doc=None, adjusts=()):
+    """Facet that toggles an auto mode, which changes the capture settings named in `adjusts`"""
     GET_CMD = getattr(lib, 'GET_ENABLE_' + name)
     SET_CMD = getattr(lib, 'SET_ENABLE_' + name)
     def fget(self):
@@ -560,20 +567,111 @@ def AutoParamEnableFacet(name, doc=None):
 
     def fset(self, enable):
         self._dev.SetAutoParameter(SET_CMD, enable, 0)
+        if adjusts:
+            self._forget_config(*adjusts)
 
     return Facet(fget, fset, type=bool, doc=doc)
 
 
+#: Pixel formats selectable with the `pixel_format` capture parameter, mapping each name to the
+#: uc480 color mode, bits per pixel, and number of channels returned. 'rgb' views the RGB channels
+#: of RGBA memory, while the others return the camera's native packed layout as-is.
+PIXEL_FORMATS = {
+    'mono8': ('CM_MONO8', 8, 1),
+    'rgb': ('CM_RGBA8_PACKED', 32, 3),
+    'rgba': ('CM_RGBA8_PACKED', 32, 4),
+    'bgra': ('CM_BGRA8_PACKED', 32, 4),
+    'rgb_packed': ('CM_RGB8_PACKED', 24, 3),
+    'bgr_packed': ('CM_BGR8_PACKED', 24, 3),
+}
+
+#: Max number of image sizes whose image memories are kept allocated between captures
+MEM_POOL_SIZE = 4
+
+
 class BufferInfo(object):
     def __init__(self, ptr, id):
         self.ptr = ptr
         self.id = id
 
 
+class FrameGeometry(object):
+    """Layout of images in image memory, which is fixed for the duration of an acquisition"""
+    def __init__(self, width, height, pitch, bits_per_pixel, n_channels):
+        self.buf_size = pitch * height
+        if n_channels == 1:
+            self.shape, self.strides = (height, width), (pitch, 1)
+        else:
+            self.shape = (height, width, n_channels)
+            self.strides = (pitch, bits_per_pixel // 8, 1)
+
+    def array(self, ptr):
+        """View the image memory at `ptr` as an array, without copying"""
+        return np.ndarray(self.shape, np.uint8, ffi.buffer(ptr, self.buf_size), 0, self.strides)
+
+
+def _address(ptr):
+    """Address of an image memory pointer, usable as a dict key"""
+    return int(ffi.cast('uintptr_t', ptr))
+
+
+class UC480FrameQueue(FrameQueue):
+    """Leases image memories of the camera's ring buffer directly, locking each one until released
+
+    Live video runs with one more image memory than `n_buffers`, so that the camera always has an
+    unlocked memory to write into. Each frame is locked with `LockSeqBuf()` as soon as it has been
+    written, which makes the camera skip it until `UnlockSeqBuf()` is called on release. While
+    every buffer is leased, the camera keeps overwriting the spare one, so under the 'drop_oldest'
+    policy those frames are dropped.
+    """
+    def __init__(self, cam, n_buffers, policy, **kwds):
+        super(UC480FrameQueue, self).__init__(n_buffers, policy)
+        self._cam = cam
+        self._leased = set()
+        cam.start_live_video(n_buffers=n_buffers + 1, **kwds)
+        self._buffers = {_address(buf.ptr): buf for buf in cam._buffers}
+
+    def get(self, timeout):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        cam = self._cam
+        while True:
+            self._wait_for_lease(deadline)
+            remaining = _remaining(deadline)
+            if not cam.wait_for_frame(None if remaining is None else Q_(remaining, 's')):
+                raise TimeoutError("Timed out waiting for a frame")
+
+            _, _, last_ptr = cam._dev.GetActSeqBuf()
+            buf = self._buffers[_address(last_ptr)]
+            if buf.id in self._leased:
+                continue  # No new frame was completed
+            if self._take_lease():
+                break
+            # Every buffer is leased, so the camera overwrote this frame with the next one
+
+        cam._dev.LockSeqBuf(lib.IGNORE_PARAMETER, buf.ptr)
+        self._leased.add(buf.id)
+        seq = cam._dev.GetImageInfo(buf.id, ffi.sizeof('UEYEIMAGEINFO')).u64FrameNumber
+        return buf, cam._array_from_buffer(buf.ptr), int(seq)
+
+    def release(self, buf):
+        self._leased.discard(buf.id)
+        self._cam._dev.UnlockSeqBuf(lib.IGNORE_PARAMETER, buf.ptr)
+        self._return_lease()
+
+    def close(self):
+        self._cam.stop_live_video()
+        for buf in self._buffers.values():
+            if buf.id in self._leased:
+                self._cam._dev.UnlockSeqBuf(lib.IGNORE_PARAMETER, buf.ptr)
+        self._leased.clear()
+
+
 class UC480_Camera(Camera):
     """A uc480-supported Camera"""
     DEFAULT_KWDS = Camera.DEFAULT_KWDS.copy()
-    DEFAULT_KWDS.update(vsub=1, hsub=1)
+    DEFAULT_KWDS.update(vsub=1, hsub=1, pixel_format=None)
+    _SIZE_SETTINGS = ('binning', 'subsampling')
+    _REMOTE_CACHED_ATTRS_ = ['id', 'serial', 'model']
 
     def _initialize(self):
         """Create a UC480_Camera object.
@@ -605,10 +703,14 @@ class UC480_Camera(Camera):
         self._width, self._height = 0, 0
         self._color_depth = 0
         self._color_mode = 0
+        self._pixel_format = None
         self._list_p_img_mem = None
         self._list_memid = None
 
         self._buffers = []
+        self._mem_pool = OrderedDict()  # (width, height, color depth) -> [BufferInfo]
+        self._mem_key = None
+        self._geometry = None
         self._queue_enabled = False
         self._trigger_mode = lib.SET_TRIGGER_OFF
 
@@ -629,6 +731,7 @@ class UC480_Camera(Camera):
     def set_auto_exposure(self, enable=True):
         """Enable or disable the auto exposure shutter."""
         self._dev.SetAutoParameter(lib.SET_ENABLE_AUTO_SHUTTER, enable, 0)
+        self._forget_config('exposure_time')
 
     def load_params(self, filename=None):
         """Load camera parameters from file or EEPROM.
@@ -648,24 +751,12 @@ class UC480_Camera(Camera):
             param = ffi.new('wchar_t[]', filename)
 
         self._dev.ParameterSet(cmd, param, ffi.sizeof(param))
+        self._forget_config()  # The loaded parameters replace whatever was applied
         self._init_colormode()  # Ignore loaded color mode b/c we only support a few
 
-        # Make sure memory is set up for right color depth
-        depth_map = {
-            lib.CM_MONO8: 8,
-            lib.CM_RGBA8_PACKED: 32,
-            lib.CM_BGRA8_PACKED: 32
-        }
-        mode = self._dev.SetColorMode(lib.GET_COLOR_MODE)
-        depth = depth_map[mode]
-        if depth != self._color_depth:
-            log.debug("Color depth changed from %s to %s",
-                      self._color_depth, depth)
-            num_bufs = len(self._buffers)
-            self._free_image_mem_seq()
-            self._color_depth = depth
-            self._allocate_mem_seq(num_bufs)
-        self._color_mode = mode
+        # Make sure memory is set up for the right size and color depth
+        self._refresh_sizes()
+        self._use_mem_seq(len(self._buffers))
 
     def open(self, num_bufs=1, force=False):
         """ Connect to the camera and set up the image memory.
@@ -681,12 +772,16 @@ class UC480_Camera(Camera):
 
         self._dev = lib.Camera(self._id, ffi.NULL)
         self.is_open = True
+        self._forget_config()
+        self._buffers = []
+        self._mem_pool.clear()
+        self._mem_key = None
         self._refresh_sizes()
         log.debug('image width=%d, height=%d', self.width, self.height)
 
         self._init_colormode()
         self._set_AOI(0, 0, self._width, self._height)
-        self._allocate_mem_seq(num_bufs)
+        self._use_mem_seq(num_bufs)
 
         self._seq_event = win32event.CreateEvent(None, False, False, '')
         self._frame_event = win32event.CreateEvent(None, True, False, '')  # Don't auto-reset
@@ -697,34 +792,66 @@ class UC480_Camera(Camera):
 
     def _init_colormode(self):
         log.debug("Initializing default color mode")
+        self._pixel_format = None
+        self._set_pixel_format(None)
+
+    def _default_pixel_format(self):
         sensor_mode = self._get_sensor_color_mode()
-        mode_map = {
-            lib.COLORMODE_MONOCHROME: (lib.CM_MONO8, 8),
-            lib.COLORMODE_BAYER: (lib.CM_RGBA8_PACKED, 32)
-        }
+        if sensor_mode == lib.COLORMODE_MONOCHROME:
+            return 'mono8'
+        elif sensor_mode == lib.COLORMODE_BAYER:
+            return 'rgb'
+        raise Exception("Currently unsupported sensor color mode!")
+
+    def _set_pixel_format(self, pixel_format):
+        """Set the color mode that produces `pixel_format`, or the sensor's default if None"""
+        if pixel_format is None:
+            pixel_format = self._default_pixel_format()
+        if pixel_format == self._pixel_format:
+            return
         try:
-            mode, depth = mode_map[sensor_mode]
+            mode_name, depth, _ = PIXEL_FORMATS[pixel_format]
         except KeyError:
-            raise Exception("Currently unsupported sensor color mode!")
+            raise Error("Unknown pixel format '{}', must be one of {}".format(
+                pixel_format, sorted(PIXEL_FORMATS)))
+        if depth > 8 and self._get_sensor_color_mode() == lib.COLORMODE_MONOCHROME:
+            raise Error("Monochrome sensors only support the 'mono8' pixel format")
 
-        self._color_mode = mode
+        self._color_mode = getattr(lib, mode_name)
         self._color_depth = depth
-        log.debug('color_depth=%d, color_mode=%d', depth, mode)
+        self._pixel_format = pixel_format
+        self._geometry = None
+        log.debug('color_depth=%d, color_mode=%d', depth, self._color_mode)
 
         self._dev.SetColorMode(self._color_mode)
 
-    def _free_image_mem_seq(self):
+    def _use_mem_seq(self, num_bufs):
+        """Set up a sequence of `num_bufs` image memories for the current size and color depth
+
+        Image memories are pooled by size and color depth, so captures with the same geometry
+        reuse them instead of freeing and reallocating them each time.
+        """
+        key = (self._width, self._height, self._color_depth)
+        if key == self._mem_key and len(self._buffers) == num_bufs:
+            return
+
         self._dev.ClearSequence()
+        pool = self._mem_pool.pop(key, [])
+        self._mem_pool[key] = pool  # Now the most recently used
+        while len(pool) < num_bufs:
+            p_img_mem, memid = self._dev.AllocImageMem(self._width, self._height, self._color_depth)
+            pool.append(BufferInfo(p_img_mem, memid))
+
+        self._buffers = pool[:num_bufs]
         for buf in self._buffers:
-            self._dev.FreeImageMem(buf.ptr, buf.id)
-        self._buffers = []
+            self._dev.AddToSequence(buf.ptr, buf.id)
+        self._mem_key = key
+        self._geometry = None
 
-    def _allocate_mem_seq(self, num_bufs):
-        """Create and setup the image memory for live capture."""
-        for i in range(num_bufs):
-            p_img_mem, memid = self._dev.AllocImageMem(self._width, self._height, self._color_depth)
-            self._dev.AddToSequence(p_img_mem, memid)
-            self._buffers.append(BufferInfo(p_img_mem, memid))
+        while len(self._mem_pool) > MEM_POOL_SIZE:
+            _, bufs = self._mem_pool.popitem(last=False)
+            for buf in bufs:
+                self._dev.FreeImageMem(buf.ptr, buf.id)
 
         # Initialize display
         self._dev.SetDisplayMode(lib.SET_DM_DIB)
@@ -745,8 +872,11 @@ class UC480_Camera(Camera):
         self._dev.ExitEvent(lib.SET_EVENT_FRAME)
 
         try:
-            self._dev.ExitCamera()
+            self._dev.ExitCamera()  # Also frees all image memory
             self.is_open = False
+            self._mem_pool.clear()
+            self._buffers = []
+            self._mem_key = None
         except Exception as e:
             log.error("Failed to close camera")
             log.error(str(e))
@@ -765,22 +895,16 @@ class UC480_Camera(Camera):
         info = self._dev.GetSensorInfo()
         return char_to_int(info.nColorMode)
 
-    def _array_from_buffer(self, buf):
-        h = self.height
-        arr = np.frombuffer(buf, np.uint8)
-
-        if self._color_mode == lib.CM_RGBA8_PACKED:
-            w = self.bytes_per_line // 4
-            arr = arr.reshape((h, w, 4), order='C')[:,:,:3]
-        elif self._color_mode == lib.CM_BGRA8_PACKED:
-            w = self.bytes_per_line // 4
-            arr = arr.reshape((h, w, 4), order='C')[:, :, 2::-1]
-        elif self._color_mode == lib.CM_MONO8:
-            w = self.bytes_per_line
-            arr = arr.reshape((h, w), order='C')
-        else:
-            raise Error("Unsupported color mode!")
-        return arr
+    def _get_geometry(self):
+        """Layout of the current image memories, cached until the size or pixel format changes"""
+        if self._geometry is None:
+            _, depth, n_channels = PIXEL_FORMATS[self._pixel_format]
+            self._geometry = FrameGeometry(self._width, self._height, self._bytes_per_line(),
+                                           depth, n_channels)
+        return self._geometry
+
+    def _array_from_buffer(self, ptr):
+        return self._get_geometry().array(ptr)
 
     def _set_queueing(self, enable):
         if enable:
@@ -804,21 +928,32 @@ class UC480_Camera(Camera):
         mode = BIN_V_CODE_FROM_NUM[vbin] | BIN_H_CODE_FROM_NUM[hbin]
         self._dev.SetBinning(mode)
 
-    def start_capture(self, **kwds):
+    def _apply_geometry(self, kwds):
+        """Apply the binning, subsampling, and AOI of `kwds`, skipping any that are unchanged"""
         self._handle_kwds(kwds, fill_coords=False)
 
-        self._set_binning(kwds['vbin'], kwds['hbin'])
-        self._set_subsampling(kwds['vsub'], kwds['hsub'])
-        self._refresh_sizes()
+        changed = self._apply_setting(kwds, 'binning', self._set_binning, kwds['vbin'],
+                                      kwds['hbin'])
+        changed |= self._apply_setting(kwds, 'subsampling', self._set_subsampling, kwds['vsub'],
+                                       kwds['hsub'])
+        if changed:
+            self._refresh_sizes()
+            self._forget_config('aoi')
 
         # Fill coords now b/c max width/height may have changed
         self._handle_kwds(kwds, fill_coords=True)
-        self._set_AOI(kwds['left'], kwds['top'], kwds['right'], kwds['bot'])
-        self._set_exposure(kwds['exposure_time'])
-        self._set_gain(kwds['gain'])
+        self._apply_setting(kwds, 'aoi', self._set_AOI, kwds['left'], kwds['top'], kwds['right'],
+                            kwds['bot'])
+
+    def start_capture(self, **kwds):
+        # Only push the settings that changed since the last capture
+        self._apply_geometry(kwds)
+        self._apply_setting(kwds, 'exposure_time', self._set_exposure, kwds['exposure_time'])
+        self._apply_setting(kwds, 'gain', self._set_gain, kwds['gain'])
 
-        self._free_image_mem_seq()
-        self._allocate_mem_seq(kwds['n_frames'])
+        self._apply_setting(kwds, 'pixel_format', self._set_pixel_format, kwds['pixel_format'])
+        self._use_mem_seq(kwds['n_frames'])
+        self._get_geometry()
 
         self._set_queueing(True)  # Use queue instead of ring buffer for finite sequence
 
@@ -830,7 +965,7 @@ class UC480_Camera(Camera):
         self._dev.CaptureVideo(lib.DONT_WAIT)  # Trigger
 
     @check_units(timeout='ms')
-    def get_captured_image(self, timeout='1s', copy=True):
+    def get_captured_image(self, timeout='1s', copy=True, out=None):
         ret = win32event.WaitForSingleObject(self._seq_event, int(timeout.m_as('ms')))
         self._dev.DisableEvent(lib.SET_EVENT_SEQ)
 
@@ -842,44 +977,43 @@ class UC480_Camera(Camera):
         # Assumes we have exactly as many images as buffers
         arrays = []
         for buf in self._buffers:
-            buf_size = self.bytes_per_line * self.height
-            array = self._array_from_buffer(ffi.buffer(buf.ptr, buf_size))
-            arrays.append(np.copy(array) if copy else array)
+            array = self._array_from_buffer(buf.ptr)
+            arrays.append(np.copy(array) if copy and out is None else array)
+        images = self._images_result(arrays, out)
 
         self._dev.StopLiveVideo(lib.WAIT)
+        return images
 
-        if len(arrays) == 1:
-            return arrays[0]
-        else:
-            return tuple(arrays)
-
-    def grab_image(self, timeout='1s', copy=True, **kwds):
+    def grab_image(self, timeout='1s', copy=True, out=None, **kwds):
         self.start_capture(**kwds)
-        return self.get_captured_image(timeout=timeout, copy=copy)
+        return self.get_captured_image(timeout=timeout, copy=copy, out=out)
 
     @check_units(framerate='?Hz')
-    def start_live_video(self, framerate=None, **kwds):
-        self._handle_kwds(kwds, fill_coords=False)
+    def start_live_video(self, framerate=None, n_buffers=2, **kwds):
+        """Start live video mode
 
-        self._set_binning(kwds['vbin'], kwds['hbin'])
-        self._set_subsampling(kwds['vsub'], kwds['hsub'])
-        self._refresh_sizes()
-
-        # Fill coords now b/c max width/height may have changed
-        self._handle_kwds(kwds, fill_coords=True)
-        self._set_AOI(kwds['left'], kwds['top'], kwds['right'], kwds['bot'])
+        Parameters
+        ----------
+        framerate : Quantity([frequency]), optional
+            Target frame rate. Defaults to the inverse of the exposure time.
+        n_buffers : int, optional
+            Number of image memories in the ring buffer, at least 2
+        """
+        self._apply_geometry(kwds)
 
         # Framerate should be set *before* exposure time
         if framerate is None:
             # This is necessary to ensure that the exposure_time is within the reachable range
             framerate = 1/Q_(kwds['exposure_time'])
         self._dev.SetFrameRate(framerate.m_as('Hz'))
+        self._forget_config('exposure_time')  # Changing the framerate may change the exposure
 
-        self._set_exposure(kwds['exposure_time'])
-        self._set_gain(kwds['gain'])
+        self._apply_setting(kwds, 'exposure_time', self._set_exposure, kwds['exposure_time'])
+        self._apply_setting(kwds, 'gain', self._set_gain, kwds['gain'])
 
-        self._free_image_mem_seq()
-        self._allocate_mem_seq(num_bufs=2)
+        self._apply_setting(kwds, 'pixel_format', self._set_pixel_format, kwds['pixel_format'])
+        self._use_mem_seq(num_bufs=max(n_buffers, 2))
+        self._get_geometry()
         self._set_queueing(False)
 
         self._trigger_mode = lib.SET_TRIGGER_OFF
@@ -904,10 +1038,14 @@ class UC480_Camera(Camera):
 
         return True
 
-    def latest_frame(self, copy=True):
+    def _open_frame_queue(self, n_buffers, policy, **kwds):
+        return UC480FrameQueue(self, n_buffers, policy, **kwds)
+
+    def latest_frame(self, copy=True, out=None):
         buf_num, buf_ptr, last_buf_ptr = self._dev.GetActSeqBuf()
-        buf_size = self.bytes_per_line * self.height
-        array = self._array_from_buffer(ffi.buffer(last_buf_ptr, buf_size))
+        array = self._array_from_buffer(last_buf_ptr)
+        if out is not None:
+            return self._copy_to_out(out, array)
         return np.copy(array) if copy else array
 
     def _get_AOI(self):
@@ -917,6 +1055,7 @@ class UC480_Camera(Camera):
     def _set_AOI(self, x0, y0, x1, y1):
         self._dev.AOI(lib.AOI_IMAGE_SET_AOI, (x0, y0, x1-x0, y1-y0))
         self._refresh_sizes()
+        self._geometry = None
 
     def _refresh_sizes(self):
         _, _, self._width, self._height = self._get_AOI()
@@ -939,6 +1078,7 @@ class UC480_Camera(Camera):
         if isinstance(exposure, float):
             exposure = Q_(exposure, 'ms')
         self._set_exposure(exposure)
+        self._forget_config('exposure_time')
 
     def _get_exposure_range(self):
         exp_ms_min = self._dev.Exposure(lib.IS_EXPOSURE_CMD_GET_EXPOSURE_RANGE_MIN)
@@ -1086,6 +1226,7 @@ class UC480_Camera(Camera):
     @pixelclock.setter
     def pixelclock(self, clock):
         self._dev.PixelClock(lib.PIXELCLOCK_CMD_SET, clock)
+        self._forget_config('exposure_time')  # Changing the pixel clock may change the exposure
 
     @Facet(units='MHz')
     def pixelclock_default(self):
@@ -1132,25 +1273,30 @@ class UC480_Camera(Camera):
     def master_gain(self, gain):
         gain_factor = int(round(gain * 100))
         self._dev.SetHWGainFactor(lib.SET_MASTER_GAIN_FACTOR, gain_factor)
+        self._forget_config('gain')
 
     max_master_gain = property(lambda self: self._max_master_gain,
                                doc="Max value that ``master_gain`` can take")
 
     auto_gain = AutoParamEnableFacet(
         'AUTO_GAIN',
-        doc="Whether auto gain is enabled"
+        doc="Whether auto gain is enabled",
+        adjusts=('gain',)
     )
     auto_sensor_gain = AutoParamEnableFacet(
         'AUTO_SENSOR_GAIN',
-        doc="Whether sensor-based auto gain is enabled"
+        doc="Whether sensor-based auto gain is enabled",
+        adjusts=('gain',)
     )
     auto_exposure = AutoParamEnableFacet(
         'AUTO_SHUTTER',
-        doc="Whether auto exposure is enabled"
+        doc="Whether auto exposure is enabled",
+        adjusts=('exposure_time',)
     )
     auto_sensor_exposure = AutoParamEnableFacet(
         'AUTO_SENSOR_SHUTTER',
-        doc="Whether sensor-based auto exposure is enabled"
+        doc="Whether sensor-based auto exposure is enabled",
+        adjusts=('exposure_time',)
     )
     auto_whitebalance = AutoParamEnableFacet(
         'AUTO_WHITEBALANCE',
@@ -1162,11 +1308,13 @@ class UC480_Camera(Camera):
     )
     auto_framerate = AutoParamEnableFacet(
         'AUTO_FRAMERATE',
-        doc="Whether auto framerate is enabled"
+        doc="Whether auto framerate is enabled",
+        adjusts=('exposure_time',)
     )
     auto_sensor_framerate = AutoParamEnableFacet(
         'AUTO_SENSOR_FRAMERATE',
-        doc="Whether sensor-based auto framerate is enabled"
+        doc="Whether sensor-based auto framerate is enabled",
+        adjusts=('exposure_time',)
     )
 
     #: uEye camera ID number. Read-only
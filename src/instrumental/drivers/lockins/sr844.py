@@ -5,7 +5,7 @@ Note that the sr844 will not usually work with `list_instruments()`, because it
 termination character, and because one must first send the 'OUTX' command to specify which type of
 output to use.
 """
-from numpy import fromstring, float32
+from numpy import fromstring, frombuffer, float32
 from enum import Enum
 import pyvisa
 from ..util import check_units, check_enums
@@ -571,7 +571,7 @@ class SR844(Lockin):
             with self._rsrc.ignore_warning(pyvisa.constants.VI_SUCCESS_MAX_CNT):
                 raw_binary, _ = self._rsrc.visalib.read(self._rsrc.session,
                                                         points[1]*BYTES_PER_POINT)
-            trace = fromstring(raw_binary, dtype=float32)
+            trace = frombuffer(raw_binary, dtype=float32)
             trace = trace.astype(float)
             self._rsrc.read_termination = read_termination
             self._rsrc.end_input = end_input
@@ -6,9 +6,10 @@ Note that the sr850 will not usually work with `list_instruments()`, because it
 termination character, and because one must first send the 'OUTX' command to specify which type of
 output to use.
 """
-from numpy import fromstring, float32
+from numpy import fromstring, frombuffer, float32
 from enum import Enum
 import pyvisa
+from . import Lockin
 from ..util import check_units, check_enums
 from ...errors import InstrumentTypeError
 from ... import Q_
@@ -276,7 +277,7 @@ class StatusByte(Enum):
     service_request = 6
 
 
-class SR850:
+class SR850(Lockin):
     """ Interfaces with the SRS model SR850 Lock-in Amplifier"""
     AlarmMode = AlarmMode
     ReferenceSource = ReferenceSource
@@ -846,7 +847,7 @@ class SR850:
             with self._rsrc.ignore_warning(pyvisa.constants.VI_SUCCESS_MAX_CNT):
                 raw_binary, _ = self._rsrc.visalib.read(self._rsrc.session,
                                                         points[1]*BYTES_PER_POINT)
-            trace = fromstring(raw_binary, dtype=float32)
+            trace = frombuffer(raw_binary, dtype=float32)
             trace = trace.astype(float)
             self._rsrc.read_termination = read_termination
             self._rsrc.end_input = end_input
@@ -6,14 +6,29 @@ Support for instruments on remote servers.
 
 from __future__ import absolute_import, unicode_literals, print_function
 import atexit
+import contextlib
+import inspect
+import ipaddress
+import multiprocessing
+import os
 import socket
 import struct
 import threading
 import pickle
+import time
+import zlib
+import lzma
+import weakref
+from collections import deque, namedtuple
+from queue import Queue, Empty
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures import wait as wait_futures
+import numpy as np
 
 from . import instrument, list_instruments, Instrument
 from .. import conf
 from ..log import get_logger
+from ..util import cached_property
 
 # Python 2 and 3 support
 try:
@@ -21,15 +36,79 @@ try:
 except ImportError:
     import SocketServer as socketserver
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
 log = get_logger(__name__)
 
 DEFAULT_PORT = 28265
 
+# Default number of worker threads a server uses to handle requests
+DEFAULT_MAX_WORKERS = 16
+
+# Max time to wait for a worker process to start up, in seconds
+WORKER_START_TIMEOUT = 60.
+
 # Header format is:
 # 1 unsigned byte - message id
 # 8 unsigned bytes - message length in bytes (not including header)
 STRUCT = struct.Struct('!BQ')
 
+# With the 'multiplex' feature, the header uses a wider message id:
+# 4 unsigned bytes - message id
+# 8 unsigned bytes - message length in bytes (not including header)
+MULTIPLEX_STRUCT = struct.Struct('!IQ')
+
+# With the 'oob' feature, the message is prefixed by a buffer table:
+# 4 unsigned bytes - number of out-of-band buffers
+# 8 unsigned bytes (per buffer) - buffer length in bytes
+# and the raw buffers follow the message, outside its stated length
+N_BUFFERS_STRUCT = struct.Struct('!I')
+BUFFER_LEN_STRUCT = struct.Struct('!Q')
+
+# Protocol features this side supports, negotiated via the 'hello' command
+FEATURES = ['multiplex'] + (['oob'] if pickle.HIGHEST_PROTOCOL >= 5 else [])
+
+# Max number of buffers to pass to a single sendmsg() call, which is limited by the OS's IOV_MAX
+MAX_IOV = 64
+
+# With a 'compress:<codec>' or the 'shm' feature, each message starts with one flag byte for the
+# pickle data and one for each out-of-band buffer, saying how the corresponding data is encoded
+FLAG_RAW = 0
+FLAG_COMPRESSED = 1
+FLAG_SHARED = 2  # Data is a descriptor of a shared memory segment
+
+COMPRESS_THRESHOLD = 1024
+
+# With the 'shm' feature, out-of-band buffers at least this large are sent from the server to a
+# client on the same host through shared memory. In place of the buffer, the socket carries a
+# descriptor of the segment: its data length (8 unsigned bytes) followed by its name in ASCII.
+SHM_THRESHOLD = 1 << 16
+SHM_DESCRIPTOR_STRUCT = struct.Struct('!Q')
+
+# Max number of shared memory segments a server session uses. If all are leased to the client,
+# buffers are sent over the socket instead.
+SHM_MAX_SEGMENTS = 16
+
+Codec = namedtuple('Codec', 'compress decompress')
+
+#: Compression codecs available for remote sessions, by name
+CODECS = {
+    'zlib': Codec(lambda data: zlib.compress(data, 1), zlib.decompress),
+    'lzma': Codec(lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+
+def register_codec(name, compress, decompress):
+    """Make a compression codec available for remote sessions
+
+    `compress` and `decompress` must each take a bytes-like object and return bytes. To be used,
+    a codec must be registered on both the client and the server.
+    """
+    CODECS[name] = Codec(compress, decompress)
+
 
 class FakeLock(object):
     def __enter__(self):
@@ -50,83 +129,445 @@ class RemoteTimeoutError(RemoteError):
 class Messenger(object):
     """Low-level messenger used to send and receive discrete, numbered byte-level messages"""
     def __init__(self):
-        self.leftover = None
+        self.features = set()
+        self.header = STRUCT
+        self.n_ids = 256
+        self.codec = None
+        self.compress_threshold = COMPRESS_THRESHOLD
+        self.send_lock = threading.Lock()
+
+    def enable_features(self, features):
+        """Switch to using the given negotiated protocol features for all subsequent messages"""
+        self.features.update(features)
+        for feature in features:
+            if feature.startswith('compress:'):
+                self.codec = CODECS[feature[len('compress:'):]]
+        if 'multiplex' in self.features:
+            self.header = MULTIPLEX_STRUCT
+            self.n_ids = 1 << 32
+
+    def _send_message(self, message, id, buffers=()):
+        if 'oob' in self.features:
+            table = [N_BUFFERS_STRUCT.pack(len(buffers))]
+            table.extend(BUFFER_LEN_STRUCT.pack(len(buf)) for buf in buffers)
+            table = b''.join(table)
+            parts = [self.header.pack(id, len(table) + len(message)), table, message]
+            parts.extend(buffers)
+        else:
+            parts = [self.header.pack(id, len(message)), message]
 
-    def _send_message(self, message, id):
-        encoded = self.encode(message, id, len(message))
         try:
-            self.sock.sendall(encoded)
+            with self.send_lock:
+                self._send_parts(parts)
         except socket.timeout:
             raise RemoteTimeoutError("Timed out while sending message data")
         except Exception as e:
             raise RemoteError("Socket error while sending message data: {}".format(str(e)))
 
-    def _recv_message(self):
-        if self.leftover:
-            bytes_recd = len(self.leftover)
-            chunks = [self.leftover]
-        else:
-            bytes_recd = 0
-            chunks = []
+    def _send_parts(self, parts):
+        """Send a sequence of buffers without joining them, using scatter-gather I/O if possible"""
+        views = [memoryview(part).cast('B') for part in parts if len(part)]
+        if not hasattr(self.sock, 'sendmsg'):  # e.g. on Windows
+            for view in views:
+                self.sock.sendall(view)
+            return
+
+        while views:
+            n_sent = self.sock.sendmsg(views[:MAX_IOV])
+            while n_sent:
+                if n_sent >= len(views[0]):
+                    n_sent -= len(views.pop(0))
+                else:
+                    views[0] = views[0][n_sent:]
+                    n_sent = 0
+
+    def _recv_into(self, view, eof_ok=False):
+        """Fill the writable memoryview `view` with bytes from the socket
 
-        while bytes_recd < 9:
+        If `eof_ok` is True and the connection is closed before any bytes are received, returns
+        False instead of raising an error. Otherwise returns True.
+        """
+        n_recd = 0
+        while n_recd < len(view):
             try:
-                chunk = self.sock.recv(4096)
+                n = self.sock.recv_into(view[n_recd:])
             except socket.timeout:
                 raise RemoteTimeoutError("Timed out while waiting for message data")
             except Exception as e:
                 raise RemoteError("Socket error while waiting for message data: {}".format(str(e)))
-
-            chunks.append(chunk)
-            bytes_recd += len(chunk)
-            if not chunk:
-                if bytes_recd == 0:
-                    return None
+            if not n:
+                if eof_ok and n_recd == 0:
+                    return False
                 raise RuntimeError("Socket connection ended unexpectedly")
+            n_recd += n
+        return True
+
+    def _recv_message(self):
+        """Receive a message, returning None if the connection was closed
+
+        Returns a tuple ``(message, buffers, id)``, where ``buffers`` is the list of out-of-band
+        buffers that were sent with the message.
+
+        Reads exactly the bytes of one message, directly into buffers allocated once its size is
+        known, so nothing is joined or copied after being received.
+        """
+        header = bytearray(self.header.size)
+        if not self._recv_into(memoryview(header), eof_ok=True):
+            return None
+        id, length = self.header.unpack(header)
+
+        message = memoryview(bytearray(length))
+        self._recv_into(message)
+
+        buffers = []
+        if 'oob' in self.features:
+            n_buffers, = N_BUFFERS_STRUCT.unpack_from(message)
+            offset = N_BUFFERS_STRUCT.size
+            for _ in range(n_buffers):
+                buf_len, = BUFFER_LEN_STRUCT.unpack_from(message, offset)
+                offset += BUFFER_LEN_STRUCT.size
+                buf = bytearray(buf_len)
+                self._recv_into(memoryview(buf))
+                buffers.append(buf)
+            message = message[offset:]
+
+        return message, buffers, id
+
+
+class CompressionStats(object):
+    """Counts of the bytes a session has compressed and decompressed, and the CPU time it took"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        #: Bytes sent before and after compression
+        self.sent_raw = self.sent_compressed = 0
+        #: Bytes received before and after decompression
+        self.recd_compressed = self.recd_raw = 0
+        #: CPU time spent compressing and decompressing, in seconds
+        self.compress_time = self.decompress_time = 0.
+
+    @property
+    def ratio(self):
+        """Overall ratio of uncompressed to compressed size"""
+        compressed = self.sent_compressed + self.recd_compressed
+        return (self.sent_raw + self.recd_raw) / compressed if compressed else 1.
 
-        id, length = self.read_header(b''.join(chunks))
+    def __repr__(self):
+        return ('<CompressionStats: sent {} -> {} bytes in {:.3f}s, received {} -> {} bytes in '
+                '{:.3f}s, ratio {:.2f}>'.format(self.sent_raw, self.sent_compressed,
+                                                self.compress_time, self.recd_compressed,
+                                                self.recd_raw, self.decompress_time, self.ratio))
 
-        while bytes_recd < length+9:
-            try:
-                chunk = self.sock.recv(4096)
-            except socket.timeout:
-                raise RemoteTimeoutError("Timed out while waiting for message data")
-            except Exception as e:
-                raise RemoteError("Socket error while waiting for message data: {}".format(str(e)))
 
-            chunks.append(chunk)
-            bytes_recd += len(chunk)
-            if not chunk:
-                raise RuntimeError("Socket connection ended unexpectedly")
+class RequestStats(object):
+    """Totals for one kind of request handled by a server. Times are in seconds."""
+    FIELDS = ('count', 'errors', 'request_bytes', 'response_bytes', 'queue_time', 'lock_wait',
+              'max_lock_wait', 'handler_time', 'serialize_time')
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class ServerStats(object):
+    """Counts and timings of the requests a server has handled, by command and attribute name
+
+    Each kind of request is keyed by a tuple of its command and the name of the attribute or
+    method it concerns (or None), e.g. ``('callmethod', 'grab_image')``.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}  # key -> RequestStats
+
+    def record(self, key, request_bytes=0, response_bytes=0, queue_time=0., lock_wait=0.,
+               handler_time=0., serialize_time=0., error=False):
+        with self.lock:
+            stats = self.requests.get(key)
+            if stats is None:
+                stats = self.requests[key] = RequestStats()
+            stats.count += 1
+            stats.errors += bool(error)
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            stats.queue_time += queue_time
+            stats.lock_wait += lock_wait
+            stats.max_lock_wait = max(stats.max_lock_wait, lock_wait)
+            stats.handler_time += handler_time
+            stats.serialize_time += serialize_time
+
+    def snapshot(self, reset=False):
+        """Get the stats as a dict mapping each key to a dict of its totals"""
+        with self.lock:
+            snapshot = {key: stats.as_dict() for key, stats in self.requests.items()}
+            if reset:
+                self.requests.clear()
+        return snapshot
+
+    def clear(self):
+        with self.lock:
+            self.requests.clear()
+
+    def format(self):
+        """Format the stats as a table, with the requests taking the most time first"""
+        def total_time(item):
+            stats = item[1]
+            return stats['queue_time'] + stats['lock_wait'] + stats['handler_time']
+
+        lines = ['{:<32} {:>7} {:>6} {:>11} {:>11} {:>9} {:>9} {:>9} {:>9}'.format(
+            'request', 'count', 'errors', 'req bytes', 'resp bytes', 'queue ms', 'lock ms',
+            'handle ms', 'ser ms')]
+        for (command, name), stats in sorted(self.snapshot().items(), key=total_time,
+                                             reverse=True):
+            label = command if name is None else '{} {}'.format(command, name)
+            lines.append('{:<32} {:>7} {:>6} {:>11} {:>11} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}'
+                         .format(label[:32], stats['count'], stats['errors'],
+                                 stats['request_bytes'], stats['response_bytes'],
+                                 stats['queue_time']*1e3, stats['lock_wait']*1e3,
+                                 stats['handler_time']*1e3, stats['serialize_time']*1e3))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        with self.lock:
+            n_requests = sum(stats.count for stats in self.requests.values())
+            return '<ServerStats: {} requests of {} kinds>'.format(n_requests, len(self.requests))
+
+
+def _request_key(request):
+    """Key under which a request is counted in `ServerStats`"""
+    return request.get('command'), request.get('attr', request.get('name'))
+
+
+def _message_size(data, buffers):
+    return len(data) + sum(len(buf) for buf in buffers)
+
+
+class SharedMemoryPool(object):
+    """Shared memory segments a server session uses to pass buffers to a client on the same host
+
+    Each buffer is copied into a free segment, which is then leased to the client until it reports
+    that the buffer is no longer in use. Segments are reused, and grown as needed, up to
+    `max_segments`.
+    """
+    def __init__(self, max_segments=SHM_MAX_SEGMENTS):
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        self.free = []
+        self.leased = {}  # name -> SharedMemory
+
+    def share(self, buf):
+        """Copy `buf` into a leased segment and return its descriptor, or None if none is free"""
+        size = len(buf)
+        with self.lock:
+            fits = [segment for segment in self.free if segment.size >= size]
+            if fits:
+                segment = min(fits, key=lambda segment: segment.size)
+                self.free.remove(segment)
+            elif len(self.free) + len(self.leased) < self.max_segments:
+                segment = _create_shared_memory(size)
+            elif self.free:
+                # Replace the largest free segment with one that's big enough
+                old = max(self.free, key=lambda segment: segment.size)
+                self.free.remove(old)
+                _destroy_shared_memory(old)
+                segment = _create_shared_memory(size)
+            else:
+                return None
+            self.leased[segment.name] = segment
+
+        segment.buf[:size] = memoryview(buf).cast('B')
+        return SHM_DESCRIPTOR_STRUCT.pack(size) + segment.name.encode('ascii')
+
+    def release(self, names):
+        """End the leases of the named segments"""
+        with self.lock:
+            for name in names:
+                segment = self.leased.pop(name, None)
+                if segment is not None:
+                    self.free.append(segment)
+
+    def close(self):
+        with self.lock:
+            for segment in self.free + list(self.leased.values()):
+                _destroy_shared_memory(segment)
+            self.free = []
+            self.leased.clear()
+
+
+_created_segments = set()  # Names of segments created by this process
+
+
+def _create_shared_memory(size):
+    segment = shared_memory.SharedMemory(create=True, size=size)
+    _created_segments.add(segment.name)
+    return segment
+
+
+def _destroy_shared_memory(segment):
+    """Close and unlink a segment this process created. Clients that still map it are unaffected."""
+    _created_segments.discard(segment.name)
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
 
-        full_msg = b''.join(chunks)
-        chunks = [full_msg[9+length:]]
-        return full_msg[9:], id
+def _attach_shared_memory(name):
+    """Attach to an existing segment without taking responsibility for unlinking it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13, attaching registers the segment with the resource tracker, which
+        # would unlink it when this process exits
+        segment = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix' and name not in _created_segments:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
 
-    @staticmethod
-    def encode(message, id, length):
-        return STRUCT.pack(id, length) + message
 
-    @staticmethod
-    def decode(message):
-        id, length = STRUCT.unpack(message[:9])
-        return message[9:], id, length
+def _map_shared_memory(name):
+    """Map an existing segment, returning an mmap that stays valid for as long as it's referenced"""
+    segment = _attach_shared_memory(name)
+    # Take over the mapping, so it's unmapped once the last array using it is freed. Otherwise
+    # closing `segment` would fail while any such arrays exist.
+    mapping = segment._mmap
+    segment._buf.release()
+    segment._buf = segment._mmap = None
+    segment.close()
+    return mapping
 
-    @staticmethod
-    def read_header(message):
-        id, length = STRUCT.unpack(message[:9])
-        return id, length
+
+def _loads(data, buffers=()):
+    if buffers:
+        return pickle.loads(data, buffers=buffers)
+    return pickle.loads(data)
+
+
+def _is_local_connection(sock):
+    """Whether the peer of `sock` appears to be on this host"""
+    try:
+        local, peer = sock.getsockname()[0], sock.getpeername()[0]
+        return peer == local or ipaddress.ip_address(peer).is_loopback
+    except (socket.error, ValueError):
+        return False
 
 
 class Session(object):
     """High-level session"""
-    @staticmethod
-    def serialize(obj):
-        return pickle.dumps(obj)
-
-    @staticmethod
-    def deserialize(data):
-        return pickle.loads(data)
+    shm_pool = None  # SharedMemoryPool used to send buffers, with the 'shm' feature
+
+    def serialize(self, obj):
+        """Pickle `obj`, returning a tuple of its pickled bytes and a list of out-of-band buffers
+
+        With the 'oob' feature, the data of contiguous NumPy arrays (including the magnitudes of
+        array Quantities) is not copied into the pickle, but returned as separate buffers to be
+        sent as-is.
+        """
+        if 'oob' in self.messenger.features:
+            buffers = []
+            data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+            buffers = [buf.raw() for buf in buffers]
+        else:
+            data, buffers = pickle.dumps(obj), []
+
+        if self._has_flags():
+            data, buffers = self.encode_parts(data, buffers)
+        return data, buffers
+
+    def deserialize(self, data, buffers=()):
+        return _loads(*self.decode(data, buffers))
+
+    def decode(self, data, buffers=()):
+        """Undo any compression or sharing of a received message, returning its pickle and buffers"""
+        if self._has_flags():
+            return self.decode_parts(data, buffers)
+        return data, buffers
+
+    def _has_flags(self):
+        return self.messenger.codec is not None or 'shm' in self.messenger.features
+
+    @cached_property
+    def compression_stats(self):
+        """`CompressionStats` for this session"""
+        return CompressionStats()
+
+    def encode_parts(self, data, buffers):
+        """Prefix a flag byte for each part, compressing or sharing parts where worthwhile
+
+        Buffers large enough are passed through shared memory if this session has a
+        `shm_pool`. Otherwise, parts large enough are compressed if a codec is in use.
+        """
+        codec = self.messenger.codec
+        threshold = self.messenger.compress_threshold
+        start = time.thread_time()
+
+        flags = bytearray()
+        parts = []
+        raw_size = compressed_size = 0
+        for i, part in enumerate([data] + buffers):
+            flag = FLAG_RAW
+            if i > 0 and self.shm_pool is not None and len(part) >= SHM_THRESHOLD:
+                descriptor = self.shm_pool.share(part)
+                if descriptor is not None:
+                    flag, part = FLAG_SHARED, descriptor
+            if flag != FLAG_SHARED and codec:
+                raw_size += len(part)
+                if len(part) >= threshold:
+                    compressed = codec.compress(part)
+                    if len(compressed) < len(part):
+                        flag, part = FLAG_COMPRESSED, compressed
+                compressed_size += len(part)
+            flags.append(flag)
+            parts.append(part)
+
+        if codec:
+            stats = self.compression_stats
+            with stats.lock:
+                stats.sent_raw += raw_size
+                stats.sent_compressed += compressed_size
+                stats.compress_time += time.thread_time() - start
+        return bytes(flags) + parts[0], parts[1:]
+
+    def decode_parts(self, data, buffers):
+        """Undo `encode_parts()`"""
+        codec = self.messenger.codec
+        start = time.thread_time()
+
+        n_flags = 1 + len(buffers)
+        flags = bytes(data[:n_flags])
+        data = memoryview(data)[n_flags:]
+
+        parts = []
+        compressed_size = raw_size = 0
+        for i, (flag, part) in enumerate(zip(flags, [data] + list(buffers))):
+            if flag == FLAG_SHARED:
+                parts.append(self.attach_shared(part))
+                continue
+            compressed_size += len(part)
+            if flag == FLAG_COMPRESSED:
+                part = codec.decompress(part)
+                if i > 0:
+                    # Decompressed buffers must be writable, so NumPy arrays built from them are too
+                    part = bytearray(part)
+            raw_size += len(part)
+            parts.append(part)
+
+        if codec:
+            stats = self.compression_stats
+            with stats.lock:
+                stats.recd_compressed += compressed_size
+                stats.recd_raw += raw_size
+                stats.decompress_time += time.thread_time() - start
+        return parts[0], parts[1:]
+
+    def attach_shared(self, descriptor):
+        raise RemoteError("Received an unexpected shared memory buffer")
 
 
 class ClientMessenger(Messenger):
@@ -136,29 +577,181 @@ class ClientMessenger(Messenger):
         self.sock.settimeout(2.0)
         self.sock.connect((host, port))
         self.host = host
+        self.timeout = 2.0
         self.curr_id = 0
-
-    def make_request(self, request_bytes):
-        """Send request bytes to the server, and return its response bytes"""
-        id = self.curr_id
-        self.curr_id = (self.curr_id + 1) % 256
-        self._send_message(request_bytes, id)
-        response_bytes, resp_id = self._recv_message()
+        self.id_lock = threading.Lock()
+        self.request_lock = threading.Lock()
+        self.pending = {}  # id -> Future
+        self.pending_lock = threading.Lock()
+        self.streams = {}  # id -> callback for pushed messages
+        self.reader_thread = None
+        self.reader_error = None  # Why the reader thread stopped, once it has
+
+    def enable_features(self, features):
+        super(ClientMessenger, self).enable_features(features)
+        if 'multiplex' in self.features and self.reader_thread is None:
+            # Responses are now read by a dedicated thread, and request timeouts are handled by
+            # waiting on their futures
+            self.sock.settimeout(None)
+            self.reader_thread = threading.Thread(target=self._read_responses,
+                                                  name='instrumental-remote-{}'.format(self.host))
+            self.reader_thread.daemon = True
+            self.reader_thread.start()
+
+    def _next_id(self):
+        with self.id_lock:
+            id = self.curr_id
+            self.curr_id = (self.curr_id + 1) % self.n_ids
+        return id
+
+    def make_request(self, request_bytes, buffers=()):
+        """Send a request to the server, and return its response bytes and out-of-band buffers"""
+        if 'multiplex' in self.features:
+            future = self.submit_request(request_bytes, buffers)
+            try:
+                return future.result(self.timeout)
+            except FutureTimeoutError:
+                future.cancel()  # Stop waiting for the response
+                raise
+
+        with self.request_lock:
+            id = self._next_id()
+            self._send_message(request_bytes, id, buffers)
+            response = self._recv_message()
+        if response is None:
+            raise RemoteError("Server closed the connection")
+        response_bytes, response_buffers, resp_id = response
 
         if resp_id != id:
             raise RuntimeError("Message IDs do not match")
 
-        return response_bytes
+        return response_bytes, response_buffers
+
+    def submit_request(self, request_bytes, buffers=()):
+        """Send a request to the server without waiting for its response
+
+        Returns a `concurrent.futures.Future` whose result is a tuple of the response bytes and
+        out-of-band buffers. Cancel it to stop waiting for the response. Without the 'multiplex'
+        feature, this blocks until the response arrives.
+        """
+        future = Future()
+        if 'multiplex' not in self.features:
+            try:
+                future.set_result(self.make_request(request_bytes, buffers))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        id = self._next_id()
+        with self.pending_lock:
+            if self.reader_error is not None:
+                raise RemoteError("Connection is closed: {}".format(self.reader_error))
+            self.pending[id] = future
+        future.add_done_callback(lambda future: self._discard_pending(id))
+        try:
+            self._send_message(request_bytes, id, buffers)
+        except Exception:
+            future.cancel()
+            raise
+        return future
+
+    def _discard_pending(self, id):
+        with self.pending_lock:
+            self.pending.pop(id, None)
+
+    def _resolve(self, future, result=None, error=None):
+        """Set the result or exception of a pending future, unless it has been cancelled"""
+        if not future.set_running_or_notify_cancel():
+            return
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def _read_responses(self):
+        try:
+            while True:
+                response = self._recv_message()
+                if response is None:
+                    break
+                response_bytes, response_buffers, id = response
+                with self.pending_lock:
+                    future = self.pending.pop(id, None)
+                if future is not None:
+                    self._resolve(future, (response_bytes, response_buffers))
+                elif id in self.streams:
+                    self.streams[id](response_bytes, response_buffers)
+                else:
+                    # e.g. a message pushed to a stream that was just closed
+                    log.debug('Received message with unknown id %d', id)
+            error = RemoteError("Server closed the connection")
+        except Exception as e:
+            error = e
+
+        # Fail any requests that are still waiting, and any made from now on
+        with self.pending_lock:
+            self.reader_error = error
+            pending, self.pending = list(self.pending.values()), {}
+        for future in pending:
+            self._resolve(future, error=error)
+        for callback in list(self.streams.values()):
+            callback(None, error)
+
+    def open_stream(self, callback):
+        """Reserve a message id for messages pushed by the server
+
+        Each pushed message is passed to ``callback(message_bytes, buffers)``. If the connection
+        ends, ``callback(None, error)`` is called instead. Returns the stream's id.
+        """
+        if 'multiplex' not in self.features:
+            raise RemoteError("Server does not support streaming")
+        id = self._next_id()
+        self.streams[id] = callback
+        return id
+
+    def close_stream(self, id):
+        self.streams.pop(id, None)
 
     def close(self):
+        if self.reader_thread is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
         self.sock.close()
 
 
 class ClientSession(Session):
-    def __init__(self, host, port, server):
+    """Connection to an Instrumental server
+
+    Parameters
+    ----------
+    host : str
+        Hostname or IP address of the server
+    port : int
+        Port the server is listening on
+    server : str
+        Name of the server as given by the user, e.g. an alias from ``instrumental.conf``
+    compression : str or list of str, optional
+        Name(s) of codecs from `CODECS` to compress messages with, in order of preference. The
+        first one the server also supports is used. By default, messages are not compressed.
+    compress_threshold : int, optional
+        Size in bytes below which data is sent uncompressed. Also used by the server for its
+        responses.
+    shared_memory : bool, optional
+        Whether to receive large buffers through shared memory if the server is on the same host.
+        Arrays received this way reference the shared memory directly; the server reuses it once
+        they (and any views of them) have been garbage collected. Defaults to True.
+    """
+    def __init__(self, host, port, server, compression=None, compress_threshold=COMPRESS_THRESHOLD,
+                 shared_memory=True):
         self.host = host
         self.port = port
         self.server = server
+        self._shm_segments = {}  # name -> mmap of a shared memory segment
+        self._shm_leases = {}  # name -> number of buffers of the segment that are still in use
+        self._shm_released = deque()  # names of segments whose leases have ended
+        self._shm_lock = threading.Lock()
         try:
             self.messenger = ClientMessenger(host, port)
         except socket.timeout:
@@ -166,27 +759,165 @@ class ClientSession(Session):
         except Exception as e:
             raise RemoteError("Socket error while connecting to host: {}".format(str(e)))
 
+        if isinstance(compression, str):
+            compression = [compression]
+        for codec in compression or ():
+            if codec not in CODECS:
+                raise ValueError("Unknown compression codec '{}'".format(codec))
+        self.messenger.compress_threshold = compress_threshold
+        self._negotiate(['compress:' + codec for codec in compression or ()])
+        if shared_memory:
+            self._negotiate_shared_memory()
+
+    def _negotiate(self, extra_features=()):
+        """Agree with the server on which optional protocol features to use"""
+        try:
+            features = self.request(command='hello', features=FEATURES + list(extra_features),
+                                    compress_threshold=self.messenger.compress_threshold)
+        except RemoteError:
+            raise
+        except Exception:
+            log.info("Server doesn't support protocol negotiation, using basic protocol")
+            features = []
+        log.info('Using protocol features %s', features)
+        self.messenger.enable_features(features)
+
+    def _negotiate_shared_memory(self):
+        """Enable the 'shm' feature if the server can share memory with us
+
+        Looking at addresses isn't enough to know that the server is on this host (e.g. when
+        connecting through a tunnel), so we check by reading a segment the server creates.
+        """
+        features = self.messenger.features
+        if (shared_memory is None or not {'multiplex', 'oob'} <= features
+                or not _is_local_connection(self.messenger.sock)):
+            return
+
+        try:
+            name, token = self.request(command='shm_offer')
+            probe = _attach_shared_memory(name)
+            try:
+                matches = bytes(probe.buf[:len(token)]) == token
+            finally:
+                probe.close()
+        except Exception as e:
+            log.info('Not using shared memory: %s', e)
+            matches = False
+
+        self.request(command='shm_enable', accept=matches)
+        if matches:
+            log.info('Using shared memory')
+            self.messenger.enable_features(['shm'])
+
+    def attach_shared(self, descriptor):
+        """Get the buffer a descriptor refers to, leasing its segment until it's unused"""
+        length, = SHM_DESCRIPTOR_STRUCT.unpack_from(descriptor)
+        name = bytes(descriptor[SHM_DESCRIPTOR_STRUCT.size:]).decode('ascii')
+        with self._shm_lock:
+            mapping = self._shm_segments.get(name)
+            if mapping is None:
+                mapping = self._shm_segments[name] = _map_shared_memory(name)
+            self._shm_leases[name] = self._shm_leases.get(name, 0) + 1
+
+        # NumPy arrays unpickled from this keep it alive. Unlike a memoryview, it isn't bypassed in
+        # favor of the underlying mmap.
+        buf = np.frombuffer(mapping, dtype=np.uint8, count=length)
+
+        # This may be called during garbage collection, on any thread, so just note the release
+        # and send it along with the next request
+        weakref.finalize(buf, self._shm_released.append, name)
+        return buf
+
+    def _add_releases(self, message_dict):
+        """Tell the server which shared memory leases have ended, as part of a request
+
+        Segments without any remaining leases are forgotten, since the server may replace or
+        unlink them. Each is unmapped once no arrays reference it.
+        """
+        names = []
+        while True:
+            try:
+                names.append(self._shm_released.popleft())
+            except IndexError:
+                break
+        if names:
+            message_dict['release'] = names
+            with self._shm_lock:
+                for name in names:
+                    self._shm_leases[name] -= 1
+                    if not self._shm_leases[name]:
+                        del self._shm_leases[name]
+                        self._shm_segments.pop(name, None)
+
     def close(self):
         self.messenger.close()
+        with self._shm_lock:
+            self._shm_segments.clear()  # Each is unmapped once no arrays reference it
+            self._shm_leases.clear()
 
     def request(self, **message_dict):
         log.debug('Sending request %r', message_dict)
-        message = self.serialize(message_dict)
-        response = self.messenger.make_request(message)
-        response_obj = self.deserialize(response)
+        self._add_releases(message_dict)
+        message, buffers = self.serialize(message_dict)
+        try:
+            response, response_buffers = self.messenger.make_request(message, buffers)
+        except FutureTimeoutError:
+            raise RemoteTimeoutError("Timed out while waiting for response")
+        return self._handle_response(response, response_buffers)
+
+    def request_async(self, **message_dict):
+        """Send a request without waiting for its response
+
+        Returns a `concurrent.futures.Future` for the response object. Multiple requests may be
+        outstanding at once, including from different threads, and the server handles requests
+        concerning different instruments concurrently. Use `asyncio.wrap_future()` to await the
+        result from a coroutine.
+        """
+        log.debug('Sending request %r', message_dict)
+        self._add_releases(message_dict)
+        message, buffers = self.serialize(message_dict)
+        raw_future = self.messenger.submit_request(message, buffers)
+        future = Future()
+
+        def on_response(raw_future):
+            try:
+                future.set_result(self._handle_response(*raw_future.result()))
+            except Exception as e:
+                future.set_exception(e)
+
+        raw_future.add_done_callback(on_response)
+        return future
+
+    def _handle_response(self, response, response_buffers):
+        response_obj = self.deserialize(response, response_buffers)
         log.debug('Got response %r', response_obj)
         if isinstance(response_obj, Exception):
             raise response_obj
+        if isinstance(response_obj, RemoteObject):
+            response_obj._session = self
         return response_obj
 
+    def server_stats(self, reset=False):
+        """Get the server's request counts and timings, optionally resetting them afterward
+
+        Returns a dict mapping ``(command, name)`` keys to dicts of totals. See `ServerStats`.
+        """
+        return self.request(command='stats', reset=reset)
+
     def list_instruments(self):
         instr_list = self.request(command='list')
         for instr in instr_list:
             instr['server'] = self.server
         return instr_list
 
-    def instrument(self, params):
-        response = self.request(command='create', params=params)
+    def instrument(self, params, cached_attrs=()):
+        """Open an instrument on the server
+
+        The values of the attributes named in `cached_attrs`, along with those listed in the driver
+        class's ``_REMOTE_CACHED_ATTRS_``, are fetched once when the instrument is opened and then
+        served locally. Only use this for attributes whose values never change.
+        """
+        response = self.request(command='create', params=params, cached_attrs=list(cached_attrs))
         response._session = self
         return response
 
@@ -214,6 +945,261 @@ class ClientSession(Session):
             obj._session = self
         return obj
 
+    def get_obj_callmethod(self, obj_id, name, *args, **kwargs):
+        obj = self.request(command='callmethod', obj_id=obj_id, name=name, args=args,
+                           kwargs=kwargs)
+        if isinstance(obj, RemoteObject):
+            obj._session = self
+        return obj
+
+    def get_obj_callmethod_async(self, obj_id, name, *args, **kwargs):
+        return self.request_async(command='callmethod', obj_id=obj_id, name=name, args=args,
+                                  kwargs=kwargs)
+
+    def batch(self):
+        """Create a `Batch` of operations to run in a single request"""
+        return Batch(self)
+
+    def subscribe(self, obj, name, *args, trigger=None, trigger_args=(), trigger_kwargs=None,
+                  window=4, policy='drop_oldest', **kwargs):
+        """Have the server push a stream of values to us as they become available
+
+        The server repeatedly calls the method `name` of remote object `obj` (or reads it, if it
+        isn't callable) and pushes each result to the returned `Subscription`. If `trigger` is
+        given, it names a method that is called first and must return a true value before each
+        read, e.g. a camera's ``wait_for_frame``. The trigger should return promptly, so give it a
+        timeout via `trigger_kwargs`. Without a trigger, `name` should itself block until new data
+        is available, like a DAQ's ``read``.
+
+        For example, to stream live video::
+
+            >>> cam.start_live_video()
+            >>> with session.subscribe(cam, 'latest_frame', trigger='wait_for_frame',
+            ...                        trigger_kwargs={'timeout': '100ms'}) as frames:
+            ...     for frame in frames:
+            ...         process(frame)
+
+        Parameters
+        ----------
+        obj : RemoteObject
+            The remote instrument or object to read from
+        name : str
+            Name of the method or attribute to read
+        *args, **kwargs
+            Arguments to pass to the method
+        trigger : str, optional
+            Name of the method to call before each read
+        trigger_args : tuple, optional
+            Positional arguments to pass to the trigger method
+        trigger_kwargs : dict, optional
+            Keyword arguments to pass to the trigger method
+        window : int, optional
+            Max number of values that may be sent but not yet retrieved via `Subscription.get()`
+        policy : {'drop_oldest', 'block'}, optional
+            What to do when the window is full. With 'drop_oldest', the server keeps reading but
+            holds onto only the newest value, dropping older ones. With 'block', the server stops
+            reading until there's space in the window.
+        """
+        if policy not in ('drop_oldest', 'block'):
+            raise ValueError("policy must be 'drop_oldest' or 'block'")
+        subscription = Subscription(self)
+        try:
+            self.request(command='subscribe', obj_id=obj._obj_id, stream_id=subscription.id,
+                         name=name, args=args, kwargs=kwargs, trigger=trigger,
+                         trigger_args=trigger_args, trigger_kwargs=trigger_kwargs or {},
+                         window=window, policy=policy)
+        except Exception:
+            self.messenger.close_stream(subscription.id)
+            raise
+        return subscription
+
+
+class BatchRef(object):
+    """Reference to the result of an earlier operation in the same batch"""
+    def __init__(self, index):
+        self.index = index
+
+    def __repr__(self):
+        return '<BatchRef {}>'.format(self.index)
+
+
+class Batch(object):
+    """A list of operations on remote objects, sent to the server as a single request
+
+    Created via `ClientSession.batch()`. Call the batch on a remote object to get a proxy that
+    records each attribute access, assignment, item access, and call made through it. Each recorded
+    operation returns a proxy for its own result, which can be used in later operations, either as
+    their target or as an argument. The operations are run all at once upon leaving the ``with``
+    block (or calling `execute()`), after which you can index the batch with a result proxy to get
+    its value::
+
+        >>> with session.batch() as batch:
+        ...     bcam = batch(cam)
+        ...     bcam.exposure_time = '10 ms'
+        ...     bcam.start_capture()
+        ...     img = bcam.get_captured_image()
+        >>> batch[img]
+    """
+    def __init__(self, session):
+        self._session = session
+        self.ops = []
+        #: Results of all operations, in order, once the batch has been executed
+        self.results = None
+
+    def __call__(self, remote_obj):
+        return BatchProxy(self, remote_obj._obj_id, remote_obj.__dict__.get('_methods', ()))
+
+    def _add(self, **op):
+        if self.results is not None:
+            raise RemoteError("Batch has already been executed")
+        for name in ('args', 'kwargs', 'key', 'value'):
+            if name in op:
+                op[name] = _unwrap_batch_proxies(op[name])
+        self.ops.append(op)
+        return BatchProxy(self, BatchRef(len(self.ops) - 1), ())
+
+    def execute(self):
+        """Send the operations to the server, returning the list of their results"""
+        results = self._session.request(command='batch', ops=self.ops)
+        for result in results:
+            if isinstance(result, RemoteObject):
+                result._session = self._session
+        self.results = results
+        return results
+
+    def __getitem__(self, proxy):
+        if self.results is None:
+            raise RemoteError("Batch has not been executed yet")
+        return self.results[proxy._target.index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is None:
+            self.execute()
+
+
+class BatchProxy(object):
+    """Records operations on a remote object, or on the result of an earlier operation, in a Batch"""
+    def __init__(self, batch, target, methods):
+        self.__dict__.update(_batch=batch, _target=target, _methods=methods)
+
+    def __getattr__(self, name):
+        if name in self._methods:
+            return BatchMethod(self._batch, self._target, name)
+        return self._batch._add(op='attr', target=self._target, name=name)
+
+    def __setattr__(self, name, value):
+        self._batch._add(op='setattr', target=self._target, name=name, value=value)
+
+    def __getitem__(self, key):
+        return self._batch._add(op='item', target=self._target, key=key)
+
+    def __setitem__(self, key, value):
+        self._batch._add(op='setitem', target=self._target, key=key, value=value)
+
+    def __call__(self, *args, **kwargs):
+        return self._batch._add(op='call', target=self._target, args=args, kwargs=kwargs)
+
+
+class BatchMethod(object):
+    def __init__(self, batch, target, name):
+        self._batch = batch
+        self._target = target
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        return self._batch._add(op='callmethod', target=self._target, name=self._name, args=args,
+                                kwargs=kwargs)
+
+
+def _unwrap_batch_proxies(obj):
+    """Replace result proxies in `obj` (or in a tuple/list/dict `obj`) with BatchRefs"""
+    if isinstance(obj, BatchProxy):
+        if not isinstance(obj._target, BatchRef):
+            raise TypeError("Only results of batch operations may be used as arguments")
+        return obj._target
+    elif isinstance(obj, (tuple, list)):
+        return type(obj)(_unwrap_batch_proxies(item) for item in obj)
+    elif isinstance(obj, dict):
+        return {key: _unwrap_batch_proxies(value) for key, value in obj.items()}
+    return obj
+
+
+class Subscription(object):
+    """A stream of values pushed by the server. Created via `ClientSession.subscribe()`
+
+    Iterate over it, or call `get()`, to retrieve each value in turn.
+    """
+    def __init__(self, session):
+        self._session = session
+        self._queue = Queue()
+        self.closed = False
+        #: Number of values retrieved so far
+        self.n_received = 0
+        #: Number of values the server has dropped so far under the 'drop_oldest' policy
+        self.n_dropped = 0
+        self.id = session.messenger.open_stream(self._on_message)
+
+    def _on_message(self, message_bytes, buffers):
+        if message_bytes is None:
+            item = (buffers, self.n_dropped)  # Connection ended, `buffers` is the error
+        else:
+            try:
+                item = self._session.deserialize(message_bytes, buffers)
+            except Exception as e:
+                item = (e, self.n_dropped)
+        self._queue.put(item)
+
+    def get(self, timeout=None):
+        """Get the next value, waiting up to `timeout` seconds for it to arrive"""
+        if self.closed:
+            raise RemoteError("Subscription is closed")
+        try:
+            value, self.n_dropped = self._queue.get(timeout=timeout)
+        except Empty:
+            raise RemoteTimeoutError("Timed out while waiting for streamed data")
+
+        if isinstance(value, Exception):
+            self.close()
+            raise value
+        if self.closed:  # Closed while we were waiting
+            raise RemoteError("Subscription is closed")
+
+        self.n_received += 1
+        self._session.request_async(command='ack', stream_id=self.id, n=1)
+        if isinstance(value, RemoteObject):
+            value._session = self._session
+        return value
+
+    def __iter__(self):
+        while not self.closed:
+            try:
+                yield self.get()
+            except RemoteError:
+                if self.closed:
+                    return
+                raise
+
+    def close(self):
+        """Stop the stream"""
+        if self.closed:
+            return
+        self.closed = True
+        self._session.messenger.close_stream(self.id)
+        self._queue.put((None, self.n_dropped))  # Wake up any waiting get()
+        try:
+            self._session.request(command='unsubscribe', stream_id=self.id)
+        except RemoteError:
+            pass  # Connection is gone
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
 
 class ServerMessenger(Messenger):
     """Server-side session representing a connection to a client"""
@@ -223,20 +1209,30 @@ class ServerMessenger(Messenger):
         self.curr_id = None
 
     def listen(self):
-        """Listen for an incoming byte message. Returns None if connection was closed"""
+        """Listen for an incoming message
+
+        Returns a tuple of the message bytes and its out-of-band buffers, or None if the connection
+        was closed.
+        """
         full_msg = self._recv_message()
         if full_msg:
-            msg, id = full_msg
+            msg, buffers, id = full_msg
             self.curr_id = id
-            return msg
+            return msg, buffers
         return None
 
-    def respond(self, response_bytes):
-        """Respond (in bytes) to a message received via listen()"""
-        if self.curr_id is None:
+    def respond(self, response_bytes, buffers=(), id=None):
+        """Respond (in bytes) to a message received via listen()
+
+        By default, responds to the most recent message. Pass its `id` to respond to an earlier
+        one.
+        """
+        if id is None:
+            id = self.curr_id
+        if id is None:
             raise Exception("Invalid message id. respond() must be used to respond to a "
                             "message received via listen()")
-        self._send_message(response_bytes, self.curr_id)
+        self._send_message(response_bytes, id, buffers)
 
 
 class ObjectEntry(object):
@@ -248,23 +1244,161 @@ class ObjectEntry(object):
         self.share = share
 
 
+class Stream(object):
+    """Server-side state of a client's subscription to a stream of values"""
+    def __init__(self, session, id, entry, request):
+        self.session = session
+        self.id = id
+        self.entry = entry
+        self.request = request
+        self.window = request['window']
+        self.policy = request['policy']
+
+        self.active = True
+        self.in_flight = 0
+        self.held = None  # (value,) of the newest value waiting for space in the window
+        self.n_dropped = 0
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name='instrumental-stream-{}'.format(id))
+        self.thread.daemon = True
+
+    def run(self):
+        request = self.request
+        obj = self.entry.obj
+        try:
+            while self.active:
+                with self.entry.lock:
+                    if request['trigger']:
+                        trigger = getattr(obj, request['trigger'])
+                        if not trigger(*request['trigger_args'], **request['trigger_kwargs']):
+                            continue
+                    attr = getattr(obj, request['name'])
+                    if callable(attr):
+                        value = attr(*request['args'], **request['kwargs'])
+                    else:
+                        value = attr
+                self.offer(value)
+        except Exception as e:
+            log.exception(e)
+            self.active = False
+            self.send(e)
+
+    def offer(self, value):
+        """Send a new value if there's space in the window, otherwise block or hold onto it"""
+        with self.cond:
+            if self.policy == 'block':
+                while self.active and self.in_flight >= self.window:
+                    self.cond.wait()
+                if not self.active:
+                    return
+            elif self.in_flight >= self.window:
+                if self.held is not None:
+                    self.n_dropped += 1
+                self.held = (value,)
+                return
+            self.in_flight += 1
+        self.send(value)
+
+    def ack(self, n):
+        """Handle the client's retrieval of `n` values"""
+        with self.cond:
+            self.in_flight -= n
+            held, self.held = self.held, None
+            if held:
+                self.in_flight += 1
+            self.cond.notify_all()
+        if held:
+            self.send(held[0])
+
+    def send(self, value):
+        try:
+            self.session.push(self.id, (value, self.n_dropped), self.entry.lock)
+        except RemoteError:
+            self.stop()  # Connection is gone
+
+    def stop(self):
+        with self.cond:
+            self.active = False
+            self.cond.notify_all()
+
+
 class ServerSession(Session):
-    def __init__(self, socket, shared_obj_table, table_lock):
+    """Server-side session representing a connection to a client
+
+    Each instrument gets its own lock, which is held while handling any request that concerns it.
+    If a driver's library isn't thread-safe, its instrument class can set
+    ``_REMOTE_LIBRARY_LOCK_ = True`` so that all its instruments share a single lock instead.
+
+    With the 'multiplex' feature, requests are handled on `executor`, a pool of worker threads
+    shared by all of a server's sessions.
+
+    If the server has a `WorkerPool`, instruments are opened in its worker processes instead, and
+    requests concerning them are relayed to the worker over a session of our own.
+
+    Each request handled is counted in `stats`, which may be shared with other sessions.
+    """
+    def __init__(self, socket, shared_obj_table, table_lock, executor=None, workers=None,
+                 worker_index=0, stats=None, library_locks=None):
         self.command_handler = {
+            'hello': self.handle_hello,
             'create': self.handle_create,
             'list': self.handle_list,
             'attr': self.handle_attr,
             'setattr': self.handle_setattr,
             'item': self.handle_item,
             'setitem': self.handle_setitem,
-            'call': self.handle_call
+            'call': self.handle_call,
+            'callmethod': self.handle_callmethod,
+            'subscribe': self.handle_subscribe,
+            'unsubscribe': self.handle_unsubscribe,
+            'ack': self.handle_ack,
+            'batch': self.handle_batch,
+            'shm_offer': self.handle_shm_offer,
+            'shm_enable': self.handle_shm_enable,
+            'stats': self.handle_stats,
         }
         self.shared_obj_table = shared_obj_table
         self.shared_table_lock = table_lock
+        self.library_locks = {} if library_locks is None else library_locks  # module -> lock
 
         self.messenger = ServerMessenger(socket)
         self.obj_table = {}  # id -> ObjectEntry
 
+        # With the 'multiplex' feature, requests are run on a pool of worker threads. Requests
+        # sharing a lock are queued so they run in the order they were received.
+        self.executor = executor
+        self.own_executor = False
+        self.tasks = set()  # Futures of queues currently running on the executor
+        self.queues = {}  # lock -> deque of (request, id)
+        self.queues_lock = threading.Lock()
+        self.streams = {}  # stream id -> Stream
+        self.shm_probe = None
+
+        self.worker_index = worker_index
+        self.workers = workers
+        self.backends = {}  # worker index -> ClientSession connected to the worker
+        self.relayed_streams = {}  # stream id -> (worker index, worker's stream id)
+
+        self.stats = ServerStats() if stats is None else stats
+        self.timing = threading.local()  # Lock wait of the request being handled by each thread
+
+    def obj_id(self, obj):
+        """Id the client uses to refer to `obj`, which is unique among a server's worker processes
+
+        Objects hosted by a worker process have a ``(worker_index, id)`` tuple as their id.
+        """
+        if self.worker_index:
+            return (self.worker_index, id(obj))
+        return id(obj)
+
+    @contextlib.contextmanager
+    def locked(self, lock):
+        """Acquire `lock`, counting the time spent waiting for it toward the current request"""
+        start = time.perf_counter()
+        with lock:
+            self.timing.lock_wait = getattr(self.timing, 'lock_wait', 0.) + time.perf_counter() - start
+            yield
+
     def _get_shared_inst(self, params):
         """Get shared instrument if it exists, otherwise create it and add it to the table"""
         key = frozenset(params.items())
@@ -275,16 +1409,22 @@ class ServerSession(Session):
             except KeyError:
                 inst = self.shared_obj_table[key] = instrument(params)
                 inst._server_refcount = 0
+                inst._server_lock = self._new_inst_lock(inst)
             inst._server_refcount += 1
 
-            # Get or create module-level lock
-            module_name = inst.__class__.__module__
-            try:
-                lock = self.shared_obj_table[module_name]
-            except KeyError:
-                lock = self.shared_obj_table[module_name] = threading.RLock()
+        return inst, inst._server_lock
 
-        return inst, lock
+    def _new_inst_lock(self, inst):
+        """Create a lock for `inst`, or get its library's lock if the library isn't thread-safe"""
+        if not getattr(inst, '_REMOTE_LIBRARY_LOCK_', False):
+            return threading.RLock()
+
+        module_name = inst.__class__.__module__
+        with self.shared_table_lock:
+            lock = self.library_locks.get(module_name)
+            if lock is None:
+                lock = self.library_locks[module_name] = threading.RLock()
+            return lock
 
     def _close_shared_inst(self, entry):
         with entry.lock:
@@ -303,6 +1443,35 @@ class ServerSession(Session):
             for key in keys_to_remove:
                 del self.shared_obj_table[key]
 
+    def handle_hello(self, request):
+        # The accepted features are enabled once this response has been sent
+        accepted = [f for f in request['features'] if f in FEATURES]
+
+        # Use the client's most preferred codec that we also have
+        codecs = [f for f in request['features']
+                  if f.startswith('compress:') and f[len('compress:'):] in CODECS]
+        if codecs:
+            accepted.append(codecs[0])
+            self.messenger.compress_threshold = request.get('compress_threshold',
+                                                           COMPRESS_THRESHOLD)
+        return accepted, FAKE_LOCK
+
+    def handle_shm_offer(self, request):
+        # Have the client prove it's on this host by reading a random token from a new segment
+        if shared_memory is None or not _is_local_connection(self.messenger.sock):
+            raise RemoteError("Shared memory is not available")
+        token = os.urandom(16)
+        self.shm_probe = _create_shared_memory(len(token))
+        self.shm_probe.buf[:len(token)] = token
+        return (self.shm_probe.name, token), FAKE_LOCK
+
+    def handle_shm_enable(self, request):
+        # The 'shm' feature is enabled once this response has been sent
+        if self.shm_probe is not None:
+            _destroy_shared_memory(self.shm_probe)
+            self.shm_probe = None
+        return bool(request['accept']) and shared_memory is not None, FAKE_LOCK
+
     def handle_create(self, request):
         params = request['params']._dict.copy()
         params.pop('server')  # Needed to force instrument() to look locally
@@ -313,11 +1482,15 @@ class ServerSession(Session):
         else:
             # TODO: Add warning or error if instrument is already shared
             inst = instrument(params)
-            lock = FAKE_LOCK
-
-        obj_id = id(inst)
-        remote_obj = RemoteInstrument._create_remote(request['params'], obj_id, None, dir(inst),
-                                                     repr(inst))
+            lock = self._new_inst_lock(inst)
+
+        obj_id = self.obj_id(inst)
+        cached_attrs = getattr(inst, '_REMOTE_CACHED_ATTRS_', [])
+        cached_attrs = list(cached_attrs) + list(request.get('cached_attrs', []))
+        with self.locked(lock):
+            dirlist, reprname, methods, cached = remote_metadata(inst, cached_attrs)
+        remote_obj = RemoteInstrument._create_remote(request['params'], obj_id, None, dirlist,
+                                                     reprname, methods, cached)
         self.obj_table[obj_id] = ObjectEntry(inst, remote_obj, lock, share)
         return remote_obj, lock
 
@@ -328,35 +1501,295 @@ class ServerSession(Session):
     def handle_attr(self, request):
         obj_id = request['obj_id']
         entry = self.obj_table[obj_id]
-        with entry.lock:
+        with self.locked(entry.lock):
             return getattr(entry.obj, request['attr']), entry.lock
 
     def handle_setattr(self, request):
         obj_id = request['obj_id']
         entry = self.obj_table[obj_id]
-        with entry.lock:
+        with self.locked(entry.lock):
             setattr(entry.obj, request['attr'], request['value'])
         return None, FAKE_LOCK
 
     def handle_item(self, request):
         obj_id = request['obj_id']
         entry = self.obj_table[obj_id]
-        with entry.lock:
+        with self.locked(entry.lock):
             return entry.obj[request['key']], entry.lock
 
     def handle_setitem(self, request):
         obj_id = request['obj_id']
         entry = self.obj_table[obj_id]
-        with entry.lock:
+        with self.locked(entry.lock):
             entry.obj[request['key']] = request['value']
         return None, FAKE_LOCK
 
     def handle_call(self, request):
         obj_id = request['obj_id']
         entry = self.obj_table[obj_id]
-        with entry.lock:
+        with self.locked(entry.lock):
             return entry.obj(*request['args'], **request['kwargs']), entry.lock
 
+    def handle_callmethod(self, request):
+        obj_id = request['obj_id']
+        entry = self.obj_table[obj_id]
+        with self.locked(entry.lock):
+            method = getattr(entry.obj, request['name'])
+            return method(*request['args'], **request['kwargs']), entry.lock
+
+    def handle_request(self, request, id, received=None, size=0):
+        """Handle a single request and send the response
+
+        `received` is the `time.perf_counter()` time the request arrived and `size` its size in
+        bytes, which are counted in `stats`.
+        """
+        start = time.perf_counter()
+        key = _request_key(request)
+        command = request.pop('command')
+        self.timing.lock_wait = 0.
+
+        try:
+            handler = self.command_handler.get(command, self.handle_none)
+            response, lock = handler(request)
+        except Exception as e:
+            log.exception(e)
+            response = e
+            lock = FAKE_LOCK
+        handler_time = time.perf_counter() - start - self.timing.lock_wait
+
+        log.info('Sending response %r', response)
+
+        # Out-of-band buffers may reference the instrument's memory, so hold its lock until
+        # they've been sent
+        with self.locked(lock):
+            serialize_start = time.perf_counter()
+            data, buffers = self.serialize(response, lock)
+            serialize_time = time.perf_counter() - serialize_start
+            self.messenger.respond(data, buffers, id=id)
+
+        self.stats.record(key, request_bytes=size, response_bytes=_message_size(data, buffers),
+                          queue_time=start - received if received is not None else 0.,
+                          lock_wait=self.timing.lock_wait, handler_time=handler_time,
+                          serialize_time=serialize_time, error=isinstance(response, Exception))
+
+        if command == 'hello' and not isinstance(response, Exception):
+            self.messenger.enable_features(response)
+            if 'multiplex' in response and self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS)
+                self.own_executor = True
+        elif command == 'shm_enable' and response is True:
+            self.shm_pool = SharedMemoryPool()
+            self.messenger.enable_features(['shm'])
+
+    def handle_stats(self, request):
+        return self.stats.snapshot(reset=request.get('reset', False)), FAKE_LOCK
+
+    def dispatch_request(self, request, id, received=None, size=0):
+        """Queue a request to run on the worker pool, after earlier requests that share its lock"""
+        obj_id = request.get('obj_id')
+        if request.get('command') == 'batch':
+            # Order the batch with respect to requests on the first object it operates on
+            obj_ids = [op['target'] for op in request['ops']
+                       if not isinstance(op['target'], BatchRef)]
+            obj_id = obj_ids[0] if obj_ids else None
+        entry = self.obj_table.get(obj_id)
+        key = entry.lock if entry else None
+        with self.queues_lock:
+            queue = self.queues.get(key)
+            start = queue is None
+            if start:
+                queue = self.queues[key] = deque()
+            queue.append((request, id, received, size))
+        if start:
+            task = self.executor.submit(self._run_queue, key)
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    def _run_queue(self, key):
+        while True:
+            with self.queues_lock:
+                queue = self.queues[key]
+                if not queue:
+                    del self.queues[key]
+                    return
+                request, id, received, size = queue.popleft()
+            try:
+                self.handle_request(request, id, received, size)
+            except Exception:
+                log.exception('Failed to respond to request %r', request)
+
+    def handle_subscribe(self, request):
+        if 'multiplex' not in self.messenger.features:
+            raise RemoteError("Streaming requires the 'multiplex' protocol feature")
+        entry = self.obj_table[request['obj_id']]
+        stream = self.streams[request['stream_id']] = Stream(self, request['stream_id'], entry,
+                                                             request)
+        stream.thread.start()
+        return None, FAKE_LOCK
+
+    def handle_unsubscribe(self, request):
+        stream = self.streams.pop(request['stream_id'], None)
+        if stream:
+            stream.stop()
+        return None, FAKE_LOCK
+
+    def handle_ack(self, request):
+        stream = self.streams.get(request['stream_id'])
+        if stream:
+            stream.ack(request['n'])
+        return None, FAKE_LOCK
+
+    def handle_batch(self, request):
+        ops = request['ops']
+
+        # Find the lock for each op, which is that of the object its target derives from
+        op_locks = []
+        for op in ops:
+            target = op['target']
+            if isinstance(target, BatchRef):
+                op_locks.append(op_locks[target.index])
+            else:
+                op_locks.append(self.obj_table[target].lock)
+
+        # Hold all the locks for the whole batch, acquiring them in a consistent order to avoid
+        # deadlocking with other batches
+        locks = {id(lock): lock for lock in op_locks if lock is not FAKE_LOCK}
+        results = []
+        with contextlib.ExitStack() as stack:
+            for _, lock in sorted(locks.items()):
+                stack.enter_context(self.locked(lock))
+
+            def resolve(obj):
+                if isinstance(obj, BatchRef):
+                    return results[obj.index]
+                elif isinstance(obj, (tuple, list)):
+                    return type(obj)(resolve(item) for item in obj)
+                elif isinstance(obj, dict):
+                    return {key: resolve(value) for key, value in obj.items()}
+                return obj
+
+            for i, op in enumerate(ops):
+                try:
+                    results.append(self._run_batch_op(op, resolve))
+                except Exception:
+                    log.error('Operation %d of batch failed: %r', i, op)
+                    raise
+
+            # Send results that can't be pickled as RemoteObjects
+            for i, (result, lock) in enumerate(zip(results, op_locks)):
+                if self.obj_id(result) in self.obj_table:
+                    results[i] = self.obj_table[self.obj_id(result)].remote_obj
+                elif not _is_picklable(result):
+                    results[i] = self.new_remote_obj(result, lock)
+
+        return results, FAKE_LOCK
+
+    def _run_batch_op(self, op, resolve):
+        target = op['target']
+        obj = resolve(target) if isinstance(target, BatchRef) else self.obj_table[target].obj
+        kind = op['op']
+        if kind == 'attr':
+            return getattr(obj, op['name'])
+        elif kind == 'setattr':
+            setattr(obj, op['name'], resolve(op['value']))
+        elif kind == 'item':
+            return obj[resolve(op['key'])]
+        elif kind == 'setitem':
+            obj[resolve(op['key'])] = resolve(op['value'])
+        elif kind == 'call':
+            return obj(*resolve(op['args']), **resolve(op['kwargs']))
+        elif kind == 'callmethod':
+            return getattr(obj, op['name'])(*resolve(op['args']), **resolve(op['kwargs']))
+        else:
+            raise ValueError("Unknown batch operation '{}'".format(kind))
+
+    def relay_request(self, request, data, buffers, id, size=0):
+        """Relay a request to the worker process it concerns, if any
+
+        The request's pickle and buffers are passed on as-is unless it refers to a stream, whose
+        id differs between the two connections. Returns whether the request was relayed. Its
+        round trip to the worker is counted in `stats` as handler time.
+        """
+        command = request.get('command')
+        if command == 'create':
+            worker_index = self.workers.get(request['params']).index
+        elif command in ('ack', 'unsubscribe'):
+            if request['stream_id'] not in self.relayed_streams:
+                return False
+            worker_index, worker_stream_id = self.relayed_streams[request['stream_id']]
+        elif command == 'batch':
+            indexes = {_worker_index(op['target']) for op in request['ops']
+                       if not isinstance(op['target'], BatchRef)}
+            if len(indexes) > 1:
+                raise RemoteError("A batch can't operate on instruments in different worker "
+                                  "processes")
+            worker_index = indexes.pop() if indexes else 0
+        else:
+            worker_index = _worker_index(request.get('obj_id'))
+
+        if not worker_index:
+            return False
+
+        backend = self.backends.get(worker_index)
+        if backend is None:
+            port = self.workers.port(worker_index)
+            backend = self.backends[worker_index] = ClientSession(
+                '127.0.0.1', port, 'worker-{}'.format(worker_index), shared_memory=False)
+
+        if command == 'subscribe':
+            client_stream_id = request['stream_id']
+            callback = lambda data, buffers: self.relay_push(client_stream_id, data, buffers)
+            worker_stream_id = backend.messenger.open_stream(callback)
+            self.relayed_streams[client_stream_id] = (worker_index, worker_stream_id)
+        elif command == 'unsubscribe':
+            del self.relayed_streams[request['stream_id']]
+            backend.messenger.close_stream(worker_stream_id)
+        if command in ('subscribe', 'ack', 'unsubscribe'):
+            data, buffers = backend.serialize(dict(request, stream_id=worker_stream_id))
+
+        key = _request_key(request)
+        start = time.perf_counter()
+        future = backend.messenger.submit_request(data, buffers)
+        future.add_done_callback(
+            lambda future: self.relay_response(future, id, worker_index, key, start, size))
+        return True
+
+    def relay_response(self, future, id, worker_index, key, start, size):
+        try:
+            data, buffers = future.result()
+            error = False
+        except Exception as e:
+            log.error('Worker process %d failed: %s', worker_index, e)
+            error = RemoteError("Worker process for this instrument failed: {}".format(e))
+            data, buffers = pickle.dumps(error), []
+        self.stats.record(key, request_bytes=size, response_bytes=_message_size(data, buffers),
+                          handler_time=time.perf_counter() - start, error=error)
+        self.relay(id, data, buffers)
+
+    def relay_push(self, client_stream_id, data, buffers):
+        if data is None:
+            # Connection to the worker ended, and `buffers` is the error
+            error = RemoteError("Worker process for this instrument failed: {}".format(buffers))
+            data, buffers = pickle.dumps((error, 0)), []
+        self.relay(client_stream_id, data, buffers)
+
+    def relay(self, id, data, buffers):
+        """Send a pickle and buffers to our client, e.g. those of a worker's response"""
+        if buffers and 'oob' not in self.messenger.features:
+            # Client can't take out-of-band buffers, so we have to re-pickle
+            data, buffers = pickle.dumps(_loads(data, buffers)), []
+        if self._has_flags():
+            data, buffers = self.encode_parts(data, list(buffers))
+        try:
+            self.messenger.respond(data, buffers, id=id)
+        except socket.error:
+            pass  # Client is gone
+
+    def push(self, id, obj, lock):
+        """Send an unrequested message to the client, e.g. for a stream"""
+        with lock:
+            self.messenger.respond(*self.serialize(obj, lock), id=id)
+
     def handle_none(self, request):
         return Exception("Unknown command"), FAKE_LOCK
 
@@ -365,46 +1798,83 @@ class ServerSession(Session):
 
         # Use RemoteObject if obj has one
         try:
-            obj = self.obj_table[id(obj)].remote_obj
+            obj = self.obj_table[self.obj_id(obj)].remote_obj
         except KeyError:
             pass
 
         with lock:
             try:
-                bytes = parent_serialize(obj)
+                return parent_serialize(obj)
             except TypeError:
-                bytes = parent_serialize(self.new_remote_obj(obj, lock))
-        return bytes
+                return parent_serialize(self.new_remote_obj(obj, lock))
 
     def new_remote_obj(self, obj, lock):
         with lock:
-            obj_id = id(obj)
-            remote_obj = RemoteObject(obj_id, dir(obj), repr(obj))
-            shared = (lock is not FAKE_LOCK)
+            obj_id = self.obj_id(obj)
+            dirlist, reprname, methods, cached = remote_metadata(obj)
+            remote_obj = RemoteObject(obj_id, dirlist, reprname, methods=methods, cached=cached)
+            shared = any(entry.share for entry in self.obj_table.values() if entry.lock is lock)
             self.obj_table[obj_id] = ObjectEntry(obj, remote_obj, lock, shared)
             return remote_obj
 
     def handle_requests(self):
         while True:
-            message_bytes = self.messenger.listen()
-            if message_bytes is None:
+            message = self.messenger.listen()
+            if message is None:
                 log.info("Received EOF, closing connection.")
                 break
+            id = self.messenger.curr_id
+            received = time.perf_counter()
+            size = _message_size(*message)
 
-            request = self.deserialize(message_bytes)
+            data, buffers = self.decode(*message)
+            request = _loads(data, buffers)
             log.debug('Received request %r', request)
-            command = request.pop('command')
 
-            try:
-                handler = self.command_handler.get(command, self.handle_none)
-                response, lock = handler(request)
-            except Exception as e:
-                log.exception(e)
-                response = e
-                lock = FAKE_LOCK
-
-            log.info('Sending response %r', response)
-            self.messenger.respond(self.serialize(response, lock))
+            released = request.pop('release', None)
+            if released and self.shm_pool is not None:
+                self.shm_pool.release(released)
+
+            if self.workers is not None:
+                try:
+                    relayed = self.relay_request(request, data, buffers, id, size)
+                except Exception as e:
+                    log.exception(e)
+                    self.messenger.respond(*self.serialize(e, FAKE_LOCK), id=id)
+                    continue
+                if relayed:
+                    continue
+
+            # 'shm_enable' changes the protocol, so must finish before we read the next request
+            if 'multiplex' in self.messenger.features and request.get('command') != 'shm_enable':
+                self.dispatch_request(request, id, received, size)
+            else:
+                self.handle_request(request, id, received, size)
+
+        for stream in self.streams.values():
+            stream.stop()
+        for stream in self.streams.values():
+            stream.thread.join()
+        self.streams.clear()
+
+        wait_futures(list(self.tasks))
+        if self.own_executor:
+            self.executor.shutdown()
+
+        # Closing our sessions with the workers closes the instruments they opened for us
+        for worker_index, worker_stream_id in self.relayed_streams.values():
+            self.backends[worker_index].messenger.close_stream(worker_stream_id)
+        self.relayed_streams.clear()
+        for backend in self.backends.values():
+            backend.close()
+        self.backends.clear()
+
+        if self.messenger.codec:
+            log.info('Compression: %r', self.compression_stats)
+        if self.shm_probe is not None:
+            _destroy_shared_memory(self.shm_probe)
+        if self.shm_pool is not None:
+            self.shm_pool.close()
 
         # Clean up before we exit
         log.info('Cleaning up open objects')
@@ -421,28 +1891,238 @@ class ServerSession(Session):
         self.obj_table.clear()
 
 
+class WorkerProcess(object):
+    """A subprocess serving the instruments that an isolating server opens in it"""
+    def __init__(self, index):
+        self.index = index
+        context = multiprocessing.get_context('spawn')
+        conn, child_conn = context.Pipe(duplex=False)
+        self.process = context.Process(target=_run_worker, args=(index, child_conn),
+                                       name='instrumental-worker-{}'.format(index))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+
+        if not conn.poll(WORKER_START_TIMEOUT):
+            self.terminate()
+            raise RemoteError("Worker process failed to start")
+        self.port = conn.recv()
+        conn.close()
+
+    def is_alive(self):
+        return self.process.is_alive()
+
+    def terminate(self):
+        self.process.terminate()
+        self.process.join()
+
+
+def _worker_index(obj_id):
+    """Index of the worker process hosting the object with id `obj_id`, or 0 if none"""
+    return obj_id[0] if isinstance(obj_id, tuple) else 0
+
+
+def _run_worker(index, conn):
+    """Entry point of a worker process"""
+    server = ThreadedTCPServer(('127.0.0.1', 0), worker_index=index)
+    conn.send(server.server_address[1])
+    conn.close()
+    server.serve_forever()
+
+
+class WorkerPool(object):
+    """Worker processes of an isolating server, one per instrument or per driver module
+
+    A spare worker is kept started ahead of time, so opening an instrument doesn't have to wait
+    for a new process to start up.
+    """
+    def __init__(self, isolate):
+        if isolate not in ('instrument', 'module'):
+            raise ValueError("isolate must be 'instrument' or 'module'")
+        self.isolate = isolate
+        self.lock = threading.Lock()
+        self.workers = {}  # key -> WorkerProcess
+        self.by_index = {}  # index -> WorkerProcess
+        self.n_started = 0
+        self.starter = ThreadPoolExecutor(max_workers=1, thread_name_prefix='instrumental-starter')
+        self.spare = None  # Future of a WorkerProcess
+        self._start_spare()
+
+    def _start_spare(self):
+        self.n_started += 1
+        self.spare = self.starter.submit(WorkerProcess, self.n_started)
+
+    def key(self, params):
+        params = params._dict.copy()
+        params.pop('server', None)
+        params.pop('share', None)
+        if self.isolate == 'module' and 'module' in params:
+            return params['module']
+        return frozenset(params.items())
+
+    def get(self, params):
+        """Get the worker that hosts the instrument with the given params, starting it if needed"""
+        key = self.key(params)
+        with self.lock:
+            worker = self.workers.get(key)
+            if worker is None or not worker.is_alive():
+                if self.spare is None:
+                    self._start_spare()
+                spare, self.spare = self.spare, None
+                try:
+                    worker = spare.result()
+                finally:
+                    self._start_spare()
+                self.workers[key] = self.by_index[worker.index] = worker
+                log.info('Started worker process %d for %s', worker.index, key)
+            return worker
+
+    def port(self, index):
+        with self.lock:
+            worker = self.by_index.get(index)
+        if worker is None:
+            raise RemoteError("No worker process for this object")
+        return worker.port
+
+    def close(self):
+        with self.lock:
+            spare, self.spare = self.spare, None
+            workers = list(self.by_index.values())
+            self.workers.clear()
+            self.by_index.clear()
+        self.starter.shutdown()
+        if spare is not None and spare.exception() is None:
+            workers.append(spare.result())
+        for worker in workers:
+            worker.terminate()
+
+
 class ThreadedTCPRequestHandler(socketserver.BaseRequestHandler):
     def handle(self):
         log.info("Opening connection to client...")
-        session = ServerSession(self.request, self.server.shared_obj_table, self.server.table_lock)
+        session = ServerSession(self.request, self.server.shared_obj_table, self.server.table_lock,
+                                self.server.executor, self.server.workers,
+                                self.server.worker_index, self.server.stats,
+                                self.server.library_locks)
         session.handle_requests()
 
 
 class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    def __init__(self, server_address):
+    """Instrumental server
+
+    Each connection gets a thread that reads its requests. Requests from clients that support the
+    'multiplex' feature are handled on a pool of at most `max_workers` threads shared by all
+    connections.
+
+    With `isolate` set to ``'instrument'`` or ``'module'``, each instrument (or each driver module)
+    is hosted in its own worker process, and requests concerning it are relayed there. This lets
+    drivers' Python code run on separate cores, and means a crashing driver library only takes down
+    its own process.
+
+    Counts and timings of the requests handled by all connections are kept in `stats`. If
+    `stats_interval` is given, they're logged every `stats_interval` seconds.
+    """
+    def __init__(self, server_address, max_workers=DEFAULT_MAX_WORKERS, isolate=None,
+                 worker_index=0, stats_interval=None):
         socketserver.TCPServer.__init__(self, server_address, ThreadedTCPRequestHandler)
         self.shared_obj_table = {}
+        self.library_locks = {}  # Driver module name -> lock shared by all its instruments
         self.table_lock = threading.RLock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='instrumental-server')
+        self.workers = WorkerPool(isolate) if isolate else None
+        self.worker_index = worker_index  # Nonzero if this is a worker process's server
+
+        self.stats = ServerStats()
+        self.closed = threading.Event()
+        if stats_interval:
+            thread = threading.Thread(target=self._log_stats, args=(stats_interval,),
+                                      name='instrumental-stats')
+            thread.daemon = True
+            thread.start()
         log.info("Server started...")
 
+    def _log_stats(self, interval):
+        while not self.closed.wait(interval):
+            log.info('Request stats:\n%s', self.stats.format())
+
+    def server_close(self):
+        super(ThreadedTCPServer, self).server_close()
+        self.closed.set()
+        self.executor.shutdown(wait=False)
+        if self.workers is not None:
+            self.workers.close()
+
+
+def _is_picklable(obj):
+    """Check whether `obj` can be pickled, without copying any array data"""
+    try:
+        if pickle.HIGHEST_PROTOCOL >= 5:
+            pickle.dumps(obj, protocol=5, buffer_callback=lambda buf: None)
+        else:
+            pickle.dumps(obj)
+    except Exception:
+        return False
+    return True
+
+
+def remote_metadata(obj, cached_attrs=()):
+    """Get the info needed to create a RemoteObject for `obj`
+
+    Returns a tuple ``(dirlist, reprname, methods, cached)``. ``methods`` is the set of names of
+    methods defined by ``obj``'s class, found without evaluating any properties or Facets, and
+    ``cached`` is a dict of the values of the attributes named in `cached_attrs`.
+    """
+    methods = set()
+    for name in dir(type(obj)):
+        try:
+            attr = inspect.getattr_static(type(obj), name)
+        except AttributeError:
+            continue
+        if isinstance(attr, (staticmethod, classmethod)) or inspect.isroutine(attr):
+            methods.add(name)
+
+    cached = {}
+    for name in cached_attrs:
+        try:
+            cached[name] = getattr(obj, name)
+        except Exception as e:
+            log.warning("Couldn't cache attribute %r of %r: %s", name, obj, e)
+
+    return dir(obj), repr(obj), methods, cached
+
+
+class RemoteMethod(object):
+    """A method of a RemoteObject, called in a single round trip"""
+    def __init__(self, remote_obj, name):
+        self._remote_obj = remote_obj
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        obj = self._remote_obj
+        return obj._session.get_obj_callmethod(obj._obj_id, self._name, *args, **kwargs)
+
+    def call_async(self, *args, **kwargs):
+        """Call the method without waiting for its result, returning a `concurrent.futures.Future`
+
+        See `ClientSession.request_async()`.
+        """
+        obj = self._remote_obj
+        return obj._session.get_obj_callmethod_async(obj._obj_id, self._name, *args, **kwargs)
+
+    def __repr__(self):
+        return '<Remote method {} of {}>'.format(self._name, self._remote_obj._reprname[1:-1])
+
 
 class RemoteObject(object):
-    def __init__(self, id, dirlist, reprname, session=None):
+    def __init__(self, id, dirlist, reprname, session=None, methods=(), cached=None):
         self.__dict__['_local_attrs'] = set(('_local_attrs',))
         self._local_setattr('_obj_id', id)
         self._local_setattr('_reprname', "<Remote {}>".format(reprname))
         self._local_setattr('_session', session)
         self._local_setattr('_dirlist', dirlist)
+        self._local_setattr('_methods', frozenset(methods))
+        self._local_setattr('_cached', dict(cached or {}))
 
     def _local_setattr(self, name, value):
         self.__dict__[name] = value
@@ -462,6 +2142,12 @@ class RemoteObject(object):
         return self._reprname
 
     def __getattr__(self, name):
+        # Objects from older servers may lack the metadata entries
+        cached = self.__dict__.get('_cached', {})
+        if name in cached:
+            return cached[name]
+        if name in self.__dict__.get('_methods', ()):
+            return RemoteMethod(self, name)
         return self._session.get_obj_attr(self._obj_id, name)
 
     def __setattr__(self, name, value):
@@ -469,6 +2155,7 @@ class RemoteObject(object):
             self.__dict__[name] = value
         else:
             self._session.set_obj_attr(self._obj_id, name, value)
+            self.__dict__.get('_cached', {}).pop(name, None)
 
     def __getitem__(self, key):
         return self._session.get_obj_item(self._obj_id, key)
@@ -492,15 +2179,19 @@ class RemoteInstrument(RemoteObject, Instrument):
         return RemoteObject.__new__(RemoteInstrument)
 
     @classmethod
-    def _create_remote(cls, params, id, session, dirlist, reprname):
+    def _create_remote(cls, params, id, session, dirlist, reprname, methods=(), cached=None):
         log.info('Creating RemoteInstrument, session=%s', session)
-        obj = RemoteObject(id, dirlist, reprname, session)
+        obj = RemoteObject(id, dirlist, reprname, session, methods, cached)
         obj._local_setattr('_paramset', params)
         return obj
 
 
-def client_session(server):
-    """Get the session connected to `server`. Creates one if it doesn't exist yet."""
+def client_session(server, **kwds):
+    """Get the session connected to `server`. Creates one if it doesn't exist yet.
+
+    Any keyword arguments are passed to `ClientSession` if a new session is created, e.g. to enable
+    compression.
+    """
     if server in conf.servers:
         host = conf.servers[server]
     else:
@@ -515,7 +2206,7 @@ def client_session(server):
         port = DEFAULT_PORT
 
     if (host, port) not in client_session.sessions:
-        client_session.sessions[(host, port)] = ClientSession(host, port, server)
+        client_session.sessions[(host, port)] = ClientSession(host, port, server, **kwds)
     return client_session.sessions[(host, port)]
 client_session.sessions = {}
 
@@ -298,7 +298,11 @@ class CCS(Spectrometer):
     def _cdata_to_numpy(self, cdata, data_type=float, size=None):
         if size is None:
             size = self._NiceCCSLib.TLCCS_NUM_PIXELS*BYTES_PER_DOUBLE
-        buf = memoryview(ffi.buffer(ffi.addressof(cdata), size)[:])
+        if ffi.typeof(cdata).kind == 'array':
+            # The array owns its memory, and the buffer keeps it alive, so there's no need to copy
+            buf = ffi.buffer(cdata, size)
+        else:
+            buf = memoryview(ffi.buffer(ffi.addressof(cdata), size)[:])
         return np.frombuffer(buf, data_type)
 
     def _get_raw_scan_data(self):
@@ -3,6 +3,7 @@
 """
 Helpful utilities for writing drivers.
 """
+import re
 import copy
 import contextlib
 from inspect import getfullargspec
@@ -364,6 +365,135 @@ def visa_timeout_context(resource, timeout):
     resource.timeout = old_timeout
 
 
+def split_scpi_message(message):
+    """Split an SCPI message into its commands, resolving headers relative to the previous one
+
+    Returns a list of ``(path, node, args)`` tuples. ``path`` is the absolute subsystem path of the
+    command (e.g. ``'source1:freq'`` for ``':source1:freq:start 1kHz'``), or None for common
+    commands like ``'*CLS'``. Semicolons inside quoted strings are not treated as separators.
+    """
+    return [command[:3] for command in _split_scpi_commands(message)]
+
+
+def _split_scpi_commands(message):
+    """Like `split_scpi_message()`, with a fourth item telling whether the command was written with
+    a leading colon (or is relative to one that was)"""
+    commands = []
+    prev_path = ''
+    rooted = False
+    for command in re.split(r';(?=(?:[^"]*"[^"]*")*[^"]*$)', message):
+        command = command.strip()
+        if not command:
+            continue
+        header, _, args = command.partition(' ')
+        if header.startswith('*') or header.startswith(':*'):
+            commands.append((None, header.lstrip(':'), args.strip(), False))
+            continue
+
+        if header.startswith(':'):
+            path, _, node = header[1:].rpartition(':')
+            rooted = True
+        else:
+            rel_path, _, node = header.rpartition(':')
+            path = ':'.join(p for p in (prev_path, rel_path) if p)
+        commands.append((path, node, args.strip(), rooted))
+        prev_path = path
+    return commands
+
+
+def _scpi_setting_key(path, node, args):
+    """Key identifying what a setting overwrites
+
+    If the args are a list, the first one may select a channel or index (as in ``'DDEF 1,1'``),
+    so it is part of the key.
+    """
+    key = (path.lower(), node.lower())
+    if ',' in args:
+        key += (args.split(',', 1)[0].strip().lower(),)
+    return key
+
+
+def optimize_scpi_messages(messages, max_length=None):
+    """Reduce a sequence of SCPI write messages to as few, and as short, messages as possible
+
+    Settings (commands with arguments) that are overwritten by a later setting of the same header
+    are dropped, as long as no argument-less command (e.g. ``'*TRG'`` or ``'acquire:run'``) lies
+    between them. If a setting takes several arguments, the first one must match too, since it
+    often selects a channel. Adjacent commands in the same subsystem are merged using relative
+    headers, so ``':source1:freq:start 1kHz'`` followed by ``':source1:freq:stop 2kHz'`` becomes
+    ``':source1:freq:start 1kHz;stop 2kHz'``. Headers written without a leading colon never get
+    one, for instruments that only understand IEEE 488.2 headers.
+
+    Parameters
+    ----------
+    messages : list of str
+        Messages in the order they would have been written
+    max_length : int, optional
+        Max length of each output message, e.g. the size of the instrument's input buffer. Commands
+        are never split, so a single command longer than this gets its own message.
+
+    Returns
+    -------
+    optimized : list of str
+        Messages to write, in order
+    n_commands : int
+        Number of commands remaining after dropping overwritten settings
+    """
+    commands = []
+    for message in messages:
+        commands.extend(_split_scpi_commands(message))
+
+    # Walk backwards, dropping settings that a later one overwrites
+    kept = []
+    seen = set()
+    for path, node, args, rooted in reversed(commands):
+        if not args or node.endswith('?'):
+            seen.clear()  # Events may depend on earlier settings, so don't drop across them
+        elif path is not None:
+            key = _scpi_setting_key(path, node, args)
+            if key in seen:
+                continue
+            seen.add(key)
+        kept.append((path, node, args, rooted))
+    kept.reverse()
+
+    def format_command(path, node, args, rooted, relative):
+        if path is None or relative:
+            header = node
+        else:
+            header = (':' if rooted else '') + ':'.join(p for p in (path, node) if p)
+        return header + (' ' + args if args else '')
+
+    optimized = []
+    parts = []
+    length = 0
+    cur_path = None
+    msg_path = ''  # Path that unrooted headers in the current message are relative to
+    for path, node, args, rooted in kept:
+        relative = (parts and path is not None and cur_path is not None and
+                    path.lower() == cur_path.lower())
+        text = format_command(path, node, args, rooted, relative)
+
+        # An unrooted header would resolve against the current path, so it must start a message
+        misplaced = path is not None and not (rooted or relative) and msg_path
+        too_long = max_length is not None and length + 1 + len(text) > max_length
+        if parts and (misplaced or too_long):
+            # Start a new message, where relative headers are no longer valid
+            optimized.append(';'.join(parts))
+            parts, length, msg_path = [], 0, ''
+            text = format_command(path, node, args, rooted, relative=False)
+
+        length += len(text) + (1 if parts else 0)
+        parts.append(text)
+        cur_path = path
+        if path is not None:
+            msg_path = path
+
+    if parts:
+        optimized.append(';'.join(parts))
+    return optimized, len(kept)
+
+
 _ALLOWED_VISA_ATTRS = ['timeout', 'read_termination', 'write_termination', 'end_input', 'parity',
                        'baud_rate']
 
@@ -0,0 +1,596 @@
+# -*- coding: utf-8 -*-
+"""
+Simulated, in-process VISA resources for testing and benchmarking message-based drivers without
+any hardware attached.
+
+A `SimResource` mimics the parts of a pyvisa ``MessageBasedResource`` that Instrumental's drivers
+use (``write``, ``query``, ``read_raw``, ``visalib.read``, etc.). Its behavior is defined by a
+`SimDevice`, which maps SCPI-style headers to canned responses or to callables that generate them,
+remembers the values of any settings that are written, and can add an artificial latency to each
+message and a finite transfer rate to each read. The resource keeps track of how much (simulated)
+time was spent doing I/O, so `benchmark()` can tell how much of a driver call is Python overhead::
+
+    >>> from instrumental.drivers.visa_sim import open_sim_instrument, benchmark
+    >>> scope = open_sim_instrument('TDS_3000', latency=1e-3, record_length=10000)
+    >>> result = benchmark(lambda: scope.get_data(channel=1), scope.resource, n_calls=10)
+    >>> print(result.python_time / result.n_calls)
+"""
+import re
+import time
+import itertools
+import contextlib
+from collections import deque, namedtuple
+from importlib import import_module
+
+import numpy as np
+import pyvisa
+from pyvisa import constants
+from pyvisa.constants import InterfaceType, StatusCode
+from pyvisa.util import from_ieee_block
+
+from . import ParamSet, create_instrument
+from ..log import get_logger
+
+log = get_logger(__name__)
+
+__all__ = ['SimDevice', 'SimResource', 'ieee_block', 'open_sim_instrument', 'benchmark',
+           'DEVICES']
+
+_session_ids = itertools.count(1)
+
+BenchmarkResult = namedtuple('BenchmarkResult', ['n_calls', 'wall_time', 'io_time', 'python_time',
+                                                 'n_messages', 'bytes_written', 'bytes_read'])
+
+
+def ieee_block(payload, termination=b''):
+    """Wrap raw bytes in an IEEE 488.2 definite-length block header, i.e. ``#<n><len><payload>``"""
+    length = str(len(payload)).encode()
+    return b'#' + str(len(length)).encode() + length + bytes(payload) + termination
+
+
+def normalize_header(header):
+    """Lowercase a header and strip its leading colon, so lookups are case-insensitive"""
+    return header.lstrip(':').lower()
+
+
+class SimDevice(object):
+    """Definition of a simulated message-based device.
+
+    Parameters
+    ----------
+    idn : str
+        Response to ``*IDN?``
+    responses : dict, optional
+        Map from query headers (including the trailing '?') to responses. A response may be a str,
+        which gets the device's `termination` appended, bytes, which are sent as-is, or a callable
+        ``f(device, args)`` that returns either of these. Headers are matched case-insensitively,
+        without any leading colon.
+    state : dict, optional
+        Initial values of settable headers. Writing ``'header value'`` to the device stores
+        ``'value'``, and querying ``'header?'`` returns the stored value if there is no entry for it
+        in `responses`.
+    termination : str, optional
+        Termination the device appends to its text responses
+    latency : float, optional
+        Time in seconds that each message written to the device takes to be handled
+    latencies : dict, optional
+        Extra per-command latency in seconds, keyed by header. This is added to `latency` for each
+        command in a message that uses the header, e.g. to simulate a slow ``curve?``.
+    transfer_rate : float, optional
+        Bytes per second at which responses are read back. If None (the default), reads take no
+        time beyond `latency`.
+    header_pattern : str, optional
+        Regex used to split each command into a header and its arguments. The default splits on
+        the first run of whitespace after an SCPI-style header.
+    """
+    DEFAULT_HEADER_PATTERN = r'\s*(:?[\w:*]+\??)\s*(.*)'
+
+    def __init__(self, idn, responses=None, state=None, termination='\n', latency=0.,
+                 latencies=None, transfer_rate=None, header_pattern=None,
+                 interface_type=InterfaceType.tcpip):
+        self.idn = idn
+        self.responses = {normalize_header(k): v for k, v in (responses or {}).items()}
+        self.responses.setdefault('*idn?', idn)
+        self.state = {normalize_header(k): v for k, v in (state or {}).items()}
+        self.termination = termination
+        self.latency = latency
+        self.latencies = {normalize_header(k): v for k, v in (latencies or {}).items()}
+        self.transfer_rate = transfer_rate
+        self.header_re = re.compile(header_pattern or self.DEFAULT_HEADER_PATTERN, re.DOTALL)
+        self.interface_type = interface_type
+
+    def __repr__(self):
+        return "<SimDevice {!r}>".format(self.idn)
+
+    def split_command(self, command):
+        match = self.header_re.match(command)
+        if not match:
+            return None, command
+        header, args = match.groups()
+        return header, args.strip()
+
+    def handle(self, command):
+        """Handle a single command, returning a response (or None for a plain write)"""
+        header, args = self.split_command(command)
+        if header is None:
+            raise ValueError("Could not parse command {!r}".format(command))
+        key = normalize_header(header)
+
+        if not key.endswith('?'):
+            self.state[key] = args
+            return None
+
+        try:
+            response = self.responses[key]
+        except KeyError:
+            try:
+                response = self.state[key[:-1]]
+            except KeyError:
+                log.info("Simulated device has no response to %r", command)
+                raise pyvisa.VisaIOError(StatusCode.error_timeout)
+
+        if callable(response):
+            response = response(self, args)
+        return response
+
+    def command_latency(self, header):
+        return self.latencies.get(normalize_header(header), 0.)
+
+
+class SimVisaLibrary(object):
+    """Stand-in for a pyvisa ``VisaLibraryBase``, supporting only direct reads"""
+    def __init__(self, resource):
+        self.resource = resource
+
+    def read(self, session, count):
+        """Read up to `count` bytes, returning ``(data, status)`` like pyvisa's low-level read"""
+        return self.resource._read_bytes(count)
+
+
+class SimResource(object):
+    """In-process stand-in for a pyvisa message-based resource backed by a `SimDevice`
+
+    Besides the usual resource methods, it counts the messages and bytes passing through it and the
+    total time spent on simulated I/O, in `n_messages`, `bytes_written`, `bytes_read`, and
+    `io_time`. Use `reset_stats()` to zero them.
+    """
+    def __init__(self, device, resource_name=None):
+        self.device = device
+        self.session = next(_session_ids)
+        self.resource_name = resource_name or 'SIM{}::INSTR'.format(self.session)
+        self.visalib = SimVisaLibrary(self)
+        self.interface_type = device.interface_type
+        self.timeout = 2000
+        self.read_termination = None
+        self.write_termination = '\n'
+        self.end_input = constants.SerialTermination.termination_char
+        self._output = deque()  # Pending response messages
+        self.closed = False
+        self.reset_stats()
+
+    def __repr__(self):
+        return "<SimResource({!r})>".format(self.resource_name)
+
+    def reset_stats(self):
+        self.n_messages = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.io_time = 0.
+
+    def _sleep(self, duration):
+        if duration > 0:
+            time.sleep(duration)
+            self.io_time += duration
+
+    def _split_message(self, message):
+        """Split a message into its commands, resolving SCPI-relative headers"""
+        commands = []
+        prefix = ''
+        for command in message.split(';'):
+            command = command.strip()
+            if not command:
+                continue
+            header, _ = self.device.split_command(command)
+            if header and not header.startswith((':', '*')) and prefix and ':' not in header:
+                command = prefix + command  # Relative to the previous command's subsystem
+            elif header and ':' in header:
+                prefix = header.lstrip(':').rsplit(':', 1)[0] + ':'
+            commands.append(command)
+        return commands
+
+    def write(self, message, termination=None, encoding=None):
+        if self.closed:
+            raise pyvisa.InvalidSession()
+        self.n_messages += 1
+        term = self.write_termination if termination is None else termination
+        if term and message.endswith(term):
+            message = message[:-len(term)]
+        self.bytes_written += len(message) + len(term or '')
+
+        latency = self.device.latency
+        responses = []
+        for command in self._split_message(message):
+            header, _ = self.device.split_command(command)
+            latency += self.device.command_latency(header or '')
+            response = self.device.handle(command)
+            if response is not None:
+                responses.append(response)
+        self._sleep(latency)
+
+        if responses:
+            if all(isinstance(r, str) for r in responses):
+                self._output.append((';'.join(responses) + self.device.termination).encode())
+            else:
+                for response in responses:
+                    if isinstance(response, str):
+                        response = (response + self.device.termination).encode()
+                    self._output.append(bytes(response))
+        return len(message) + len(term or '')
+
+    def write_raw(self, message):
+        if isinstance(message, (bytes, bytearray)):
+            header, _, payload = bytes(message).partition(b' ')
+            self.n_messages += 1
+            self.bytes_written += len(message)
+            self.device.state[normalize_header(header.decode())] = payload
+            self._sleep(self.device.latency + self._transfer_time(len(message)))
+            return len(message)
+        return self.write(message)
+
+    def _transfer_time(self, n_bytes):
+        if self.device.transfer_rate:
+            return n_bytes / float(self.device.transfer_rate)
+        return 0.
+
+    def _read_bytes(self, count):
+        if not self._output:
+            raise pyvisa.VisaIOError(StatusCode.error_timeout)
+        head = self._output.popleft()
+        data, rest = head[:count], head[count:]
+        if rest:
+            self._output.appendleft(rest)
+        self.bytes_read += len(data)
+        self._sleep(self._transfer_time(len(data)))
+        status = StatusCode.success_max_count_read if rest else StatusCode.success
+        return bytes(data), status
+
+    def read_raw(self, size=None):
+        """Read the remainder of the next pending response message"""
+        if not self._output:
+            raise pyvisa.VisaIOError(StatusCode.error_timeout)
+        data, _ = self._read_bytes(len(self._output[0]))
+        return data
+
+    def read(self, termination=None, encoding=None):
+        message = self.read_raw().decode(encoding or 'ascii')
+        term = self.read_termination if termination is None else termination
+        if term and message.endswith(term):
+            message = message[:-len(term)]
+        return message
+
+    def query(self, message, delay=None):
+        self.write(message)
+        if delay:
+            time.sleep(delay)
+        return self.read()
+
+    def query_binary_values(self, message, datatype='f', is_big_endian=False, container=list,
+                            delay=None, header_fmt='ieee', expect_termination=True):
+        self.write(message)
+        if delay:
+            time.sleep(delay)
+        block = self.read_raw()
+        if expect_termination and self.read_termination:
+            block = block[:-len(self.read_termination)]
+        return from_ieee_block(block, datatype, is_big_endian, container)
+
+    def clear(self):
+        self._output.clear()
+
+    def close(self):
+        self.closed = True
+
+    def control_ren(self, mode):
+        pass
+
+    @contextlib.contextmanager
+    def ignore_warning(self, *warnings_constants):
+        yield
+
+
+def _idn_field(device, index):
+    return device.idn.split(',')[index]
+
+
+def _tek_curve(device, args):
+    width = int(device.state.get('data:width', '1'))
+    start = int(device.state.get('data:start', '1'))
+    stop = min(int(device.state.get('data:stop', device.record_length)), device.record_length)
+    n_points = max(0, stop - start + 1)
+    key = (width, n_points)
+    if key not in device.curve_cache:
+        t = np.arange(n_points)
+        y = (np.sin(2*np.pi*t/max(n_points, 1)) * 0.8 * 2**(8*width-1)).astype('>i{}'.format(width))
+        device.curve_cache[key] = ieee_block(y.tobytes(), device.termination.encode())
+    return device.curve_cache[key]
+
+
+def tek_scope(model='TDS 3032', record_length=10000, **kwds):
+    """Tektronix TDS/MSO/DPO oscilloscope, returning a sine wave from ``curve?``"""
+    wfm_params = {
+        'wfmpre:xincr': '4.0E-9',
+        'wfmpre:ymult': '4.0E-5',
+        'wfmpre:xzero': '0.0E0',
+        'wfmpre:yzero': '0.0E0',
+        'wfmpre:pt_off': '0',
+        'wfmpre:yoff': '0.0E0',
+        'wfmpre:xun': '"s"',
+        'wfmpre:yun': '"Volts"',
+        'wfmpre:nr_pt': str(record_length),
+        'wfmoutpre:recordlength': str(record_length),
+        'horizontal:recordlength': str(record_length),
+        'hor:main:scale': '1.0E-6',
+        'hor:delay:pos': '0.0E0',
+        'measu:statistics:mode': 'OFF',
+        'measurement:statistics:weighting': '32',
+        'header': 'OFF',
+    }
+
+    def wfmoutpre(device, args):
+        s = device.state
+        return ';'.join([s.get('data:width', '1'), str(8*int(s.get('data:width', '1'))),
+                         'BIN', 'RI', 'MSB', '"Ch1, DC coupling"', str(device.record_length), 'Y',
+                         s['wfmpre:xun'], s['wfmpre:xincr'], s['wfmpre:xzero'], s['wfmpre:pt_off'],
+                         s['wfmpre:yun'], s['wfmpre:ymult'], s['wfmpre:yoff'], s['wfmpre:yzero'],
+                         'BIN', str(device.record_length), '0'])
+
+    device = SimDevice('TEKTRONIX,{},0,CF:91.1CT FV:v1.00'.format(model),
+                       responses={'curve?': _tek_curve,
+                                  'wfmoutpre?': wfmoutpre,
+                                  'evmsg?': '0,"No events to report"',
+                                  '*esr?': '0'},
+                       state=wfm_params, **kwds)
+    device.record_length = record_length
+    device.curve_cache = {}
+    return device
+
+
+def tek_afg(model='AFG3102', **kwds):
+    """Tektronix AFG 3000 series function generator"""
+    def ememory(device, args):
+        payload = device.state.get('data', b'').partition(b',')[2]
+        return (payload or ieee_block(np.zeros(2, dtype='>u2').tobytes())) + b'\n'
+
+    state = {'source{}:{}'.format(ch, name): value
+             for ch in (1, 2)
+             for name, value in [('function:shape', 'SIN'), ('frequency:mode', 'CW'),
+                                 ('voltage:amplitude', '1.0'), ('voltage:offset', '0.0'),
+                                 ('voltage:high', '0.5'), ('voltage:low', '-0.5'),
+                                 ('frequency:fixed', '1.0E6'), ('phase:adjust', '0.0')]}
+    state.update({'output{}:state'.format(ch): '0' for ch in (1, 2)})
+    return SimDevice('TEKTRONIX,{},C000000,SCPI:99.0 FV:3.0.0'.format(model),
+                     responses={'data?': ememory}, state=state, **kwds)
+
+
+def _srs_trace(device, args):
+    n_points = int(args.split(',')[-1])
+    if n_points not in device.trace_cache:
+        t = np.arange(n_points)
+        device.trace_cache[n_points] = np.cos(2*np.pi*t/max(n_points, 1)).astype('<f4').tobytes()
+    return device.trace_cache[n_points]
+
+
+def _srs_snap(device, args):
+    return ','.join('{:.6e}'.format(1e-3*i) for i, _ in enumerate(args.split(','), 1))
+
+
+def srs_lockin(model='SR850', trace_length=1000, **kwds):
+    """Stanford Research Systems SR850/SR844 lock-in amplifier
+
+    ``TRCB?`` returns `trace_length` little-endian float32 points with no block header, as the real
+    instruments do.
+    """
+    device = SimDevice('Stanford_Research_Systems,{},s/n00001,ver1.000'.format(model),
+                       responses={'trcb?': _srs_trace,
+                                  'trca?': lambda dev, args: ','.join(
+                                      str(x) for x in np.frombuffer(_srs_trace(dev, args), '<f4')),
+                                  'spts?': str(trace_length),
+                                  'snap?': _srs_snap,
+                                  'outp?': '1.0e-3',
+                                  'outr?': '1.0e-3',
+                                  '*stb?': '1',
+                                  'lias?': '0'},
+                       state={'freq': '1000.0', 'phas': '0.0', 'slvl': '1.0', 'sens': '10',
+                              'oflt': '7', 'ofsl': '1', 'rmod': '1', 'isrc': '0', 'alrm': '1',
+                              'fmod': '0'},
+                       termination='\r' if model == 'SR850' else '\n', **kwds)
+    device.trace_cache = {}
+    return device
+
+
+def santec_tsl(model='TSL-570', n_points=1000, **kwds):
+    """Santec TSL-570 tunable laser, with wavelength and power logging data"""
+    def readout(dtype):
+        def respond(device, args):
+            key = (dtype, device.n_points)
+            if key not in device.data_cache:
+                data = np.linspace(1500e4, 1600e4, device.n_points).astype(dtype)
+                device.data_cache[key] = ieee_block(data.tobytes())
+            return device.data_cache[key]
+        return respond
+
+    state = {
+        'wavelength': '1550.000', 'wavelength:unit': '0', 'wavelength:fine': '0.00',
+        'frequency': '193.414', 'power:state': '0', 'power': '0.00', 'power:actual': '0.00',
+        'power:unit': '0', 'power:attenuation': '0.00', 'power:attenuation:auto': '1',
+        'power:shutter': '0', 'cohctrl': '0',
+        'wavelength:sweep:start': '1500.000', 'wavelength:sweep:stop': '1600.000',
+        'wavelength:sweep:mode': '1', 'wavelength:sweep:speed': '10',
+        'wavelength:sweep:state': '0', 'wavelength:sweep:count': '0',
+        'readout:points': str(n_points), 'syst:comm:cod': '0',
+    }
+    device = SimDevice('SANTEC,{},00000000,0000.0000.0000'.format(model),
+                       responses={'readout:data?': readout('<i4'),
+                                  'readout:data:power?': readout('<f4'),
+                                  '*opc?': '1'},
+                       state=state, termination='\r', **kwds)
+    device.n_points = n_points
+    device.data_cache = {}
+    return device
+
+
+def newport_1830c(**kwds):
+    """Newport 1830-C optical power meter, which uses header-only commands like ``'R3'``"""
+    return SimDevice('NEWPORT,1830-C,0,0',
+                     responses={'d?': '1.234E-3'},
+                     state={'u': '1', 'r': '0', 'w': '1550', 'a': '0', 'f': '2', 'g': '0',
+                            'z': '0', 'l': '0', 'q': '0'},
+                     header_pattern=r'\s*([A-Za-z*]+\??)\s*(.*)', **kwds)
+
+
+def rohde_schwarz_fsea(n_points=500, **kwds):
+    """Rohde & Schwarz FSEA 20 spectrum analyzer"""
+    def trace(device, args):
+        if device.n_points not in device.trace_cache:
+            data = -80 + 5*np.random.RandomState(0).rand(device.n_points)
+            device.trace_cache[device.n_points] = ','.join('{:.3f}'.format(x) for x in data)
+        return device.trace_cache[device.n_points]
+
+    device = SimDevice('Rohde&Schwarz,FSEA 20,0,1.00',
+                       responses={'trac?': trace},
+                       state={'freq:cent': '1.0E9', 'freq:span': '1.0E8', 'freq:star': '9.5E8',
+                              'freq:stop': '1.05E9', 'display:trace:y:rlevel': '0.0',
+                              'sweep:time': '0.05', 'band:vid': '1.0E5', 'band': '1.0E5',
+                              'aver:count': '1'},
+                       **kwds)
+    device.n_points = n_points
+    device.trace_cache = {}
+    return device
+
+
+def rigol_scope(model='DS1104Z', n_points=1200, **kwds):
+    """Rigol DS1000Z oscilloscope"""
+    def waveform(device, args):
+        if device.n_points not in device.wfm_cache:
+            t = np.arange(device.n_points)
+            data = (127 + 100*np.sin(2*np.pi*t/device.n_points)).astype('u1')
+            device.wfm_cache[device.n_points] = ieee_block(data.tobytes(), b'\n')
+        return device.wfm_cache[device.n_points]
+
+    device = SimDevice('RIGOL TECHNOLOGIES,{},DS1ZA000000000,00.04.04.SP3'.format(model),
+                       responses={'waveform:data?': waveform,
+                                  'measure:item?': '1.000000e+00',
+                                  'measure:statistic:item?': '1.000000e+00',
+                                  'function:wrecord:operate?': 'STOP'},
+                       state={'waveform:yincrement': '0.04', 'waveform:yreference': '127',
+                              'waveform:yorigin': '0', 'waveform:xincrement': '1e-09',
+                              'system:beeper': 'OFF'},
+                       **kwds)
+    device.n_points = n_points
+    device.wfm_cache = {}
+    return device
+
+
+def rigol_funcgen(model='DG812', **kwds):
+    """Rigol DG800 function generator"""
+    state = {}
+    for ch in (1, 2):
+        state.update({
+            'source{}:frequency'.format(ch): '1000.0',
+            'source{}:voltage:amplitude'.format(ch): '1.0',
+            'source{}:voltage:offset'.format(ch): '0.0',
+            'source{}:phase'.format(ch): '0.0',
+            'source{}:function'.format(ch): 'SIN',
+            'source{}:function:pulse:width'.format(ch): '0.0005',
+            'source{}:function:pulse:dcyc'.format(ch): '50',
+            'output{}:state'.format(ch): 'OFF',
+        })
+    return SimDevice('Rigol Technologies,{},DG8A000000000,00.01.14'.format(model), state=state,
+                     **kwds)
+
+
+def rigol_power_supply(model='DP711', **kwds):
+    """Rigol DP700 power supply"""
+    return SimDevice('RIGOL TECHNOLOGIES,{},DP7A000000000,00.01.05'.format(model),
+                     responses={'measure:voltage?': '5.000', 'measure:current?': '0.100'},
+                     state={'source:voltage:level:immediate:amplitude': '5.000',
+                            'source:current:level:immediate:amplitude': '1.000',
+                            'source:current:protection': '1.100',
+                            'source:current:protection:state': 'OFF',
+                            'output:state': 'OFF', 'system:beeper': 'OFF'},
+                     **kwds)
+
+
+# Map from driver classname to (driver module, device factory)
+DEVICES = {
+    'TDS_3000': ('scopes.tektronix', lambda **kw: tek_scope('TDS 3032', **kw)),
+    'MSO_DPO_2000': ('scopes.tektronix', lambda **kw: tek_scope('MSO2024', **kw)),
+    'MSO_DPO_4000': ('scopes.tektronix', lambda **kw: tek_scope('DPO4034', **kw)),
+    'AFG_3000': ('funcgenerators.tektronix', tek_afg),
+    'SR850': ('lockins.sr850', lambda **kw: srs_lockin('SR850', **kw)),
+    'SR844': ('lockins.sr844', lambda **kw: srs_lockin('SR844', **kw)),
+    'TSL570': ('lasers.santec', santec_tsl),
+    'Newport_1830_C': ('powermeters.newport', newport_1830c),
+    'FSEA20': ('spectrumanalyzers.rohde_schwarz', rohde_schwarz_fsea),
+    'DS1000Z': ('scopes.rigol', rigol_scope),
+    'DG800': ('funcgenerators.rigol', rigol_funcgen),
+    'DP700': ('powersupplies.rigol', rigol_power_supply),
+}
+
+
+def open_sim_instrument(classname, device=None, settings=None, **device_kwds):
+    """Open a driver's instrument class on top of a simulated resource
+
+    Parameters
+    ----------
+    classname : str
+        Name of the driver class, one of the keys of `DEVICES`
+    device : SimDevice, optional
+        Device to simulate. If omitted, one is created from the default profile for `classname`,
+        using `device_kwds` (e.g. ``latency`` or ``record_length``).
+    settings : dict, optional
+        Settings passed along to the instrument's ``_initialize()``
+    """
+    module_name, factory = DEVICES[classname]
+    if device is None:
+        device = factory(**device_kwds)
+    rsrc = SimResource(device)
+    params = ParamSet(visa_address=rsrc.resource_name, module=module_name, classname=classname)
+    if settings:
+        params['settings'] = settings
+    driver_module = import_module('.' + module_name, __package__)
+    return create_instrument(driver_module, classname, params, rsrc)
+
+
+def benchmark(func, resources, n_calls=10):
+    """Time `func` and split its wall time into simulated I/O and Python overhead
+
+    Parameters
+    ----------
+    func : callable
+        Zero-argument callable to time, e.g. ``lambda: scope.get_data()``
+    resources : SimResource or list of SimResource
+        The resource(s) whose I/O `func` uses
+    n_calls : int, optional
+        Number of times to call `func`
+
+    Returns
+    -------
+    result : BenchmarkResult
+        Totals over all calls. ``python_time`` is the wall time not accounted for by simulated I/O.
+    """
+    if isinstance(resources, SimResource):
+        resources = [resources]
+    for rsrc in resources:
+        rsrc.reset_stats()
+
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        func()
+    wall_time = time.perf_counter() - start
+
+    io_time = sum(r.io_time for r in resources)
+    return BenchmarkResult(n_calls, wall_time, io_time, wall_time - io_time,
+                           sum(r.n_messages for r in resources),
+                           sum(r.bytes_written for r in resources),
+                           sum(r.bytes_read for r in resources))
@@ -0,0 +1,459 @@
+import time
+import threading
+import numpy as np
+import pytest
+from instrumental.drivers.cameras import (Camera, Frame, AcquisitionEngine, FrameRecorder,
+                                         load_recording, HotPixelPlan, RunningMedian, RunningStats,
+                                         ROIIntegrator, SoftwareBinning, MaxHold, MinHold,
+                                         reduce_frames)
+from instrumental import Q_
+from instrumental.errors import Error, TimeoutError
+
+
+class SyntheticCamera(Camera):
+    """Camera whose live video produces frames filled with their sequence number"""
+    _INST_PARAMS_ = []
+    width = height = max_width = max_height = 8
+
+    def _initialize(self):
+        self.live = False
+        self.n_acquired = 0
+        self.buf = np.zeros((8, 8), dtype='uint16')
+        self.frames_left = None  # Simulate a stalled camera once this reaches zero
+        self.stalled_at = None  # Value of n_acquired when the camera last reported a stall
+        self.interval = 0.001
+
+    def start_capture(self, **kwds):
+        self._handle_kwds(kwds)
+        self.n_frames = kwds['n_frames']
+
+    def get_captured_image(self, timeout='1s', copy=True, out=None):
+        images = [np.full((8, 8), i, dtype='uint16') for i in range(self.n_frames)]
+        return self._images_result(images, out)
+
+    def grab_image(self, timeouts='1s', copy=True, out=None, **kwds):
+        self.start_capture(**kwds)
+        return self.get_captured_image(out=out)
+
+    def start_live_video(self, **kwds):
+        self._handle_kwds(kwds)
+        self.live = True
+
+    def stop_live_video(self):
+        self.live = False
+
+    def wait_for_frame(self, timeout=None):
+        if self.frames_left == 0:
+            self.stalled_at = self.n_acquired
+            time.sleep(0.01 if timeout is None else min(Q_(timeout).m_as('s'), 0.01))
+            return False
+        time.sleep(self.interval)
+        if self.frames_left is not None:
+            self.frames_left -= 1
+        self.buf[:] = self.n_acquired
+        self.n_acquired += 1
+        return True
+
+    def latest_frame(self, copy=True, out=None):
+        if out is not None:
+            return self._copy_to_out(out, self.buf)
+        return self.buf.copy() if copy else self.buf
+
+
+class ConfiguredCamera(SyntheticCamera):
+    """Camera that records the settings pushed to it and the queries of its max size"""
+    _SIZE_SETTINGS = ('binning',)
+
+    def _initialize(self):
+        super(ConfiguredCamera, self)._initialize()
+        self.pushed = []
+        self.n_size_queries = 0
+
+    @property
+    def max_width(self):
+        self.n_size_queries += 1
+        return 8
+
+    max_height = max_width
+
+    def start_capture(self, **kwds):
+        self._handle_kwds(kwds)
+        self._apply_setting(kwds, 'binning', self._push, 'binning', kwds['vbin'], kwds['hbin'])
+        self._apply_setting(kwds, 'exposure_time', self._push, 'exposure_time',
+                            kwds['exposure_time'])
+        self.n_frames = kwds['n_frames']
+
+    def _push(self, name, *args):
+        self.pushed.append(name)
+
+
+@pytest.fixture
+def cam():
+    cam = SyntheticCamera._create({})
+    cam._alias = None
+    return cam
+
+
+def stall_after(cam, n_frames):
+    """Let the camera acquire `n_frames` more frames, then wait until the stream has queued them"""
+    target = cam.n_acquired + n_frames
+    cam.frames_left = n_frames
+    wait_until(lambda: cam.stalled_at == target)
+
+
+def test_stream_leases_frames(cam):
+    cam.frames_left = 0
+    with cam.stream(n_buffers=2, timeout='10ms') as frames:
+        assert cam.live
+        stall_after(cam, 2)
+        first = next(frames)
+        second = next(frames)
+        assert isinstance(first, Frame)
+        assert (first.seq, second.seq) == (0, 1)
+        assert (first.array == 0).all() and (second.array == 1).all()
+        assert frames.n_leased == 2
+
+        # With both buffers leased, newer frames are dropped rather than overwriting them
+        stall_after(cam, 1)
+        with pytest.raises(TimeoutError):
+            next(frames)
+        first.release()
+        stall_after(cam, 1)
+        third = next(frames)
+        assert third.seq == 3 and (third.array == 3).all()
+        assert (second.array == 1).all()
+        assert frames.n_dropped == 1
+        assert frames.n_frames == 3
+
+        second.release()
+        second.release()  # No effect
+        assert frames.n_leased == 1
+    assert not cam.live
+    assert frames.closed
+
+
+def test_stream_drop_oldest(cam):
+    cam.frames_left = 0
+    with cam.stream(n_buffers=3, timeout='10ms') as frames:
+        # Frames 0 and 1 are evicted to make room for 3 and 4
+        stall_after(cam, 5)
+        first = next(frames)
+        assert first.seq == 2 and (first.array == 2).all()
+
+        # Frames 3 and 4 are still queued, so they are evicted by 5 and 6
+        stall_after(cam, 2)
+        rest = [next(frames), next(frames)]
+        assert [f.seq for f in rest] == [5, 6]
+        assert [f.array[0, 0] for f in [first] + rest] == [2, 5, 6]
+        assert frames.n_dropped == 2
+
+        with pytest.raises(TimeoutError):
+            next(frames)
+
+
+def test_stream_block_policy(cam):
+    frames = cam.stream(n_buffers=1, policy='block', timeout='2s')
+    frame = next(frames)
+    with pytest.raises(TimeoutError):
+        frames.next_frame(timeout=0.01)
+
+    threading.Timer(0.05, frame.release).start()
+    assert next(frames).seq == 1
+    assert frames.n_dropped == 0
+    frames.close()
+
+
+def test_stream_timeout(cam):
+    cam.frames_left = 2
+    frames = cam.stream(timeout='10ms')
+    assert [f.seq for f in (next(frames), next(frames))] == [0, 1]
+    with pytest.raises(TimeoutError):
+        next(frames)
+    frames.close()
+    with pytest.raises(StopIteration):
+        next(frames)
+
+
+def test_stream_bad_policy(cam):
+    with pytest.raises(ValueError):
+        cam.stream(policy='drop_newest')
+
+
+def test_out_arrays(cam):
+    image = np.empty((8, 8), dtype='uint16')
+    assert cam.grab_image(out=image) is image
+
+    stack = np.full((5, 8, 8), 99, dtype='float32')
+    images = cam.grab_image(n_frames=3, out=stack)
+    assert images.shape == (3, 8, 8) and np.shares_memory(images, stack)
+    assert [int(img[0, 0]) for img in stack] == [0, 1, 2, 99, 99]
+
+    with pytest.raises(ValueError):
+        cam.grab_image(n_frames=2, out=image)
+    with pytest.raises(ValueError):
+        cam.grab_image(out=np.empty((4, 4), dtype='uint16'))
+
+    cam.start_live_video()
+    cam.wait_for_frame()
+    assert cam.latest_frame(out=image) is image
+    assert (image == 0).all()
+
+
+def wait_until(condition, timeout=5.):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.005)
+
+
+def test_engine_callbacks(cam):
+    seqs = []
+    engine = AcquisitionEngine(cam, maxsize=4)
+    engine.on_frame(lambda frame: seqs.append((frame.seq, int(frame.array[0, 0]))))
+
+    with engine:
+        assert engine.dispatching
+        wait_until(lambda: len(seqs) >= 10)
+    assert not cam.live and not engine.running
+    assert all(seq == value for seq, value in seqs)
+    assert [s for s, _ in seqs] == sorted(s for s, _ in seqs)
+    assert engine.stats.delivered == len(seqs)
+    assert engine.stats.received >= len(seqs)
+    assert engine.stats.mean_latency <= engine.stats.max_latency
+    assert engine.stream is None
+
+
+@pytest.mark.parametrize('backpressure', ['drop_oldest', 'drop_newest'])
+def test_engine_drops(cam, backpressure):
+    with AcquisitionEngine(cam, maxsize=2, backpressure=backpressure) as engine:
+        wait_until(lambda: engine.stats.dropped >= 5)
+        assert engine.n_queued == 2
+        with engine.get(timeout=1) as first:
+            pass
+        with engine.get(timeout=1) as second:
+            pass
+        if backpressure == 'drop_newest':
+            assert (first.seq, second.seq) == (0, 1)
+        else:
+            assert 1 < first.seq < second.seq
+    assert engine.stats.max_queued == 2
+
+
+def test_engine_block(cam):
+    engine = AcquisitionEngine(cam, maxsize=2, backpressure='block', n_buffers=3)
+    engine.start()
+    wait_until(lambda: engine.stream.n_leased == 3)
+    time.sleep(0.05)
+    assert engine.stats.dropped == 0
+    assert [frame.seq for frame in (engine.get(), engine.get(), engine.get())] == [0, 1, 2]
+    with pytest.raises(Error):
+        engine.on_frame(print)
+    engine.stop()
+    with pytest.raises(Error):
+        engine.get()
+
+
+def test_engine_error(cam):
+    def fail(timeout=None):
+        raise RuntimeError('camera unplugged')
+    cam.wait_for_frame = fail
+
+    engine = AcquisitionEngine(cam)
+    engine.start()
+    with pytest.raises(RuntimeError):
+        list(engine)
+    with pytest.raises(RuntimeError):
+        engine.stop()
+
+
+@pytest.mark.parametrize('format', ['npy', 'chunked'])
+def test_recorder(cam, tmp_path, format):
+    path = str(tmp_path / ('rec.npy' if format == 'npy' else 'rec'))
+    recorder = FrameRecorder(path, n_frames=10, format=format, chunk_size=4, max_backlog=3)
+    with cam.stream(n_buffers=4, policy='block', exposure_time='5ms') as frames:
+        with recorder:
+            assert recorder.record(frames) == 10
+            assert recorder.full
+        assert frames.n_leased == 0
+    assert recorder.stats.written == 10 and recorder.stats.backlog == 0
+    assert recorder.stats.max_backlog <= 3
+    assert recorder.stats.bytes == 10 * 8 * 8 * 2
+
+    images, metadata = load_recording(path)
+    assert images.shape == (10, 8, 8) and images.dtype == np.uint16
+    assert list(images[:, 0, 0]) == list(range(10))
+    assert list(metadata['seq']) == list(range(10))
+    assert np.all(np.diff(metadata['timestamp']) >= 0)
+    assert np.allclose(metadata['exposure'], 0.005)
+
+
+def test_recorder_arrays(tmp_path):
+    path = str(tmp_path / 'rec.npy')
+    with FrameRecorder(path, n_frames=3) as recorder:
+        image = np.zeros((2, 3), dtype='float32')
+        for i in range(2):
+            image[:] = i
+            recorder.write(image)
+    with pytest.raises(Error):
+        recorder.write(image)
+
+    images, metadata = load_recording(path)
+    assert images[:, 0, 0].tolist() == [0, 1, 0]
+    assert metadata['seq'].tolist() == [0, 1, -1]
+    assert np.isnan(metadata['exposure'][0])
+
+
+def test_hot_pixel_plan():
+    img = np.arange(36, dtype='float64').reshape(6, 6)
+    plan = HotPixelPlan([[2, 2], [2, 3], [0, 0]], img.shape)
+    expected = img.copy()
+    expected[2, 2] = np.mean([7, 8, 9, 13, 19, 20, 21])  # Excludes the hot neighbor at (2, 3)
+    expected[2, 3] = np.mean([8, 9, 10, 16, 20, 21, 22])
+    expected[0, 0] = np.mean([1, 6, 7])
+    assert plan.apply(img) is img
+    assert np.allclose(img, expected)
+
+    # ROI and binning map sensor pixels into the image
+    plan = HotPixelPlan([[9, 9], [9, 8], [0, 0], [20, 20]], (4, 4), top=2, left=2, vbin=2, hbin=2)
+    assert list(zip(plan.ys, plan.xs)) == [(2, 2)]
+
+
+def test_running_median():
+    rng = np.random.RandomState(0)
+    images = rng.randint(0, 1000, size=(20, 3, 3)).astype('uint16')
+    exact = RunningMedian(base=32)
+    approx = RunningMedian(base=3)
+    for image in images:
+        exact.add(image)
+        approx.add(image)
+    assert np.array_equal(exact.result(), np.median(images, axis=0))
+    assert approx.result().shape == (3, 3)
+    assert len(approx.levels) == 3  # 20 = 2*9 + 0*3 + 2
+
+
+def test_hot_pixels(cam, tmp_path):
+    rng = np.random.RandomState(1)
+
+    def grab_image(out=None, **kwds):
+        img = rng.normal(100, 1, size=(8, 8)).astype('uint16')
+        img[3, 4] = 4000
+        img[rng.randint(8), rng.randint(8)] = 4000  # Transient, e.g. a cosmic ray
+        if out is None:
+            return img
+        out[:] = img
+        return out
+    cam.grab_image = grab_image
+
+    cam.find_hot_pixels(stddevs=5, stack_size=5)
+    assert cam._hot_pixels.tolist() == [[3, 4]]
+
+    path = str(tmp_path / 'hot.npz')
+    cam.save_hot_pixels(path)
+    cam._hot_pixels = None
+    cam.load_hot_pixels(path)
+    assert cam._hot_pixels.tolist() == [[3, 4]]
+
+    img = np.full((8, 8), 100, dtype='uint16')
+    img[3, 4] = 4000
+    corrected = cam._correct_hot_pixels(img)
+    assert corrected is not img and (corrected == 100).all() and img[3, 4] == 4000
+    corrected = cam._correct_hot_pixels(img, in_place=True)
+    assert corrected is img and (img == 100).all()
+
+    # Cropped and binned images use a different, cached plan
+    img = np.full((4, 4), 100, dtype='uint16')
+    img[1, 2] = 4000
+    kwds = dict(top=0, left=0, vbin=2, hbin=2)
+    cam._correct_hot_pixels(img, kwds)
+    plan = cam._hot_pixel_plan
+    cam._correct_hot_pixels(img, kwds, in_place=True)
+    assert cam._hot_pixel_plan is plan and (img == 100).all()
+
+    json_path = str(tmp_path / 'hot.json')
+    cam.save_hot_pixels(json_path)
+    cam.load_hot_pixels(json_path)
+    assert cam._hot_pixels.tolist() == [[3, 4]] and cam._hot_pixel_plan is None
+
+
+def test_running_stats():
+    rng = np.random.RandomState(2)
+    images = (1e6 + rng.normal(0, 3, size=(50, 4, 5))).astype('float32')
+    stats = RunningStats()
+    assert reduce_frames(images, stats) == 50
+    assert np.allclose(stats.mean, images.astype(float).mean(axis=0))
+    assert np.allclose(stats.variance(ddof=1), images.astype(float).var(axis=0, ddof=1))
+    with pytest.raises(ValueError):
+        stats.add(np.zeros((2, 2)))
+    stats.reset()
+    with pytest.raises(ValueError):
+        stats.mean
+
+
+@pytest.mark.parametrize('n_rois', [2, 12])
+def test_roi_integrator(n_rois):
+    rng = np.random.RandomState(3)
+    images = rng.randint(0, 100, size=(5, 10, 12)).astype('uint16')
+    rois = [(i % 5, i % 7, i % 5 + 3, i % 7 + 4) for i in range(n_rois)]
+    integrator = ROIIntegrator(rois, keep_history=True)
+    reduce_frames(images, integrator)
+    expected = [[img[t:b, l:r].sum() for t, l, b, r in rois] for img in images]
+    assert np.allclose(integrator.history, expected)
+    assert np.allclose(integrator.totals, np.sum(expected, axis=0))
+    with pytest.raises(ValueError):
+        ROIIntegrator([(0, 0, 11, 4)]).add(images[0])
+
+
+def test_binning_and_holds(cam):
+    stats, peak, low = RunningStats(), MaxHold(), MinHold()
+    binning = SoftwareBinning(3, 2, stages=[stats])
+    with cam.stream(n_buffers=2, policy='block') as frames:
+        assert reduce_frames(frames, [binning, peak, low], n_frames=4) == 4
+        assert frames.n_leased == 0
+    assert binning.latest.shape == (2, 4)
+    assert (binning.latest == 6 * 3).all()  # Frame 3, with 6 pixels per bin
+    assert (stats.mean == 6 * 1.5).all() and stats.count == 4
+    assert (peak.image == 3).all() and (low.image == 0).all()
+
+    binning.reset()
+    assert stats.count == 0
+
+
+def test_reductions_as_callbacks(cam):
+    stats = RunningStats()
+    engine = AcquisitionEngine(cam)
+    engine.on_frame(stats)
+    with engine:
+        wait_until(lambda: stats.count >= 5)
+    assert stats.mean.shape == (8, 8)
+
+
+def test_skip_unchanged_settings():
+    cam = ConfiguredCamera._create({})
+    cam.grab_image()
+    assert cam.pushed == ['binning', 'exposure_time']
+
+    cam.pushed = []
+    cam.grab_image()
+    n_queries = cam.n_size_queries
+    cam.grab_image()
+    assert cam.pushed == [] and cam.n_size_queries == n_queries
+
+    cam.grab_image(exposure_time=Q_('20ms'))
+    cam.grab_image(exposure_time=Q_('0.02s'))
+    assert cam.pushed == ['exposure_time']
+
+    cam.pushed = []
+    cam.grab_image(vbin=2)
+    cam.grab_image(vbin=2)
+    assert cam.pushed == ['binning', 'exposure_time']  # Back to the default exposure
+    assert cam.n_size_queries == n_queries + 2  # Re-queried after the binning changed
+
+    cam.pushed = []
+    cam.grab_image(vbin=2, force=True)
+    assert cam.pushed == ['binning', 'exposure_time']
+    assert cam.n_size_queries == n_queries + 4
+
+    cam.pushed = []
+    cam._forget_config('exposure_time')
+    cam.grab_image(vbin=2)
+    assert cam.pushed == ['exposure_time']
@@ -0,0 +1,47 @@
+import time
+import threading
+import pytest
+from instrumental.drivers import gather
+from instrumental.drivers.visa_sim import open_sim_instrument
+
+
+def test_gather_concurrent():
+    meters = [open_sim_instrument('Newport_1830_C') for _ in range(4)]
+    for i, pm in enumerate(meters):
+        pm.resource.device.state['w'] = str(i + 1)
+
+    results = gather(meters, 'query', 'W?')
+    assert results == ['1', '2', '3', '4']
+
+    # Every call must be running at once to get past the barrier
+    barrier = threading.Barrier(len(meters), timeout=5)
+
+    def query(pm, msg):
+        barrier.wait()
+        return pm.query(msg)
+
+    assert gather(meters, query, 'W?') == results
+
+
+def test_gather_shared_resource():
+    pm1 = open_sim_instrument('Newport_1830_C')
+    pm2 = open_sim_instrument('Newport_1830_C')
+    pm2._rsrc = pm1.resource
+    assert pm1.lock is pm2.lock
+
+    active = []
+
+    def check(pm):
+        active.append(pm)
+        time.sleep(5e-3)
+        n_active = len(active)
+        active.remove(pm)
+        return n_active
+
+    assert gather([pm1, pm2], check) == [1, 1]
+
+
+def test_gather_error():
+    meters = [open_sim_instrument('Newport_1830_C') for _ in range(2)]
+    with pytest.raises(ZeroDivisionError):
+        gather(meters, lambda pm: 1/0)
@@ -0,0 +1,481 @@
+import gc
+import os
+import contextlib
+import time
+import socket
+import threading
+import numpy as np
+import pytest
+from instrumental import Q_
+from instrumental.drivers import Instrument, ParamSet, remote
+
+SYNC = {}  # Barriers and events shared by the tests and the instruments of the in-process server
+
+
+class FakeCamera(Instrument):
+    _REMOTE_CACHED_ATTRS_ = ['model']
+    width = 640
+    model = 'FC-1'
+
+    def _initialize(self):
+        self._handle = threading.Lock()  # Unpicklable, like a real driver's library handle
+        self.last_frame = None
+        self.exposures = []
+
+    def grab_image(self, width=640, height=480):
+        return np.arange(width*height, dtype='uint16').reshape(height, width)
+
+    def get_trace(self, n):
+        return Q_(np.linspace(0, 1, n), 'V')
+
+    def expose(self, duration):
+        time.sleep(duration)
+        self.exposures.append(duration)
+        return duration
+
+    def wait_for_frame(self, timeout=None):
+        time.sleep(0.005)
+        self.n_frames = getattr(self, 'n_frames', 0) + 1
+        return True
+
+    def latest_frame(self):
+        return np.full((4, 4), self.n_frames)
+
+    def load_frame(self, frame):
+        self.last_frame = frame
+        return frame.sum()
+
+    def meet(self, name):
+        """Wait at the barrier ``SYNC[name]`` until every other party has arrived"""
+        SYNC[name].wait()
+        return name
+
+    def hold(self, name):
+        """Signal that this call has started, then block until the test releases it"""
+        SYNC[name + '.started'].set()
+        SYNC[name + '.release'].wait(5)
+
+    def getpid(self):
+        return os.getpid()
+
+    def crash(self):
+        os._exit(1)
+
+
+class OtherCamera(FakeCamera):
+    pass
+
+
+class LibCameraA(FakeCamera):
+    _REMOTE_LIBRARY_LOCK_ = True
+
+
+class LibCameraB(FakeCamera):
+    _REMOTE_LIBRARY_LOCK_ = True
+
+
+@pytest.fixture
+def server():
+    server = remote.ThreadedTCPServer(('127.0.0.1', 0))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield '127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def isolated_server():
+    server = remote.ThreadedTCPServer(('127.0.0.1', 0), isolate='instrument')
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield '127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session(server):
+    host, port = server.split(':')
+    session = remote.ClientSession(host, int(port), server)
+    yield session
+    session.close()
+
+
+def open_remote_camera(session):
+    return session.instrument(ParamSet(FakeCamera, server=session.server))
+
+
+def test_remote_basic(session):
+    cam = open_remote_camera(session)
+    assert cam.width == 640
+    img = cam.grab_image(width=32, height=16)
+    assert img.shape == (16, 32)
+    assert img[-1, -1] == 32*16 - 1
+
+
+def test_oob_buffers(session):
+    if 'oob' not in remote.FEATURES:
+        pytest.skip('pickle protocol 5 unavailable')
+    assert 'oob' in session.messenger.features
+
+    cam = open_remote_camera(session)
+    img = cam.grab_image(width=2048, height=2048)
+    assert img.flags.writeable
+    assert (img.ravel()[:10] == np.arange(10)).all()
+
+    trace = cam.get_trace(1000)
+    assert trace.units == Q_(1, 'V').units
+    assert trace.magnitude[-1] == 1.
+
+    frame = np.ones((100, 100), dtype='uint8')
+    assert cam.load_frame(frame) == 10000
+
+
+def test_shared_memory(session):
+    if remote.shared_memory is None or 'oob' not in remote.FEATURES:
+        pytest.skip('shared memory unavailable')
+    assert 'shm' in session.messenger.features
+
+    cam = open_remote_camera(session)
+    img = cam.grab_image(width=512, height=512)
+    assert (img.ravel() == np.arange(512*512, dtype='uint16')).all()
+    assert img.flags.writeable
+    assert len(session._shm_segments) == 1
+
+    # The lease ends once the array and its views are gone, and is released with the next request
+    view = img[10:20]
+    del img
+    gc.collect()
+    assert not session._shm_released
+    del view
+    gc.collect()
+    assert len(session._shm_released) == 1
+
+    assert cam.grab_image(width=4, height=4).shape == (4, 4)  # Small, so sent over the socket
+    assert not session._shm_released
+    assert not session._shm_segments  # Unused segments aren't kept mapped
+    img = cam.grab_image(width=512, height=512)
+    assert (img.ravel() == np.arange(512*512, dtype='uint16')).all()
+    assert len(session._shm_segments) == 1  # Released segment was reused
+
+
+def test_shared_memory_probe_failure(server, monkeypatch):
+    def fail(name):
+        raise FileNotFoundError(name)
+    monkeypatch.setattr(remote, '_attach_shared_memory', fail)
+    host, port = server.split(':')
+    session = remote.ClientSession(host, int(port), server)
+    try:
+        assert 'shm' not in session.messenger.features
+        cam = open_remote_camera(session)
+        assert cam.grab_image(width=512, height=512).shape == (512, 512)
+    finally:
+        session.close()
+
+
+def test_basic_protocol_fallback(server, monkeypatch):
+    monkeypatch.setattr(remote, 'FEATURES', [])
+    host, port = server.split(':')
+    session = remote.ClientSession(host, int(port), server)
+    assert session.messenger.features == set()
+    cam = open_remote_camera(session)
+    assert cam.grab_image(width=8, height=8).shape == (8, 8)
+    session.close()
+
+
+def test_callmethod_and_cache(session, monkeypatch):
+    cam = session.instrument(ParamSet(FakeCamera, server=session.server), cached_attrs=['width'])
+
+    requests = []
+    request = session.request
+    monkeypatch.setattr(session, 'request', lambda **msg: requests.append(msg) or request(**msg))
+
+    assert cam.model == 'FC-1'
+    assert cam.width == 640
+    assert requests == []
+
+    assert cam.grab_image(width=4, height=2).shape == (2, 4)
+    assert [r['command'] for r in requests] == ['callmethod']
+    assert 'grab_image' in dir(cam)
+
+
+def test_concurrent_requests(session):
+    assert 'multiplex' in session.messenger.features
+    cam1 = open_remote_camera(session)
+    cam2 = session.instrument(ParamSet(OtherCamera, server=session.server))
+
+    # Both calls must be in progress at once to get past the barrier
+    SYNC['concurrent'] = threading.Barrier(2, timeout=5)
+    futures = [cam1.meet.call_async('concurrent'), cam2.meet.call_async('concurrent')]
+    assert [f.result() for f in futures] == ['concurrent', 'concurrent']
+
+    # Requests on one instrument run in order, even when pipelined
+    futures = [cam1.expose.call_async(t) for t in (0.05, 0.04, 0.03, 0.02)]
+    for future in futures:
+        future.result()
+    assert cam1.exposures == [0.05, 0.04, 0.03, 0.02]
+
+    # The blocking API is safe to use from multiple threads
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cam1.grab_image(4, 4).sum()))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [120]*8
+
+
+def test_request_timeout_and_disconnect(session):
+    cam = open_remote_camera(session)
+    messenger = session.messenger
+    messenger.timeout = 0.05
+    SYNC['late.started'], SYNC['late.release'] = threading.Event(), threading.Event()
+    with pytest.raises(remote.RemoteTimeoutError):
+        cam.hold('late')
+    assert not messenger.pending
+    SYNC['late.release'].set()
+
+    messenger.timeout = 2.0
+    assert cam.expose(0) == 0  # The late response to the timed-out request is ignored
+    assert not messenger.pending
+
+    # Once the connection is gone, requests fail right away instead of timing out
+    messenger.sock.shutdown(socket.SHUT_RDWR)
+    messenger.reader_thread.join()
+    with pytest.raises(remote.RemoteError, match='closed'):
+        cam.expose(0)
+    assert not messenger.pending
+
+
+@pytest.mark.parametrize('policy', ['drop_oldest', 'block'])
+def test_subscribe(session, policy):
+    cam = open_remote_camera(session)
+    frames = session.subscribe(cam, 'latest_frame', trigger='wait_for_frame', window=2,
+                               policy=policy)
+    with frames:
+        numbers = []
+        for frame in frames:
+            assert frame.shape == (4, 4)
+            numbers.append(frame[0, 0])
+            time.sleep(0.02)  # Slower than the camera
+            if len(numbers) == 5:
+                break
+
+    assert numbers == sorted(numbers)
+    if policy == 'block':
+        assert numbers == [1, 2, 3, 4, 5]
+        assert frames.n_dropped == 0
+    else:
+        assert frames.n_dropped > 0
+    assert frames.n_received == 5
+    assert frames.closed
+    assert cam.grab_image(4, 4).shape == (4, 4)  # Session still works
+
+
+@pytest.mark.parametrize('codec', ['zlib', 'lzma'])
+def test_compression(server, codec):
+    host, port = server.split(':')
+    session = remote.ClientSession(host, int(port), server, compression=codec,
+                                   shared_memory=False)
+    try:
+        assert session.messenger.codec is remote.CODECS[codec]
+
+        cam = open_remote_camera(session)
+        img = cam.grab_image(width=512, height=512)
+        assert (img.ravel() == np.arange(512*512, dtype='uint16')).all()
+        assert img.flags.writeable
+
+        frame = np.zeros((256, 256), dtype='uint8')
+        assert cam.load_frame(frame) == 0
+
+        stats = session.compression_stats
+        assert stats.recd_raw > 512*512*2 > stats.recd_compressed
+        assert stats.sent_raw > 256*256 > 10*stats.sent_compressed
+    finally:
+        session.close()
+
+
+def meet_concurrently(session, name, cls1, cls2, timeout, **params):
+    """Call `meet()` on instruments of `cls1` and `cls2` at once, returning their futures"""
+    cam1 = session.instrument(ParamSet(cls1, server=session.server, **params))
+    cam2 = session.instrument(ParamSet(cls2, server=session.server, **params))
+    SYNC[name] = threading.Barrier(2, timeout=timeout)
+    return [cam1.meet.call_async(name), cam2.meet.call_async(name)]
+
+
+def test_instrument_locks(session):
+    # Shared instruments from the same driver module no longer block each other
+    futures = meet_concurrently(session, 'shared', FakeCamera, OtherCamera, 5, share=True)
+    assert [f.result() for f in futures] == ['shared', 'shared']
+
+    # Unless their library isn't thread-safe, so the second call can't start until the first
+    # gives up waiting at the barrier
+    futures = meet_concurrently(session, 'library', LibCameraA, LibCameraB, 0.2)
+    for future in futures:
+        with pytest.raises(threading.BrokenBarrierError):
+            future.result()
+
+
+def test_library_locks_kept_apart():
+    a, b = socket.socketpair()
+    table, locks = {}, {}
+    try:
+        session = remote.ServerSession(a, table, threading.RLock(), library_locks=locks)
+        lock = session._new_inst_lock(LibCameraA._create({}))
+        assert session._new_inst_lock(LibCameraB._create({})) is lock
+        assert locks == {__name__: lock} and table == {}
+    finally:
+        a.close()
+        b.close()
+
+
+def test_batch(session, monkeypatch):
+    cam = open_remote_camera(session)
+
+    requests = []
+    request = session.request
+    monkeypatch.setattr(session, 'request', lambda **msg: requests.append(msg) or request(**msg))
+
+    with session.batch() as batch:
+        bcam = batch(cam)
+        bcam.width = 8
+        width = bcam.width
+        img = bcam.grab_image(width=width, height=2)
+        total = bcam.load_frame(img)
+        handle = bcam._handle
+
+    assert len(requests) == 1
+    assert batch[width] == 8
+    assert batch[img].shape == (2, 8)
+    assert batch[total] == batch[img].sum()
+    assert isinstance(batch[handle], remote.RemoteObject)
+    assert batch.results[0] is None
+
+
+class PairMessenger(remote.Messenger):
+    def __init__(self, sock):
+        super(PairMessenger, self).__init__()
+        self.sock = sock
+
+
+def test_recv_message_framing():
+    a, b = socket.socketpair()
+    sender, receiver = PairMessenger(a), PairMessenger(b)
+    payloads = [b'', b'x', bytes(range(256)) * 1000, b'abc']
+
+    # Send everything at once, so messages arrive back to back in the socket buffer
+    thread = threading.Thread(target=lambda: [sender._send_message(p, i)
+                                              for i, p in enumerate(payloads)])
+    thread.start()
+    for i, payload in enumerate(payloads):
+        message, buffers, id = receiver._recv_message()
+        assert (bytes(message), buffers, id) == (payload, [], i)
+    thread.join()
+
+    a.close()
+    assert receiver._recv_message() is None
+    b.close()
+
+
+def wait_until(condition, timeout=5.):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.005)
+
+
+def watch_server(monkeypatch):
+    """Record the names of requests the in-process server queues, and whether any request has had
+    to wait for an instrument lock that was held"""
+    queued, contended = [], threading.Event()
+    dispatch_request, locked = remote.ServerSession.dispatch_request, remote.ServerSession.locked
+
+    def watched_dispatch_request(self, request, *args, **kwds):
+        dispatch_request(self, request, *args, **kwds)
+        queued.append(request.get('name'))
+
+    @contextlib.contextmanager
+    def watched_locked(self, lock):
+        if lock is not remote.FAKE_LOCK:
+            if lock.acquire(False):
+                lock.release()
+            else:
+                contended.set()
+        with locked(self, lock):
+            yield
+
+    monkeypatch.setattr(remote.ServerSession, 'dispatch_request', watched_dispatch_request)
+    monkeypatch.setattr(remote.ServerSession, 'locked', watched_locked)
+    return queued, contended
+
+
+def test_server_stats(server, session, monkeypatch):
+    queued, contended = watch_server(monkeypatch)
+    host, port = server.split(':')
+    other_session = remote.ClientSession(host, int(port), server)
+    try:
+        params = dict(server=server, share=True)
+        cam = session.instrument(ParamSet(FakeCamera, **params))
+        other_cam = other_session.instrument(ParamSet(FakeCamera, **params))
+        session.server_stats(reset=True)
+
+        # Queue a request behind one that holds the instrument, and have another session wait for
+        # its lock, before letting the first one finish
+        SYNC['stats.started'], SYNC['stats.release'] = threading.Event(), threading.Event()
+        futures = [cam.hold.call_async('stats')]
+        assert SYNC['stats.started'].wait(5)
+        futures += [cam.expose.call_async(0.01), other_cam.expose.call_async(0.01)]
+        wait_until(lambda: queued.count('expose') == 2 and contended.is_set())
+        SYNC['stats.release'].set()
+        for future in futures:
+            future.result()
+        cam.grab_image(width=100, height=100)
+
+        stats = session.server_stats()
+        expose = stats[('callmethod', 'expose')]
+        assert expose['count'] == 2
+        assert expose['queue_time'] > 0
+        assert expose['max_lock_wait'] > 0
+        assert expose['handler_time'] >= 0.02  # Each exposure sleeps at least 10 ms
+        assert stats[('callmethod', 'hold')]['count'] == 1
+        grab = stats[('callmethod', 'grab_image')]
+        assert grab['response_bytes'] > 100*100*2 > grab['request_bytes']
+    finally:
+        other_session.close()
+
+
+def test_isolated_instruments(isolated_server):
+    host, port = isolated_server.split(':')
+    session = remote.ClientSession(host, int(port), isolated_server)
+    session.messenger.timeout = 30  # Starting a worker process can be slow
+    try:
+        cam1 = open_remote_camera(session)
+        cam2 = session.instrument(ParamSet(OtherCamera, server=session.server))
+        pid1, pid2 = cam1.getpid(), cam2.getpid()
+        assert len({pid1, pid2, os.getpid()}) == 3
+        assert cam1._obj_id[0] != cam2._obj_id[0]  # (worker index, id) of each instrument
+        assert cam1.model == 'FC-1'
+
+        img = cam1.grab_image(width=512, height=512)
+        assert (img.ravel() == np.arange(512*512, dtype='uint16')).all()
+        assert cam2.load_frame(np.ones((10, 10), dtype='uint8')) == 100
+
+        with session.subscribe(cam1, 'latest_frame', trigger='wait_for_frame') as sub:
+            assert sub.get(timeout=5).shape == (4, 4)
+
+        batch = session.batch()
+        with pytest.raises(remote.RemoteError):
+            batch(cam1).grab_image(4, 4)
+            batch(cam2).grab_image(4, 4)
+            batch.execute()
+
+        # A crashing driver only takes down its own worker process
+        with pytest.raises(remote.RemoteError):
+            cam1.crash()
+        assert cam2.getpid() == pid2
+    finally:
+        session.close()
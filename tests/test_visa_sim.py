@@ -0,0 +1,44 @@
+import pytest
+from instrumental import u
+from instrumental.drivers.visa_sim import DEVICES, open_sim_instrument, benchmark, ieee_block
+
+
+@pytest.mark.parametrize('classname', sorted(DEVICES))
+def test_open_all_profiles(classname):
+    inst = open_sim_instrument(classname)
+    assert type(inst).__name__ == classname
+
+
+def test_tek_curve():
+    scope = open_sim_instrument('TDS_3000', record_length=2500)
+    t, y = scope.get_data(channel=2, width=2)
+    assert t.shape == y.shape == (2500,)
+    assert y.dimensionality == u.V.dimensionality
+    assert scope.resource.device.state['data:source'] == 'ch2'
+
+
+def test_relative_headers():
+    scope = open_sim_instrument('TDS_3000')
+    scope.write('measurement:meas1:type amplitude;source ch1')
+    assert scope.resource.device.state['measurement:meas1:source'] == 'ch1'
+
+
+def test_binary_payloads():
+    lockin = open_sim_instrument('SR844', trace_length=300)
+    assert lockin.get_trace(1).shape == (300,)
+
+    laser = open_sim_instrument('TSL570', n_points=50)
+    assert laser.read_wavelength_data().shape == (50,)
+
+
+def test_ieee_block():
+    assert ieee_block(b'abc') == b'#13abc'
+    assert ieee_block(b'x'*12, b'\n') == b'#212' + b'x'*12 + b'\n'
+
+
+def test_benchmark_latency():
+    pm = open_sim_instrument('Newport_1830_C', latency=2e-3)
+    result = benchmark(lambda: pm.power, pm.resource, n_calls=3)
+    assert result.n_messages == 6  # 'U?' and 'D?' per call
+    assert result.io_time == pytest.approx(6*2e-3)
+    assert result.wall_time >= result.io_time
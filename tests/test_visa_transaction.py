@@ -0,0 +1,103 @@
+import threading
+
+from instrumental.drivers.util import optimize_scpi_messages, split_scpi_message
+from instrumental.drivers.visa_sim import open_sim_instrument
+
+
+def test_split_scpi_message():
+    assert split_scpi_message(':data:source ch1;width 2;*CLS;:head "a;b"') == [
+        ('data', 'source', 'ch1'),
+        ('data', 'width', '2'),
+        (None, '*CLS', ''),
+        ('', 'head', '"a;b"'),
+    ]
+
+
+def test_optimize_scpi_messages():
+    msgs = [':data:source ch1', ':data:width 2', ':data:encdg RIBinary', ':data:source ch2']
+    assert optimize_scpi_messages(msgs) == ([':data:width 2;encdg RIBinary;source ch2'], 3)
+
+    # Queries and argument-less commands keep earlier settings from being dropped
+    msgs = [':acq:state 0', ':acq:state?', ':acq:state 1']
+    assert optimize_scpi_messages(msgs)[1] == 3
+
+    messages, n = optimize_scpi_messages([':a:b 1', ':a:c 2', ':a:d 3'], max_length=12)
+    assert n == 3
+    assert all(len(m) <= 12 for m in messages)
+    assert messages[1].startswith(':a:')
+
+
+def test_optimize_scpi_channel_settings():
+    # A leading argument may select a channel, so only settings of the same channel are dropped
+    assert optimize_scpi_messages(['DDEF 1,1', 'DDEF 2,0']) == (['DDEF 1,1;DDEF 2,0'], 2)
+    assert optimize_scpi_messages(['OEXP 1,0,1', 'OEXP 2,0,1', 'OEXP 1,10,0']) == (
+        ['OEXP 2,0,1;OEXP 1,10,0'], 2)
+    assert optimize_scpi_messages(['DDEF 1,1', 'DDEF 1,0']) == (['DDEF 1,0'], 1)
+
+
+def test_optimize_scpi_keeps_unrooted_headers():
+    assert optimize_scpi_messages(['FREQ 1000', 'AMPL 2', 'FREQ 2000']) == (
+        ['AMPL 2;FREQ 2000'], 2)
+
+    # An unrooted header can't follow a subsystem command, so it starts a new message instead
+    assert optimize_scpi_messages([':data:width 2', 'FREQ 1000']) == (
+        [':data:width 2', 'FREQ 1000'], 2)
+
+
+def test_optimized_transaction():
+    scope = open_sim_instrument('TDS_3000')
+    scope.resource.reset_stats()
+    with scope.transaction(optimize=True):
+        scope.write(':data:source ch1')
+        scope.write(':data:width 1')
+        scope.write(':data:source ch2')
+        with scope.transaction():
+            scope.write(':data:width 2')
+
+    assert scope.resource.n_messages == 1
+    assert scope.resource.device.state['data:source'] == 'ch2'
+    assert scope.resource.device.state['data:width'] == '2'
+    stats = scope.transaction_stats
+    assert stats['commands'] == 4
+    assert stats['optimized_commands'] == 2
+    assert stats['optimized_bytes'] < stats['bytes']
+
+
+def test_transaction_default_unoptimized():
+    scope = open_sim_instrument('TDS_3000')
+    with scope.transaction():
+        scope.write(':data:source ch1')
+        scope.write(':data:source ch2')
+    assert scope.transaction_stats['optimized_commands'] == 2
+
+
+def test_transaction_error_discards_queue():
+    scope = open_sim_instrument('TDS_3000')
+    scope.resource.reset_stats()
+    try:
+        with scope.transaction():
+            scope.write(':data:source ch1')
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert scope.resource.n_messages == 0
+
+    with scope.transaction():
+        scope.write(':data:source ch2')
+    scope.write(':data:width 2')
+    assert scope.resource.n_messages == 2
+    assert scope.resource.device.state['data:source'] == 'ch2'
+
+
+def test_transaction_not_joined_by_other_threads():
+    scope = open_sim_instrument('TDS_3000')
+    scope.resource.reset_stats()
+    with scope.transaction():
+        scope.write(':data:source ch1')
+        thread = threading.Thread(target=lambda: scope.write(':data:source ch2'))
+        thread.start()
+        thread.join(0.05)
+        assert thread.is_alive()  # Blocked until the transaction ends, rather than queued in it
+    thread.join()
+    assert scope.resource.n_messages == 2
+    assert scope.resource.device.state['data:source'] == 'ch2'
@@ -4,17 +4,26 @@
 Instrumental server script. Allows other machines to access and control this machine's instruments.
 """
 import time
+import argparse
 import threading
 import logging
 from instrumental.log import log_to_screen, DEBUG, WARNING
 from instrumental.drivers.remote import ThreadedTCPServer, DEFAULT_PORT
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--isolate', choices=['instrument', 'module'],
+                        help="host each instrument, or each driver module, in its own process")
+    parser.add_argument('--stats-interval', type=float, metavar='SECONDS',
+                        help="periodically log counts and timings of the requests handled")
+    args = parser.parse_args()
+
     log_to_screen(level=DEBUG, fmt='[%(levelname)8s]%(filename)s/%(funcName)s: %(message)s')
     logging.getLogger('nicelib').setLevel(WARNING)
 
     HOST = ''  # Listen on all network interfaces
-    server = ThreadedTCPServer((HOST, DEFAULT_PORT))
+    server = ThreadedTCPServer((HOST, DEFAULT_PORT), isolate=args.isolate,
+                               stats_interval=args.stats_interval)
     ip, port = server.server_address
     server_thread = threading.Thread(target=server.serve_forever)
     server_thread.daemon = True
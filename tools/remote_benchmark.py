@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Loopback throughput benchmark for the message framing used by remote sessions.
+
+Sends messages of increasing size between two Messengers connected over TCP loopback and prints the
+time per message and throughput for each size. Usage::
+
+    python remote_benchmark.py [max_size_in_bytes]
+"""
+import sys
+import time
+import socket
+import threading
+from instrumental.drivers.remote import Messenger
+
+SIZES = [100, 1000, 10**4, 10**5, 10**6, 10**7, 10**8, 5*10**8]
+
+
+class LoopbackMessenger(Messenger):
+    def __init__(self, sock):
+        super(LoopbackMessenger, self).__init__()
+        self.sock = sock
+
+
+def loopback_pair():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    client = socket.create_connection(listener.getsockname())
+    server, _ = listener.accept()
+    listener.close()
+    return LoopbackMessenger(client), LoopbackMessenger(server)
+
+
+def time_messages(size, n_messages):
+    """Time sending `n_messages` messages of `size` bytes, returning the time per message"""
+    sender, receiver = loopback_pair()
+    payload = bytes(size)
+
+    def send():
+        for i in range(n_messages):
+            sender._send_message(payload, i % 256)
+
+    thread = threading.Thread(target=send)
+    start = time.perf_counter()
+    thread.start()
+    for _ in range(n_messages):
+        message, _, _ = receiver._recv_message()
+        assert len(message) == size
+    elapsed = time.perf_counter() - start
+    thread.join()
+
+    sender.sock.close()
+    receiver.sock.close()
+    return elapsed / n_messages
+
+
+if __name__ == '__main__':
+    max_size = int(float(sys.argv[1])) if len(sys.argv) > 1 else SIZES[-1]
+
+    print('{:>12} {:>10} {:>14} {:>12}'.format('size (B)', 'messages', 'per message', 'MB/s'))
+    for size in SIZES:
+        if size > max_size:
+            break
+        n_messages = max(3, min(10000, 10**9 // (size * 10)))
+        per_message = time_messages(size, n_messages)
+        print('{:>12} {:>10} {:>11.1f} us {:>12.1f}'.format(size, n_messages, per_message*1e6,
+                                                           size / per_message / 1e6))